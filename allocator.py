@@ -0,0 +1,194 @@
+from dataclasses import dataclass
+from heapq import heappop, heappush
+from typing import Sequence
+from parser import ASTNode
+from nodes import (NODE_CLASSES, ASSIGNMENT, BINARY_DECLARATION, FUNCTION_DEFINITION, FUNCTION_DEFINITION_AND_CALL,
+                   IDENTIFIER, IF_STATEMENT, NOT_OP, OUTPUT, POP_OPERATION, PUSH_OPERATION, WHILE_LOOP)
+from symbols import SymbolTable
+
+_FOREVER = float('inf')
+
+
+@dataclass
+class AllocationReport:
+    max_index_before: int
+    max_index_after: int
+    reused: int  # binaries that were given the stack of a binary that is no longer live
+
+
+def _max_index(symbols: SymbolTable) -> int:
+    return max(symbols.binary_numbers + symbols.stack_numbers, default=-1)
+
+
+class _Liveness:
+    """
+    Live ranges of binary slots over a pre-order numbering of the statements.
+    A binary touched in a loop is live for the whole outermost loop, one touched inside a function
+    body stays live until the end of the program, and one that may be read before its declaration
+    ran (declaration not in an enclosing block of the use) must not inherit an old stack.
+    """
+    def __init__(self, symbols: SymbolTable):
+        binaries = len(symbols.binary_names)
+        self.start: list[float] = [_FOREVER] * binaries
+        self.end: list[float] = [-1] * binaries
+        self.declared_in: list[tuple[int, int] | None] = [None] * binaries  # (block depth, block id)
+        self.fresh = [False] * binaries  # needs a stack nobody used before
+        self.uses_current_stack = False
+        self.blocks: list[int] = []  # ids of the blocks enclosing the current statement
+        self.outer_loop: tuple[int, set[int]] | None = None  # start position and touched slots
+        self.functions = 0  # function bodies enclosing the current statement
+
+    def touch(self, slot: int, position: int, declaration: bool = False) -> None:
+        if position < self.start[slot]:
+            self.start[slot] = position
+        if self.functions:
+            self.end[slot] = _FOREVER
+        elif position > self.end[slot]:
+            self.end[slot] = position
+        if self.outer_loop is not None:
+            self.outer_loop[1].add(slot)
+        if declaration:
+            if self.declared_in[slot] is None and not self.fresh[slot]:
+                self.declared_in[slot] = (len(self.blocks) - 1, self.blocks[-1])
+            return
+        declared = self.declared_in[slot]
+        if declared is None or len(self.blocks) <= declared[0] or self.blocks[declared[0]] != declared[1]:
+            self.fresh[slot] = True
+
+    def expression(self, expression: ASTNode, position: int) -> None:
+        while expression.kind == NOT_OP:
+            expression = expression.operand
+        if expression.kind == IDENTIFIER:
+            if expression.slot is not None:
+                self.touch(expression.slot, position)
+        elif expression.kind == POP_OPERATION and expression.slot is None:
+            self.uses_current_stack = True
+
+    def binary_declaration(self, statement: ASTNode, position: int, work: list) -> None:
+        self.expression(statement.value, position)
+        self.touch(statement.slot, position, declaration=True)
+
+    def assignment(self, statement: ASTNode, position: int, work: list) -> None:
+        self.expression(statement.expression, position)
+        if statement.slot is not None:
+            self.touch(statement.slot, position)
+
+    def output(self, statement: ASTNode, position: int, work: list) -> None:
+        self.expression(statement.arguments, position)
+
+    def push(self, statement: ASTNode, position: int, work: list) -> None:
+        self.expression(statement.value, position)
+        if statement.slot is None:
+            self.uses_current_stack = True
+
+    def if_statement(self, statement: ASTNode, position: int, work: list) -> None:
+        self.expression(statement.condition, position)
+        work.extend((('exit_block',), *reversed(statement.else_block), ('enter_block',)))
+        work.extend((('exit_block',), *reversed(statement.then_block), ('enter_block',)))
+
+    def while_loop(self, statement: ASTNode, position: int, work: list) -> None:
+        outermost = self.outer_loop is None
+        if outermost:
+            self.outer_loop = (position, set())
+        self.expression(statement.condition, position)
+        work.append(('exit_loop', position if outermost else None))
+        work.extend((('exit_block',), *reversed(statement.body), ('enter_block',)))
+
+    def function_definition(self, statement: ASTNode, position: int, work: list) -> None:
+        self.functions += 1
+        work.append(('exit_function',))
+        work.extend((('exit_block',), *reversed(statement.body), ('enter_block',)))
+
+    def walk(self, statements: Sequence[ASTNode]) -> int:
+        table: list = [None] * len(NODE_CLASSES)
+        table[BINARY_DECLARATION] = self.binary_declaration
+        table[ASSIGNMENT] = self.assignment
+        table[OUTPUT] = self.output
+        table[PUSH_OPERATION] = self.push
+        table[IF_STATEMENT] = self.if_statement
+        table[WHILE_LOOP] = self.while_loop
+        table[FUNCTION_DEFINITION] = self.function_definition
+        table[FUNCTION_DEFINITION_AND_CALL] = self.function_definition
+        position = 0
+        block_ids = 0
+        self.blocks.append(block_ids)
+        # Explicit work stack of statements and ('exit', ...) markers for blocks, loops and functions
+        work: list = [('exit_block',)] + list(reversed(statements))
+        while work:
+            item = work.pop()
+            if type(item) is tuple:
+                if item[0] == 'exit_block':
+                    self.blocks.pop()
+                elif item[0] == 'exit_loop':
+                    if item[1] is not None:
+                        loop_start, touched = self.outer_loop
+                        for slot in touched:
+                            self.start[slot] = min(self.start[slot], loop_start)
+                            self.end[slot] = max(self.end[slot], position)
+                        self.outer_loop = None
+                elif item[0] == 'exit_function':
+                    self.functions -= 1
+                elif item[0] == 'enter_block':
+                    block_ids += 1
+                    self.blocks.append(block_ids)
+                continue
+            position += 1
+            handler = table[item.kind]
+            if handler is not None:
+                handler(item, position, work)
+        return position
+
+
+def allocate_stacks(statements: Sequence[ASTNode], symbols: SymbolTable) -> AllocationReport:
+    """
+    Renumbers the runtime stacks of a resolved program in place: stacks keep one number each,
+    binaries whose live ranges don't overlap share numbers, and everything is packed from 0.
+    """
+    before = _max_index(symbols)
+    liveness = _Liveness(symbols)
+    liveness.walk(statements)
+    # Bare '-'/'+' act on whichever stack was selected last, initially stack 0, which can't be
+    # tracked statically. Keep stack 0 unnamed for them and don't share stacks at all.
+    first = 1 if liveness.uses_current_stack else 0
+    stack_count = len(symbols.stack_names) + first
+    symbols.stack_numbers = list(range(first, stack_count))
+    # A name used as both binary and stack shares one runtime stack, keep it that way
+    shared = {slot: symbols.stack_numbers[symbols.stacks[name]] for slot, name in enumerate(symbols.binary_names) if name in symbols.stacks}
+
+    if liveness.uses_current_stack:
+        numbers = []
+        next_number = stack_count
+        for slot in range(len(symbols.binary_names)):
+            if slot in shared:
+                numbers.append(shared[slot])
+            else:
+                numbers.append(next_number)
+                next_number += 1
+        symbols.binary_numbers = numbers
+        return AllocationReport(before, _max_index(symbols), 0)
+
+    numbers = [stack_count] * len(symbols.binary_names)
+    intervals = sorted(
+        (liveness.start[slot], liveness.end[slot], slot)
+        for slot in range(len(symbols.binary_names))
+        if slot not in shared and liveness.end[slot] >= 0
+    )
+    active: list[tuple[float, int]] = []  # (end, number) of live binaries
+    free: list[int] = []
+    next_number = stack_count
+    reused = 0
+    for start, end, slot in intervals:
+        while active and active[0][0] < start:
+            heappush(free, heappop(active)[1])
+        if free and not liveness.fresh[slot]:
+            number = heappop(free)
+            reused += 1
+        else:
+            number = next_number
+            next_number += 1
+        numbers[slot] = number
+        heappush(active, (end, number))
+    for slot, stack_slot in shared.items():
+        numbers[slot] = stack_slot
+    symbols.binary_numbers = numbers
+    return AllocationReport(before, _max_index(symbols), reused)
@@ -0,0 +1,5 @@
+"""
+Benchmarks for the Brainknot compiler. Run them from the repository root, e.g.
+
+    python -m benchmarks.bench_lexer
+"""
@@ -0,0 +1,40 @@
+"""
+Highest runtime stack number used by the output, with the default numbering and with
+allocator.allocate_stacks, over a corpus of generated programs.
+"""
+import argparse
+
+from lexer import tokenize_stream
+from parser import Parser
+from symbols import resolve_symbols
+from allocator import allocate_stacks
+from benchmarks.generators import many_blocks, random_program, straight_line
+
+
+def corpus(size: int) -> list[tuple[str, str]]:
+    programs = [(f"random #{seed}", random_program(size, seed, current_stack=False)) for seed in range(5)]
+    programs.append(("random with current stack", random_program(size, 0)))
+    programs.append(("straight line", straight_line(size)))
+    programs.append(("many blocks", many_blocks(size // 10, size)))
+    return programs
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--size', type=int, default=2_000)
+    args = arg_parser.parse_args()
+
+    total_before = total_after = 0
+    for label, code in corpus(args.size):
+        statements = Parser(tokenize_stream(code)).parse_program()
+        symbols = resolve_symbols(statements)
+        report = allocate_stacks(statements, symbols)
+        total_before += report.max_index_before
+        total_after += report.max_index_after
+        print(f"{label:<28} max index {report.max_index_before:>6} -> {report.max_index_after:>6}"
+              f"  ({report.reused} binaries reuse a stack)")
+    print(f"{'total':<28} max index {total_before:>6} -> {total_after:>6}")
+
+
+if __name__ == "__main__":
+    main()
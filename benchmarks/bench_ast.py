@@ -0,0 +1,116 @@
+"""
+Memory and walking time of the slotted AST against the same tree laid out as the old
+ASTNode(type, fields dict, line) dataclasses, and the cost of reading through the compatibility view.
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any
+
+from lexer import tokenize_stream
+from nodes import NODE_CLASSES
+from parser import Parser
+from symbols import resolve_symbols
+from translator import translate
+from benchmarks.generators import random_program, straight_line
+
+
+@dataclass
+class _DictNode:
+    type: str
+    fields: dict[str, Any]
+    line: int
+
+
+def _dict_tree(statements: list) -> list:
+    def convert(value: Any) -> Any:
+        if isinstance(value, list):
+            return [convert(item) for item in value]
+        if hasattr(value, 'kind'):
+            return _DictNode(value.type, {name: convert(item) for name, item in value.fields.items()}, value.line)
+        return value
+    return convert(statements)
+
+
+def _traced(build) -> tuple[Any, int]:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        return result, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def _count(nodes: list) -> int:
+    count = 0
+    work = list(nodes)
+    while work:
+        node = work.pop()
+        count += 1
+        work.extend(node.children())
+    return count
+
+
+def _walk_kinds(statements: list) -> int:
+    table = [0] * len(NODE_CLASSES)
+    work = list(statements)
+    while work:
+        node = work.pop()
+        table[node.kind] += 1
+        work.extend(node.children())
+    return sum(table)
+
+
+def _walk_fields(statements: list) -> int:
+    # The same walk written against the old interface, through the compatibility view
+    count = 0
+    work = list(statements)
+    while work:
+        node = work.pop()
+        count += node.type == "Identifier"
+        for value in node.fields.values():
+            if isinstance(value, list):
+                work.extend(value)
+            elif hasattr(value, 'kind'):
+                work.append(value)
+    return count
+
+
+def measure(label: str, code: str) -> None:
+    stream = tokenize_stream(code)
+    parser = Parser(stream)
+    statements, slotted = _traced(parser.parse_program)
+    nodes = _count(statements)
+    symbols = resolve_symbols(statements, parser.defined_identifiers)
+    _, old_layout = _traced(lambda: _dict_tree(statements))
+
+    start = time.perf_counter()
+    translate(statements, symbols=symbols)
+    translated = time.perf_counter() - start
+    start = time.perf_counter()
+    _walk_kinds(statements)
+    by_kind = time.perf_counter() - start
+    start = time.perf_counter()
+    _walk_fields(statements)
+    by_view = time.perf_counter() - start
+    print(f"{label}: {nodes} nodes")
+    print(f"  memory     slotted {slotted / nodes:6.1f} B/node   dict layout {old_layout / nodes:6.1f} B/node   "
+          f"{old_layout / slotted:.1f}x smaller")
+    print(f"  translate  {translated / nodes * 1e9:6.0f} ns/node")
+    print(f"  walk       by kind {by_kind / nodes * 1e9:6.0f} ns/node   through .fields {by_view / nodes * 1e9:6.0f} ns/node")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--statements', type=int, default=300_000)
+    args = arg_parser.parse_args()
+
+    measure("straight line", straight_line(args.statements))
+    measure("random", random_program(args.statements, seed=1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Batch compile throughput of a generated corpus for an increasing number of worker processes.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from batch import compile_files, find_sources
+from benchmarks.generators import random_program
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--files', type=int, default=10_000)
+    arg_parser.add_argument('--size', type=int, default=100)
+    arg_parser.add_argument('-O', dest='opt_level', type=int, default=1)
+    args = arg_parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    counts = sorted({1, 2, 4, 8, 16, cores} & set(range(1, cores + 1)))
+    with tempfile.TemporaryDirectory() as directory:
+        for index in range(args.files):
+            folder = os.path.join(directory, "src", f"d{index % 32}")
+            os.makedirs(folder, exist_ok=True)
+            with open(os.path.join(folder, f"p{index}.bk"), 'w') as file:
+                file.write(random_program(args.size, index))
+        paths = find_sources([os.path.join(directory, "src")])
+        megabytes = sum(os.path.getsize(path) for path in paths) / 1e6
+        print(f"{len(paths)} files, {megabytes:.1f} MB, {cores} cores")
+        baseline = None
+        for jobs in counts:
+            start = time.perf_counter()
+            results = compile_files(paths, os.path.join(directory, "out"), args.opt_level, jobs=jobs)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            failed = sum(result.error is not None for result in results)
+            print(f"-j{jobs:<3} {elapsed:7.2f}s  {len(paths) / elapsed:8.1f} files/s  {megabytes / elapsed:6.2f} MB/s  "
+                  f"speedup {baseline / elapsed:4.1f}x  ({failed} failed)")
+
+
+if __name__ == "__main__":
+    main()
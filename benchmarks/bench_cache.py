@@ -0,0 +1,42 @@
+"""
+Compiling a corpus cold, from the on-disk cache in a fresh cache object, and from the in-process memo.
+"""
+import argparse
+import dataclasses
+import tempfile
+import time
+
+from cache import CompileCache
+from benchmarks.generators import random_program
+
+
+def timed(cache: CompileCache, sources: list[str], opt_level: int) -> float:
+    start = time.perf_counter()
+    for source in sources:
+        cache.compile(source, opt_level=opt_level)
+    return time.perf_counter() - start
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--programs', type=int, default=1000)
+    arg_parser.add_argument('--size', type=int, default=200)
+    arg_parser.add_argument('-O', dest='opt_level', type=int, default=1)
+    args = arg_parser.parse_args()
+
+    sources = [random_program(args.size, seed) for seed in range(args.programs)]
+    with tempfile.TemporaryDirectory() as directory:
+        cache = CompileCache(directory, memo_size=args.programs)
+        cold = timed(cache, sources, args.opt_level)
+        cold_stats = dataclasses.replace(cache.stats)
+        memo = timed(cache, sources, args.opt_level)
+        fresh = CompileCache(directory)
+        disk = timed(fresh, sources, args.opt_level)
+        print(f"{args.programs} programs")
+        print(f"cold   {cold:.3f}s  {cold_stats}")
+        print(f"disk   {disk:.3f}s  {fresh.stats}  {cold / disk:.1f}x faster")
+        print(f"memo   {memo:.3f}s  {cold / memo:.0f}x faster")
+
+
+if __name__ == "__main__":
+    main()
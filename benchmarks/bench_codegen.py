@@ -0,0 +1,55 @@
+"""
+Run time of compiled Python code against the VM on a loop-heavy program, plus compile and cache hit times.
+"""
+import argparse
+import time
+
+from lexer import tokenize_stream
+from parser import Parser
+from translator import translate
+import codegen
+import vm
+from benchmarks.generators import input_loop
+
+
+def best_of(repeat: int, function) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--body', type=int, default=50)
+    arg_parser.add_argument('--iterations', type=int, default=20_000)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args()
+
+    bits = [True] * (args.iterations + 1) + [False]
+    code = translate(Parser(tokenize_stream(input_loop(args.body))).parse_program())
+
+    start = time.perf_counter()
+    compiled = codegen.compile_program(code)
+    compile_time = time.perf_counter() - start
+    start = time.perf_counter()
+    codegen.compile_program(code)
+    cached_time = time.perf_counter() - start
+    program = vm.load(code)
+
+    steps = vm.run(program, bits).steps
+    if codegen.run(compiled, bits).outputs != vm.run(program, bits).outputs:
+        raise AssertionError("compiled code and VM disagree")
+    vm_time = best_of(args.repeat, lambda: vm.run(program, bits))
+    codegen_time = best_of(args.repeat, lambda: codegen.run(compiled, bits))
+    print(f"compile {compile_time * 1000:.2f}ms ({len(compiled.source.splitlines())} lines), "
+          f"cached {cached_time * 1e6:.1f}us")
+    print(f"vm       {vm_time:.3f}s ({steps / vm_time / 1e6:.2f}M steps/s)")
+    print(f"codegen  {codegen_time:.3f}s ({steps / codegen_time / 1e6:.2f}M steps/s), {vm_time / codegen_time:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+-O2 with and without the function pass: output size, steps and call dispatches executed on the VM,
+and compile time, on programs with many small functions. Checks that both behave the same.
+"""
+import argparse
+import random
+import time
+from array import array
+
+from compiler import compile
+from lexer import tokenize_stream
+from optimizer import optimize
+from parser import Parser
+from peephole import peephole
+from symbols import resolve_symbols
+from translator import translate
+from vm import CALL_F, DEFINE_AND_CALL_F, load, run
+from benchmarks.generators import function_calls, many_functions
+
+
+def without_inlining(source: str) -> str:
+    # compile(opt_level=2) minus inline_functions
+    parser = Parser(tokenize_stream(source))
+    statements = parser.parse_program()
+    symbols = resolve_symbols(statements, parser.defined_identifiers)
+    return peephole(translate(optimize(statements, 2), symbols=symbols))
+
+
+def execute(code: str, bits: list[bool]) -> tuple[int, int, list[bool]]:
+    program = load(code)
+    counts = array('q', bytes(8 * len(program.ops)))
+    result = run(program, bits, max_steps=10_000_000, counts=counts)
+    calls = sum(count for op, count in zip(program.ops, counts) if op in (CALL_F, DEFINE_AND_CALL_F))
+    return result.steps, calls, result.outputs
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--functions', type=int, default=200)
+    arg_parser.add_argument('--calls', type=int, default=5000)
+    args = arg_parser.parse_args()
+
+    bits = [random.Random(0).random() < 0.5 for _ in range(100_000)]
+    programs = {
+        "function_calls": function_calls(args.functions, args.calls, seed=1),
+        "many_functions": many_functions(args.functions, 8, seed=2),
+    }
+    for name, source in programs.items():
+        start = time.perf_counter()
+        plain = without_inlining(source)
+        plain_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        result = compile(source, opt_level=2)
+        seconds = time.perf_counter() - start
+        plain_steps, plain_calls, plain_outputs = execute(plain, bits)
+        steps, calls, outputs = execute(result.output, bits)
+        if outputs != plain_outputs:
+            raise AssertionError(f"{name}: output bits differ with the function pass")
+        report = result.functions
+        print(f"{name}: {len(report.merged)} merged, {len(report.inlined)} inlined, {len(report.removed)} removed, "
+              f"call sites {report.calls_before} -> {report.calls_after}")
+        print(f"  output {len(plain):>9} -> {len(result.output):>9} chars   steps {plain_steps:>9} -> {steps:>9}"
+              f"   calls run {plain_calls:>8} -> {calls:>8}   compile {plain_seconds * 1000:.1f} -> {seconds * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
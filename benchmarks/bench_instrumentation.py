@@ -0,0 +1,45 @@
+"""
+Cost of instrumentation: compiling with no sink registered, with a sink that drops everything and
+with a Collector. Checks that the output is the same in every case.
+"""
+import argparse
+import time
+
+import instrumentation
+from compiler import compile
+from benchmarks.generators import random_program
+
+
+def best(source: str, repeat: int) -> tuple[float, str]:
+    seconds = float('inf')
+    output = ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = compile(source).output
+        seconds = min(seconds, time.perf_counter() - start)
+    return seconds, output
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--statements', type=int, default=50_000)
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    source = random_program(args.statements, seed=1)
+    disabled, expected = best(source, args.repeat)
+    print(f"{args.statements} statements")
+    print(f"disabled    {disabled * 1000:8.1f}ms")
+    for name, sink in (("null sink", instrumentation.Sink()), ("collector", instrumentation.Collector())):
+        instrumentation.add_sink(sink)
+        try:
+            seconds, output = best(source, args.repeat)
+        finally:
+            instrumentation.remove_sink(sink)
+        if output != expected:
+            raise AssertionError(f"output with a {name} differs")
+        print(f"{name:<11} {seconds * 1000:8.1f}ms  {seconds / disabled:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Lexer throughput: the original per-call regex build with a linear group scan against lexer.tokenize.
+"""
+import argparse
+import io
+import re
+import time
+
+from lexer import Token, TOKEN_SPECS, tokenize, tokenize_iter
+from benchmarks.generators import straight_line
+
+
+def legacy_tokenize(code: str) -> list:
+    # The lexer as it was before the master regex moved to module level
+    master_regex = '|'.join(f'(?P<{name}>{regex})' for name, regex, _ in TOKEN_SPECS)
+    token_re = re.compile(master_regex)
+    tokens = []
+    pos = 0
+    line = 1
+    while pos < len(code):
+        match = token_re.match(code, pos)
+        if not match:
+            raise SyntaxError(f"Invalid token at position {pos}: {code[pos:pos+10]}")
+        matched_type = ""
+        matched_expr = False
+        matched_val = []
+        for name, _, expr in TOKEN_SPECS:
+            val = match.group(name)
+            if val:
+                matched_type = name
+                matched_expr = expr
+                matched_val = [val]
+                break
+        if matched_type == 'NEWLINE':
+            line += 1
+            pos = match.end()
+            continue
+        elif matched_type != 'WHITESPACE':
+            tokens.append(Token(name=matched_type, value=matched_val, expression=matched_expr, line=line))
+        pos = match.end()
+    return tokens
+
+
+def measure(label: str, function, code: str, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(code)
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<24} {best:8.3f}s  {len(code) / best / 1e6:7.2f} MB/s")
+    return best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--statements', type=int, default=200_000)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args()
+
+    code = straight_line(args.statements)
+    print(f"source: {len(code) / 1e6:.2f} MB, {args.statements} statements")
+    assert legacy_tokenize(code) == tokenize(code)
+    legacy = measure("legacy tokenize", legacy_tokenize, code, args.repeat)
+    current = measure("tokenize", tokenize, code, args.repeat)
+    measure("tokenize_iter (chunked)", lambda text: sum(1 for _ in tokenize_iter(io.StringIO(text))), code, args.repeat)
+    print(f"speedup: {legacy / current:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
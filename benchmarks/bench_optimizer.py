@@ -0,0 +1,38 @@
+"""
+Output size and optimization time per -O level over a corpus of generated programs.
+"""
+import argparse
+import time
+
+from lexer import tokenize_stream
+from parser import Parser
+from symbols import resolve_symbols
+from optimizer import optimize
+from translator import translate
+from benchmarks.generators import random_program
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--programs', type=int, default=50)
+    arg_parser.add_argument('--size', type=int, default=500)
+    args = arg_parser.parse_args()
+
+    sources = [random_program(args.size, seed) for seed in range(args.programs)]
+    baseline = None
+    for level in (0, 1, 2):
+        size = 0
+        elapsed = 0.0
+        for code in sources:
+            statements = Parser(tokenize_stream(code)).parse_program()
+            symbols = resolve_symbols(statements)
+            start = time.perf_counter()
+            statements = optimize(statements, level)
+            elapsed += time.perf_counter() - start
+            size += len(translate(statements, symbols=symbols))
+        baseline = baseline or size
+        print(f"-O{level}: {size:>9} bytes of output ({size / baseline:6.1%}), optimizer {elapsed:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
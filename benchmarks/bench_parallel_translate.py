@@ -0,0 +1,57 @@
+"""
+Sequential translation against translating top-level function bodies in worker processes,
+on a program with many large functions, and on a small one that stays below PARALLEL_MIN_LINES.
+Checks that the outputs are identical.
+"""
+import argparse
+import os
+import time
+
+from lexer import tokenize_stream
+from parser import Parser
+from symbols import SymbolTable, resolve_symbols
+from translator import PARALLEL_MIN_LINES, translate
+from benchmarks.generators import many_functions
+
+
+def parse(code: str) -> tuple[list, SymbolTable]:
+    parser = Parser(tokenize_stream(code))
+    statements = parser.parse_program()
+    return statements, resolve_symbols(statements, parser.defined_identifiers)
+
+
+def timed(statements: list, symbols: SymbolTable, jobs: int) -> tuple[str, float]:
+    start = time.perf_counter()
+    output = translate(statements, symbols=symbols, jobs=jobs)
+    return output, time.perf_counter() - start
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--functions', type=int, default=1000)
+    arg_parser.add_argument('--body', type=int, default=200)
+    args = arg_parser.parse_args()
+
+    statements, symbols = parse(many_functions(args.functions, args.body))
+    cores = os.cpu_count() or 1
+
+    expected, sequential = timed(statements, symbols, 1)
+    print(f"{args.functions} functions, {len(expected) / 1e6:.1f} MB of target code, {cores} cores")
+    print(f"sequential  {sequential:.3f}s")
+    for jobs in sorted({2, 4, 8, cores} - {1}):
+        output, elapsed = timed(statements, symbols, jobs)
+        if output != expected:
+            raise AssertionError(f"parallel output with {jobs} jobs differs from sequential")
+        print(f"-j{jobs:<9} {elapsed:.3f}s  speedup {sequential / elapsed:.2f}x")
+
+    statements, symbols = parse(many_functions(50, 50))
+    expected, sequential = timed(statements, symbols, 1)
+    output, elapsed = timed(statements, symbols, max(cores, 2))
+    if output != expected:
+        raise AssertionError("output of the small program differs with jobs")
+    print(f"small program below {PARALLEL_MIN_LINES} lines: sequential {sequential * 1000:.1f}ms, "
+          f"-j{max(cores, 2)} {elapsed * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+Parser scaling: deeply nested blocks and long flat programs, parse time per token.
+"""
+import argparse
+import time
+
+from lexer import tokenize_stream
+from parser import Parser
+from benchmarks.generators import nested, straight_line
+
+
+def measure(label: str, code: str) -> None:
+    stream = tokenize_stream(code)
+    start = time.perf_counter()
+    Parser(stream).parse_program()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {len(stream):>9} tokens {elapsed:8.3f}s {elapsed / len(stream) * 1e6:6.2f} us/token")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--depth', type=int, default=10_000)
+    arg_parser.add_argument('--statements', type=int, default=1_000_000)
+    args = arg_parser.parse_args()
+
+    for construct in ("if", "while", "func"):
+        measure(f"{args.depth}-deep {construct}", nested(args.depth, construct))
+    for statements in (args.statements // 100, args.statements // 10, args.statements):
+        measure(f"{statements} flat statements", straight_line(statements))
+
+
+if __name__ == "__main__":
+    main()
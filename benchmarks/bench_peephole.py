@@ -0,0 +1,66 @@
+"""
+Instruction count and executed steps of translated programs before and after peephole optimization.
+"""
+import argparse
+import random
+import time
+
+from lexer import tokenize_stream
+from parser import Parser
+from translator import translate
+from target import decode, encode
+from peephole import optimize_instructions
+from vm import ExecutionLimitExceeded, run
+from benchmarks.generators import random_program, straight_line
+
+
+def behaviour(code: str, bits: list[bool], max_steps: int | None = None) -> tuple:
+    # Output bits, printed text and the non-empty stacks, reading false once the input runs out
+    remaining = iter(bits)
+    result = run(code, lambda: next(remaining, False), max_steps=max_steps)
+    stacks = {number: stack for number, stack in enumerate(result.stacks) if stack}
+    return result.outputs, "".join(result.text), stacks, result.steps
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--programs', type=int, default=50)
+    arg_parser.add_argument('--size', type=int, default=500)
+    arg_parser.add_argument('--max-steps', type=int, default=100_000)
+    args = arg_parser.parse_args()
+
+    sources = [random_program(args.size, seed) for seed in range(args.programs)]
+    sources.append(straight_line(args.size * 10))
+    before = after = 0
+    steps_before = steps_after = 0
+    fired: dict[str, int] = {}
+    start = time.perf_counter()
+    for code in sources:
+        instructions = decode(translate(Parser(tokenize_stream(code)).parse_program()))
+        optimized, counts = optimize_instructions(instructions)
+        before += len(instructions)
+        after += len(optimized)
+        for name, count in counts.items():
+            fired[name] = fired.get(name, 0) + count
+    elapsed = time.perf_counter() - start
+    for seed, code in enumerate(sources):
+        translated = translate(Parser(tokenize_stream(code)).parse_program())
+        rng = random.Random(seed)
+        bits = [rng.random() < 0.5 for _ in range(args.size)]
+        try:
+            *original, steps = behaviour(translated, bits, args.max_steps)
+        except ExecutionLimitExceeded:
+            continue
+        *optimized, optimized_steps = behaviour(encode(optimize_instructions(decode(translated))[0]), bits)
+        if original != optimized:
+            raise AssertionError(f"program {seed} behaves differently after peephole optimization")
+        steps_before += steps
+        steps_after += optimized_steps
+    print(f"instructions: {before} -> {after} ({after / before:.1%}) in {elapsed:.3f}s")
+    print(f"executed steps: {steps_before} -> {steps_after} ({steps_after / steps_before:.1%})")
+    for name, count in sorted(fired.items(), key=lambda item: -item[1]):
+        print(f"  {name:<20} {count:>8}")
+
+
+if __name__ == "__main__":
+    main()
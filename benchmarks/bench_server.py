@@ -0,0 +1,98 @@
+"""
+Load generator for the compile server: starts a server, has many concurrent clients send compile
+requests for small programs over persistent connections, and reports requests/s with the p50 and
+p99 latency. For comparison it also times the one-shot way, a fresh `python batch.py` per file,
+and the thin client per file.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from protocol import HEADER_BYTES, decode, encode, message_length
+from benchmarks.generators import random_program
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def _client(path: str, sources: list[str], offset: int, requests: int, latencies: list[float]) -> None:
+    reader, writer = await asyncio.open_unix_connection(path)
+    try:
+        for index in range(requests):
+            start = time.perf_counter()
+            writer.write(encode({"op": "compile", "source": sources[(offset + index) % len(sources)]}))
+            response = decode(await reader.readexactly(message_length(await reader.readexactly(HEADER_BYTES))))
+            latencies.append(time.perf_counter() - start)
+            if "error" in response:
+                raise RuntimeError(response["error"])
+    finally:
+        writer.close()
+
+
+async def load(path: str, sources: list[str], clients: int, requests: int) -> tuple[float, list[float]]:
+    latencies: list[float] = []
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(path, sources, client * requests, requests, latencies) for client in range(clients)))
+    return time.perf_counter() - start, sorted(latencies)
+
+
+def _start_server(path: str, jobs: int) -> subprocess.Popen:
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, "server.py"), "--socket", path, "-j", str(jobs)],
+                              cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    server.stdout.readline()  # "Listening on ..." once the workers are up
+    return server
+
+
+def _one_shot(command: list[str], paths: list[str]) -> float:
+    start = time.perf_counter()
+    for path in paths:
+        subprocess.run(command + [path], cwd=ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return (time.perf_counter() - start) / len(paths)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--clients', type=int, default=32, help="concurrent connections")
+    arg_parser.add_argument('--requests', type=int, default=200, help="requests per connection")
+    arg_parser.add_argument('--statements', type=int, default=50, help="statements per program")
+    arg_parser.add_argument('--distinct', type=int, default=500, help="different programs, the rest are repeats")
+    arg_parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help="server worker processes")
+    arg_parser.add_argument('--files', type=int, default=10, help="files for the one-shot comparison")
+    args = arg_parser.parse_args()
+
+    sources = [random_program(args.statements, seed=seed) for seed in range(args.distinct)]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "server.sock")
+        server = _start_server(path, args.jobs)
+        try:
+            total = args.clients * args.requests
+            print(f"{args.clients} clients x {args.requests} requests, {args.distinct} distinct programs "
+                  f"of {args.statements} statements, {args.jobs} workers")
+            for run in ("cold", "warm"):
+                seconds, latencies = asyncio.run(load(path, sources, args.clients, args.requests))
+                print(f"{run:<6} {total / seconds:9.0f} requests/s  p50 {percentile(latencies, 0.5) * 1000:7.2f}ms"
+                      f"  p99 {percentile(latencies, 0.99) * 1000:7.2f}ms")
+
+            files = []
+            for index, source in enumerate(sources[:args.files]):
+                files.append(os.path.join(directory, f"p{index}.bk"))
+                with open(files[-1], 'w', encoding='utf-8') as file:
+                    file.write(source)
+            one_shot = _one_shot([sys.executable, "batch.py", "-j", "1"], files)
+            thin = _one_shot([sys.executable, "client.py", "--socket", path], files)
+            print(f"per file: python batch.py {one_shot * 1000:7.1f}ms, python client.py {thin * 1000:7.1f}ms, "
+                  f"request on an open connection {percentile(latencies, 0.5) * 1000:.2f}ms")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Per-keystroke latency of an incremental session against compiling the whole buffer again, typing
+one character at a time into a line in the middle of a large program.
+"""
+import argparse
+import statistics
+import time
+
+from compiler import compile
+from session import CompilationSession
+from benchmarks.generators import straight_line, many_functions
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--statements', type=int, default=20_000)
+    arg_parser.add_argument('--functions', type=int, default=500)
+    arg_parser.add_argument('--keystrokes', type=int, default=200)
+    args = arg_parser.parse_args()
+
+    for name, source in (("straight line", straight_line(args.statements)),
+                         ("functions", many_functions(args.functions, args.statements // args.functions))):
+        start = time.perf_counter()
+        session = CompilationSession(source)
+        initial = time.perf_counter() - start
+        start = time.perf_counter()
+        compile(source)
+        full = time.perf_counter() - start
+
+        # Type a print statement on a new line in the middle, char by char, then delete it again
+        line = len(session.lines) // 2
+        while session.lines[line].startswith((" ", "}")):
+            line += 1
+        session.update((line, line), "\n")
+        typed = 'print("hi");'
+        latencies = []
+        errors = 0
+        for count in list(range(1, len(typed) + 1)) * (args.keystrokes // len(typed) + 1):
+            start = time.perf_counter()
+            try:
+                session.update((line, line + 1), typed[:count])
+            except (SyntaxError, EOFError):
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+            if len(latencies) == args.keystrokes:
+                break
+        session.update((line, line + 1), "")
+        assert session.output == compile(session.source).output
+
+        latencies.sort()
+        print(f"{name}: {len(session.lines)} lines, {len(session.segments)} segments")
+        print(f"  initial session  {initial * 1000:8.1f}ms   full compile {full * 1000:8.1f}ms")
+        print(f"  keystroke p50    {statistics.median(latencies) * 1000:8.3f}ms   "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.3f}ms   "
+              f"({errors} of {len(latencies)} keystrokes left the line incomplete)")
+        print(f"  speedup over a full compile per keystroke: {full / statistics.median(latencies):.0f}x")
+
+
+if __name__ == "__main__":
+    main()
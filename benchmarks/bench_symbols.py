@@ -0,0 +1,35 @@
+"""
+Translation time as the number of variables and blocks grows together; it should scale linearly.
+"""
+import argparse
+import time
+
+from lexer import tokenize_stream
+from parser import Parser
+from symbols import resolve_symbols
+from translator import translate
+from benchmarks.generators import many_blocks
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--size', type=int, default=32_000, help="variables and blocks of the largest program")
+    args = arg_parser.parse_args()
+
+    size = args.size // 8
+    previous = None
+    while size <= args.size:
+        statements = Parser(tokenize_stream(many_blocks(size, size))).parse_program()
+        start = time.perf_counter()
+        symbols = resolve_symbols(statements)
+        resolved = time.perf_counter()
+        translate(statements, symbols=symbols)
+        done = time.perf_counter()
+        ratio = f"x{(done - start) / previous:.2f}" if previous else ""
+        print(f"{size:>7} variables, {size:>7} blocks: resolve {resolved - start:6.3f}s translate {done - resolved:6.3f}s {ratio}")
+        previous = done - start
+        size *= 2
+
+
+if __name__ == "__main__":
+    main()
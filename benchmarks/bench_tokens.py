@@ -0,0 +1,45 @@
+"""
+Token memory: a list of lexer.Token objects against a lexer.TokenStream, in bytes per token.
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from lexer import tokenize, tokenize_stream
+from parser import Parser
+from benchmarks.generators import straight_line
+
+
+def allocated(function, code: str) -> tuple[object, int]:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = function(code)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--statements', type=int, default=200_000)
+    args = arg_parser.parse_args()
+
+    code = straight_line(args.statements)
+    tokens, list_bytes = allocated(tokenize, code)
+    stream, stream_bytes = allocated(tokenize_stream, code)
+    count = len(stream)
+    print(f"source: {len(code) / 1e6:.2f} MB, {count} tokens ({len(code) / count:.1f} source bytes per token)")
+    print(f"list[Token]   {list_bytes / 1e6:8.2f} MB  {list_bytes / count:6.1f} bytes/token")
+    print(f"TokenStream   {stream_bytes / 1e6:8.2f} MB  {stream_bytes / count:6.1f} bytes/token")
+    del tokens
+
+    for label, source in (("parse list[Token]", tokenize(code)), ("parse TokenStream", stream)):
+        start = time.perf_counter()
+        Parser(source).parse_program()
+        print(f"{label:<20} {time.perf_counter() - start:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+translate() building one string against translate_to() streaming into a file: time and peak memory
+of the translation alone, on a long straight-line program and a deeply nested one.
+Pass --statements 12000000 for about 100 MB of target code.
+"""
+import argparse
+import gc
+import os
+import time
+import tracemalloc
+
+from lexer import tokenize_stream
+from parser import Parser
+from symbols import resolve_symbols
+from translator import translate, translate_to
+from benchmarks.generators import nested, straight_line
+
+
+def measure(function) -> tuple[float, int]:
+    # Time of a plain run, then the peak of a traced one
+    gc.collect()
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--statements', type=int, default=1_000_000)
+    arg_parser.add_argument('--depth', type=int, default=20_000)
+    args = arg_parser.parse_args()
+
+    for label, code in (("straight-line", straight_line(args.statements)), ("nested", nested(args.depth, "if"))):
+        parser = Parser(tokenize_stream(code))
+        statements = parser.parse_program()
+        symbols = resolve_symbols(statements, parser.defined_identifiers)
+        del code
+        with open(os.devnull, 'w') as sink:
+            size = translate_to(sink, statements, symbols=symbols)
+            print(f"{label}: {size / 1e6:.1f} MB of target code")
+            for name, function in (("translate   ", lambda: translate(statements, symbols=symbols)),
+                                   ("translate_to", lambda: translate_to(sink, statements, symbols=symbols))):
+                elapsed, peak = measure(function)
+                print(f"  {name} {elapsed:7.3f}s  peak {peak / 1e6:8.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
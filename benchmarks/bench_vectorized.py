@@ -0,0 +1,48 @@
+"""
+Exhaustive truth table of a generated circuit: one lockstep batch run against separate runs per input row.
+Needs NumPy.
+"""
+import argparse
+import time
+
+from lexer import tokenize_stream
+from parser import Parser
+from translator import translate
+import codegen
+from vectorized import run_batch, truth_table
+from benchmarks.generators import circuit
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--inputs', type=int, default=16)
+    arg_parser.add_argument('--gates', type=int, default=40)
+    arg_parser.add_argument('--sample', type=int, default=2000, help="rows run separately, the rest is extrapolated")
+    args = arg_parser.parse_args()
+
+    code = translate(Parser(tokenize_stream(circuit(args.inputs, args.gates))).parse_program())
+    table = truth_table(args.inputs)
+    start = time.perf_counter()
+    result = run_batch(code, table)
+    batch_time = time.perf_counter() - start
+
+    compiled = codegen.compile_program(code)
+    sample = min(args.sample, len(table))
+    rows = table[:: max(1, len(table) // sample)][:sample]
+    start = time.perf_counter()
+    for row in rows:
+        codegen.run(compiled, row.tolist())
+    separate_time = (time.perf_counter() - start) / len(rows) * len(table)
+    for index in range(0, len(table), max(1, len(table) // 100)):
+        expected = codegen.run(compiled, table[index].tolist()).outputs
+        if result.outputs[index, :result.output_counts[index]].tolist() != expected:
+            raise AssertionError(f"batch and separate runs disagree on row {index}")
+
+    print(f"{len(table)} rows, {result.outputs.shape[1]} outputs, {result.steps} lockstep steps")
+    print(f"batch     {batch_time:.3f}s")
+    print(f"separate  {separate_time:.3f}s (extrapolated from {len(rows)} rows), "
+          f"{separate_time / batch_time:.1f}x slower")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Execution speed of the VM in steps per second, on a loop-heavy program fed with random input.
+"""
+import argparse
+import time
+
+from lexer import tokenize_stream
+from parser import Parser
+from translator import translate
+from peephole import peephole
+from vm import load, run
+from benchmarks.generators import input_loop
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--body', type=int, default=50)
+    arg_parser.add_argument('--iterations', type=int, default=20_000)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args()
+
+    # acc, then go=1 for each iteration and a final go=0
+    bits = [True] * (args.iterations + 1) + [False]
+    code = translate(Parser(tokenize_stream(input_loop(args.body))).parse_program())
+    for label, target in (("translated", code), ("peephole", peephole(code))):
+        start = time.perf_counter()
+        program = load(target)
+        load_time = time.perf_counter() - start
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = run(program, bits)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{label:<10} {len(program.ops):>6} ops, load {load_time * 1000:.2f}ms, "
+              f"{result.steps:>10} steps in {best:.3f}s = {result.steps / best / 1e6:.2f}M steps/s")
+
+
+if __name__ == "__main__":
+    main()
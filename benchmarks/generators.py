@@ -0,0 +1,266 @@
+import random
+
+
+def straight_line(statements: int, seed: int = 0) -> str:
+    """
+    Long straight-line program mixing binary/stack declarations, assignments, pushes, pops and output.
+    """
+    rng = random.Random(seed)
+    lines = ["stack data;", "binary acc = input();"]
+    binaries = ["acc"]
+    for index in range(statements):
+        choice = rng.random()
+        if choice < 0.15:
+            name = f"b{index}"
+            lines.append(f"binary {name} = {rng.choice(binaries)};")
+            binaries.append(name)
+        elif choice < 0.45:
+            lines.append(f"{rng.choice(binaries)} = not {rng.choice(binaries)};")
+        elif choice < 0.65:
+            lines.append(f"data.push({rng.choice(binaries)});")
+        elif choice < 0.85:
+            lines.append(f"{rng.choice(binaries)} = data.pop();")
+        else:
+            lines.append(f"output({rng.choice(binaries)});")
+    return "\n".join(lines) + "\n"
+
+
+def nested(depth: int, construct: str = "if") -> str:
+    """
+    A single chain of `depth` nested if/while/func blocks around one output statement.
+    """
+    opening = {
+        "if": "if (b) {{",
+        "while": "while (b) {{",
+        "func": "func f{} {{",
+    }[construct]
+    closing = {"if": "};", "while": "}", "func": "};"}[construct]
+    lines = ["binary b = input();"]
+    for level in range(depth):
+        lines.append(opening.format(level))
+    lines.append("output(b);")
+    lines.extend(closing for _ in range(depth))
+    return "\n".join(lines) + "\n"
+
+
+def random_program(statements: int, seed: int = 0, max_depth: int = 6, current_stack: bool = True) -> str:
+    """
+    Random but valid program using every statement kind, with nested blocks up to max_depth.
+    Without current_stack the 'current' name is only used as a binary.
+    """
+    rng = random.Random(seed)
+    binaries = []
+    stacks = []
+    functions = []
+    counter = 0
+    lines = []
+
+    def pick(names: list) -> str:
+        # 'current' is both a binary and a stack, use it now and then
+        if not names or rng.random() < 0.1:
+            if names is stacks and not current_stack:
+                return "data"
+            return "current"
+        return rng.choice(names)
+
+    def expression() -> str:
+        choice = rng.random()
+        if choice < 0.1:
+            return "input()"
+        if choice < 0.25:
+            return rng.choice(["true", "false", "1", "0", "True", "FALSE"])
+        if choice < 0.4:
+            return f"{pick(stacks)}.pop()"
+        if choice < 0.55:
+            return f"not {rng.choice(['(' + expression() + ')', pick(binaries)])}"
+        return pick(binaries)
+
+    def block(depth: int, remaining: int, in_loop: bool) -> int:
+        nonlocal counter
+        indent = "    " * depth
+        while remaining > 0:
+            remaining -= 1
+            counter += 1
+            choice = rng.random()
+            compound = depth < max_depth and remaining > 2
+            if choice < 0.1:
+                name = f"b{counter}"
+                lines.append(f"{indent}binary {name} = {expression()};" if rng.random() < 0.7 else f"{indent}binary {name};")
+                binaries.append(name)
+            elif choice < 0.15:
+                name = f"s{counter}"
+                lines.append(f"{indent}stack {name};")
+                stacks.append(name)
+            elif choice < 0.3:
+                lines.append(f"{indent}{pick(binaries)} = {expression()};")
+            elif choice < 0.4:
+                lines.append(f"{indent}{pick(stacks)}.push({expression()});")
+            elif choice < 0.5:
+                lines.append(f"{indent}output({expression()});")
+            elif choice < 0.55:
+                text = rng.choice(["hello", "a {brace}", "quote's", "tab\\t", ""])
+                lines.append(f'{indent}{rng.choice(["print", "println"])}("{text}");')
+            elif choice < 0.6 and functions:
+                lines.append(f"{indent}{rng.choice(functions)}();")
+            elif choice < 0.63 and in_loop:
+                lines.append(f"{indent}break;")
+            elif choice < 0.75 and compound:
+                size = rng.randint(1, remaining)
+                remaining -= size
+                lines.append(f"{indent}if ({expression()}) {{")
+                remaining += block(depth + 1, size, in_loop)
+                if rng.random() < 0.5:
+                    size = rng.randint(1, max(1, remaining))
+                    remaining -= size
+                    lines.append(f"{indent}}} else {{")
+                    remaining += block(depth + 1, size, in_loop)
+                lines.append(f"{indent}}};")
+            elif choice < 0.85 and compound:
+                size = rng.randint(1, remaining)
+                remaining -= size
+                lines.append(f"{indent}while ({expression()}) {{")
+                remaining += block(depth + 1, size, True)
+                lines.append(f"{indent}}}")
+            elif choice < 0.95 and compound:
+                size = rng.randint(1, remaining)
+                remaining -= size
+                name = f"f{counter}"
+                called = rng.random() < 0.3
+                lines.append(f"{indent}func {name}{'()' if called else ''} {{")
+                remaining += block(depth + 1, size, False)
+                lines.append(f"{indent}}}" if called else f"{indent}}};")
+                functions.append(name)
+            else:
+                lines.append(f"{indent}output({pick(binaries)});")
+        return 0
+
+    if not current_stack:
+        lines.append("stack data;")
+    block(0, statements, False)
+    return "\n".join(lines) + "\n"
+
+
+def many_blocks(variables: int, blocks: int, seed: int = 0) -> str:
+    """
+    Declares `variables` binaries up front, then uses them from `blocks` small if/while bodies.
+    """
+    rng = random.Random(seed)
+    lines = [f"binary v{index} = input();" for index in range(variables)]
+    for index in range(blocks):
+        a, b = f"v{rng.randrange(variables)}", f"v{rng.randrange(variables)}"
+        if index % 2:
+            lines.append(f"if ({a}) {{ {b} = not {a}; }};")
+        else:
+            lines.append(f"while ({a}) {{ {a} = {b}; break; }}")
+    return "\n".join(lines) + "\n"
+
+
+def input_loop(body_statements: int, seed: int = 0) -> str:
+    """
+    Loop running a straight-line body once per true input bit, for measuring execution speed.
+    """
+    body = straight_line(body_statements, seed).splitlines()[2:]
+    # Declarations go before the loop so every iteration runs the same code
+    lines = ["stack data;", "binary acc = input();", "binary go = input();"]
+    lines.extend(line for line in body if line.startswith("binary "))
+    lines.append("while (go) {")
+    lines.extend("    " + line for line in body if not line.startswith("binary "))
+    lines.extend(["    go = input();", "}", "output(acc);"])
+    return "\n".join(lines) + "\n"
+
+
+def circuit(inputs: int, gates: int, seed: int = 0) -> str:
+    """
+    Boolean circuit reading `inputs` bits: random and/or/xor gates written as ifs, a parity loop,
+    and one output per input.
+    """
+    rng = random.Random(seed)
+    wires = [f"x{index}" for index in range(inputs)]
+    lines = [f"binary {wire} = input();" for wire in wires]
+    for index in range(gates):
+        a, b = rng.sample(wires, 2)
+        name = f"g{index}"
+        gate = rng.choice(("and", "or", "xor"))
+        if gate == "and":
+            lines.append(f"binary {name} = false; if ({a}) {{ {name} = {b}; }};")
+        elif gate == "or":
+            lines.append(f"binary {name} = true; if (not {a}) {{ {name} = {b}; }};")
+        else:
+            lines.append(f"binary {name} = {b}; if ({a}) {{ {name} = not {b}; }};")
+        wires.append(name)
+    # Parity of the inputs through a loop over a stack of (bit, true) pairs on top of a false
+    lines.extend(["stack bits;", "bits.push(false);"])
+    lines.extend(f"bits.push(x{index}); bits.push(true);" for index in range(inputs))
+    lines.extend(["binary parity = false;", "binary bit = false;", "binary more = bits.pop();"])
+    lines.append("while (more) {")
+    lines.append("    bit = bits.pop();")
+    # 'parity = not parity;' would read parity after the assignment already popped it
+    lines.append("    if (bit) { bit = not parity; parity = bit; };")
+    lines.append("    more = bits.pop();")
+    lines.append("}")
+    lines.append("output(parity);")
+    lines.extend(f"output({wire});" for wire in wires[-inputs:])
+    return "\n".join(lines) + "\n"
+
+
+def many_functions(functions: int, body_statements: int, seed: int = 0) -> str:
+    """
+    Global binaries and a stack, then `functions` function definitions with random bodies working on
+    them, each calling an earlier function now and then.
+    """
+    rng = random.Random(seed)
+    names = [f"g{index}" for index in range(16)]
+    lines = ["stack data;"] + [f"binary {name} = input();" for name in names]
+    for index in range(functions):
+        called = rng.random() < 0.2
+        lines.append(f"func f{index}{'()' if called else ''} {{")
+        for _ in range(body_statements):
+            choice = rng.random()
+            a, b = rng.sample(names, 2)
+            if choice < 0.3:
+                lines.append(f"    {a} = not {b};")
+            elif choice < 0.5:
+                lines.append(f"    data.push({a});")
+            elif choice < 0.65:
+                lines.append(f"    {a} = data.pop();")
+            elif choice < 0.8:
+                lines.append(f"    if ({a}) {{ output({b}); }} else {{ {b} = {a}; }};")
+            elif choice < 0.9:
+                lines.append(f"    while ({a}) {{ {a} = data.pop(); }}")
+            elif index:
+                lines.append(f"    f{rng.randrange(index)}();")
+        lines.append("}" if called else "};")
+    return "\n".join(lines) + "\n"
+
+
+def function_calls(functions: int, calls: int, seed: int = 0) -> str:
+    """
+    `functions` small function definitions followed by `calls` top-level calls to random ones.
+    """
+    rng = random.Random(seed)
+    lines = ["stack data;", "binary acc = input();"]
+    for index in range(functions):
+        lines.append(f"func f{index} {{")
+        lines.append(f"    data.push({rng.choice(['acc', 'not acc'])});")
+        lines.append("    acc = data.pop();" if rng.random() < 0.5 else "    output(acc);")
+        lines.append("};")
+    lines.extend(f"f{rng.randrange(functions)}();" for _ in range(calls))
+    return "\n".join(lines) + "\n"
+
+
+def print_literals(statements: int, length: int, seed: int = 0) -> str:
+    """
+    print/println statements with `length`-character string literals full of escapes and braces.
+    """
+    rng = random.Random(seed)
+    pieces = ["a", "b", " ", "{", "}", "\\n", "\\t", "\\\"", "'", "x" * 8]
+    lines = []
+    for _ in range(statements):
+        parts = []
+        size = 0
+        while size < length:
+            piece = rng.choice(pieces)
+            parts.append(piece)
+            size += len(piece)
+        lines.append(f'{rng.choice(["print", "println"])}("{"".join(parts)}");')
+    return "\n".join(lines) + "\n"
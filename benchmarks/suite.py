@@ -0,0 +1,151 @@
+"""
+Benchmark suite: seeded worst-case programs, each timed per stage (lex, parse, resolve, translate)
+with the peak memory of every stage and the output size, written as JSON. With --compare the run
+fails when a stage got slower or bigger than a stored baseline by more than the thresholds.
+
+    python -m benchmarks.suite --json baseline.json
+    python -m benchmarks.suite --compare baseline.json --threshold 0.15
+"""
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Callable
+
+from lexer import tokenize_stream
+from parser import Parser
+from symbols import resolve_symbols
+from translator import translate
+from benchmarks.generators import function_calls, nested, print_literals, random_program, straight_line
+
+SUITE_VERSION = 1
+STAGES = ("lex", "parse", "resolve", "translate")
+
+# name -> source generator taking a scale factor
+SCENARIOS: dict[str, Callable[[float], str]] = {
+    "straight_line": lambda scale: straight_line(int(200_000 * scale), seed=1),
+    "nested_if": lambda scale: nested(int(20_000 * scale), "if"),
+    "nested_while": lambda scale: nested(int(20_000 * scale), "while"),
+    "functions": lambda scale: function_calls(int(5_000 * scale), int(20_000 * scale), seed=2),
+    "print_literals": lambda scale: print_literals(int(2_000 * scale), 2_000, seed=3),
+    "random": lambda scale: random_program(int(100_000 * scale), seed=4),
+}
+
+
+def _pipeline(source: str, stage: Callable[[str], None]) -> str:
+    # Runs every stage in order, handing each one's name to `stage` right before it starts
+    stage("lex")
+    tokens = tokenize_stream(source)
+    stage("parse")
+    parser = Parser(tokens)
+    statements = parser.parse_program()
+    stage("resolve")
+    symbols = resolve_symbols(statements, parser.defined_identifiers)
+    stage("translate")
+    output = translate(statements, symbols=symbols)
+    stage("")
+    return output
+
+
+def measure(source: str, repeat: int) -> dict:
+    seconds = {name: float('inf') for name in STAGES}
+    for _ in range(repeat):
+        marks = []
+        gc.collect()
+        _pipeline(source, lambda name: marks.append((name, time.perf_counter())))
+        for (name, start), (_, end) in zip(marks, marks[1:]):
+            seconds[name] = min(seconds[name], end - start)
+
+    # A separate run for memory, tracemalloc slows everything down
+    peaks = {}
+    current = None
+
+    def stage(name: str) -> None:
+        nonlocal current
+        if current:
+            peaks[current] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        current = name
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        output = _pipeline(source, stage)
+    finally:
+        tracemalloc.stop()
+    return {
+        "source_bytes": len(source.encode()),
+        "output_chars": len(output),
+        "stages": {name: {"seconds": seconds[name], "peak_bytes": peaks[name]} for name in STAGES},
+    }
+
+
+def run(names: list[str], scale: float, repeat: int) -> dict:
+    results = {}
+    for name in names:
+        results[name] = measure(SCENARIOS[name](scale), repeat)
+        stages = results[name]["stages"]
+        print(f"{name:<16}" + "".join(f" {stage} {stages[stage]['seconds'] * 1000:8.1f}ms {stages[stage]['peak_bytes'] / 1e6:7.1f}MB"
+                                      for stage in STAGES) + f"  output {results[name]['output_chars']}")
+    return {"version": SUITE_VERSION, "python": platform.python_version(), "scale": scale, "scenarios": results}
+
+
+def compare(baseline: dict, current: dict, threshold: float, memory_threshold: float) -> list[str]:
+    """
+    Returns the regressions of current against baseline: stages more than `threshold` slower or
+    `memory_threshold` bigger at peak, and scenarios whose output grew.
+    """
+    if baseline.get("scale") != current["scale"]:
+        return [f"baseline was run at scale {baseline.get('scale')}, this run at {current['scale']}"]
+    regressions = []
+    for name, result in current["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            continue
+        for stage in STAGES:
+            before, after = base["stages"][stage], result["stages"][stage]
+            time_ratio = after["seconds"] / before["seconds"] if before["seconds"] else 1.0
+            memory_ratio = after["peak_bytes"] / before["peak_bytes"] if before["peak_bytes"] else 1.0
+            print(f"{name:<16} {stage:<10} time {time_ratio:6.2f}x  memory {memory_ratio:6.2f}x")
+            if time_ratio > 1 + threshold:
+                regressions.append(f"{name}/{stage}: {time_ratio:.2f}x the baseline time")
+            if memory_ratio > 1 + memory_threshold:
+                regressions.append(f"{name}/{stage}: {memory_ratio:.2f}x the baseline peak memory")
+        if result["output_chars"] > base["output_chars"]:
+            regressions.append(f"{name}: output grew from {base['output_chars']} to {result['output_chars']} characters")
+    return regressions
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('scenarios', nargs='*', help=f"scenarios to run, of {', '.join(SCENARIOS)} (default: all)")
+    arg_parser.add_argument('--scale', type=float, default=1.0, help="multiplies every program's size")
+    arg_parser.add_argument('--repeat', type=int, default=3, help="timed runs per scenario, the fastest counts")
+    arg_parser.add_argument('--json', default=None, help="write the results to this file")
+    arg_parser.add_argument('--compare', default=None, help="baseline JSON to check this run against")
+    arg_parser.add_argument('--threshold', type=float, default=0.10, help="allowed slowdown per stage (default 0.10)")
+    arg_parser.add_argument('--memory-threshold', type=float, default=0.10, help="allowed peak memory growth per stage (default 0.10)")
+    args = arg_parser.parse_args()
+
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        arg_parser.error(f"unknown scenario {unknown[0]!r}")
+    results = run(args.scenarios or list(SCENARIOS), args.scale, args.repeat)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = compare(baseline, results, args.threshold, args.memory_threshold)
+        for regression in regressions:
+            print("REGRESSION", regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
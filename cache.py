@@ -0,0 +1,189 @@
+"""
+Compilation cache: an in-process memo in front of an optional on-disk store, both keyed by a hash
+of the source, the compiler version and the options.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from compiler import COMPILER_VERSION, CompileResult, compile
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MEMO_SIZE = 128
+_SUFFIX = ".bkc"
+
+
+@dataclass
+class CacheStats:
+    memo_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    writes: int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.memo_hits + self.disk_hits
+
+
+def cache_key(source: str, opt_level: int = 0, allocate: bool = False) -> str:
+    digest = hashlib.sha256()
+    digest.update(f"{COMPILER_VERSION}\0{opt_level}\0{int(allocate)}\0".encode())
+    digest.update(source.encode())
+    return digest.hexdigest()
+
+
+def default_directory() -> str:
+    return os.environ.get("BRAINKNOT_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "brainknot")
+
+
+class CompileCache:
+    """
+    Entries are written atomically (temporary file, then rename) and the directory is kept under
+    max_bytes by evicting the least recently used ones; a hit refreshes the file's mtime. With
+    store_ast, entries also carry the pickled AST and symbol table, and an entry without them (written
+    by a cache without store_ast, or an AST too deep to pickle) is a miss. Without a directory, only the
+    memo is used. Processes sharing a directory each keep their own size estimate.
+    """
+    def __init__(self, directory: str | None = None, max_bytes: int = DEFAULT_MAX_BYTES,
+                 memo_size: int = DEFAULT_MEMO_SIZE, store_ast: bool = False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memo_size = memo_size
+        self.store_ast = store_ast
+        self.stats = CacheStats()
+        self._memo: OrderedDict[str, CompileResult] = OrderedDict()
+        self._entries: dict[str, tuple[float, int]] | None = None  # path -> (mtime, size), read lazily
+        self._size = 0
+
+    def compile(self, source: str, *, opt_level: int = 0, allocate: bool = False) -> CompileResult:
+        key = cache_key(source, opt_level, allocate)
+        result = self._memo.get(key)
+        if result is not None:
+            self._memo.move_to_end(key)
+            self.stats.memo_hits += 1
+            return result
+        start = time.perf_counter()
+        result = self._load(key, source)
+        if result is not None:
+            result.timings = {"cache": time.perf_counter() - start}
+            self.stats.disk_hits += 1
+        else:
+            self.stats.misses += 1
+            result = compile(source, opt_level=opt_level, allocate=allocate)
+            self._store(key, result)
+        self._remember(key, result)
+        return result
+
+    def clear(self) -> None:
+        self._memo.clear()
+        for path in list(self._index()):
+            self._remove(path)
+
+    def _remember(self, key: str, result: CompileResult) -> None:
+        self._memo[key] = result
+        if len(self._memo) > self.memo_size:
+            self._memo.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + _SUFFIX)
+
+    def _index(self) -> dict[str, tuple[float, int]]:
+        if self._entries is None:
+            self._entries = {}
+            self._size = 0
+            if self.directory and os.path.isdir(self.directory):
+                for root, _, files in os.walk(self.directory):
+                    for name in files:
+                        if name.endswith(_SUFFIX):
+                            path = os.path.join(root, name)
+                            try:
+                                status = os.stat(path)
+                            except OSError:
+                                continue
+                            self._entries[path] = (status.st_mtime, status.st_size)
+                            self._size += status.st_size
+        return self._entries
+
+    def _load(self, key: str, source: str) -> CompileResult | None:
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                entry = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError, ValueError, TypeError):
+            # A damaged entry is just a miss
+            self._remove(path)
+            return None
+        if not isinstance(entry, dict) or entry.get("version") != COMPILER_VERSION:
+            self._remove(path)
+            return None
+        if self.store_ast and entry.get("ast") is None:
+            # Compiled again and stored with the AST this time
+            return None
+        now = time.time()
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+        index = self._index()
+        if path in index:
+            index[path] = (now, index[path][1])
+        return CompileResult(source, None, entry.get("ast"), entry.get("symbols"), entry["output"])
+
+    def _store(self, key: str, result: CompileResult) -> None:
+        if not self.directory:
+            return
+        entry = {"version": COMPILER_VERSION, "output": result.output}
+        if self.store_ast:
+            entry["ast"] = result.ast
+            entry["symbols"] = result.symbols
+        try:
+            data = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+        except RecursionError:
+            # Very deeply nested ASTs can't be pickled, keep the output only
+            data = pickle.dumps({"version": COMPILER_VERSION, "output": result.output}, protocol=pickle.HIGHEST_PROTOCOL)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(data)
+            os.replace(temporary, path)
+        except BaseException:
+            try:
+                os.unlink(temporary)
+            except OSError:
+                pass
+            raise
+        self.stats.writes += 1
+        index = self._index()
+        self._size -= index.get(path, (0, 0))[1]
+        index[path] = (time.time(), len(data))
+        self._size += len(data)
+        self._evict()
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        index = self._index()
+        if path in index:
+            self._size -= index.pop(path)[1]
+
+    def _evict(self) -> None:
+        if self._size <= self.max_bytes:
+            return
+        index = self._index()
+        for path, _ in sorted(index.items(), key=lambda item: item[1][0]):
+            if self._size <= self.max_bytes:
+                break
+            self._remove(path)
+            self.stats.evictions += 1
@@ -0,0 +1,111 @@
+"""
+Thin client of the compile server, taking the same arguments as batch.py. It only imports the
+standard library and protocol.py, the compiling happens in the server; without a server running it
+compiles in this process like batch.py would.
+
+    python client.py src/ 'examples/**/*.bk' -o build -O2
+"""
+import argparse
+import os
+import socket
+import sys
+import time
+from protocol import default_socket_path, request
+
+
+class ServerError(RuntimeError):
+    pass
+
+
+class Client:
+    """A connection to the compile server, for any number of requests."""
+    def __init__(self, path: str | None = None):
+        self.path = path or default_socket_path()
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._socket.connect(self.path)
+        except OSError:
+            self._socket.close()
+            raise
+
+    def close(self) -> None:
+        self._socket.close()
+
+    def __enter__(self) -> 'Client':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def request(self, message: dict) -> dict:
+        response = request(self._socket, message)
+        if "error" in response:
+            raise ServerError(response["error"])
+        return response
+
+    def compile(self, source: str, opt_level: int = 0, allocate: bool = False) -> str:
+        return self.request({"op": "compile", "source": source, "opt_level": opt_level, "allocate": allocate})["output"]
+
+    def compile_files(self, paths: list[str], output_dir: str | None = None, opt_level: int = 0, allocate: bool = False,
+                      source_map: bool = False) -> list[dict]:
+        # The server resolves paths in its own working directory
+        return self.request({"op": "compile_files", "paths": [os.path.abspath(path) for path in paths],
+                             "output_dir": os.path.abspath(output_dir) if output_dir else None,
+                             "opt_level": opt_level, "allocate": allocate, "source_map": source_map})["results"]
+
+    def stats(self) -> dict:
+        return self.request({"op": "stats"})
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Brainknot Compile Server Client")
+    arg_parser.add_argument('paths', nargs='+', help="source files, directories or glob patterns")
+    arg_parser.add_argument('-o', '--output-dir', default=None, help="write outputs into this tree instead of next to the inputs")
+    arg_parser.add_argument('-O', dest='opt_level', type=int, choices=(0, 1, 2), default=0)
+    arg_parser.add_argument('--allocate', action='store_true', help="pack runtime stacks by liveness")
+    arg_parser.add_argument('-j', '--jobs', type=int, default=None, help="worker processes without a server (default: CPU count)")
+    arg_parser.add_argument('--chunksize', type=int, default=None, help="files handed to a worker at a time without a server")
+    arg_parser.add_argument('--cache-dir', default=None, help="cache directory without a server, the server has its own")
+    arg_parser.add_argument('--slowest', type=int, default=5, help="how many of the slowest files to list")
+    arg_parser.add_argument('--source-map', action='store_true', help="write a source map next to every output (not with -O2)")
+    arg_parser.add_argument('--socket', default=default_socket_path(), help="Unix socket of the server (default: %(default)s)")
+    args = arg_parser.parse_args()
+    if args.source_map and args.opt_level >= 2:
+        arg_parser.error("--source-map can't be used with -O2")
+
+    start = time.perf_counter()
+    try:
+        with Client(args.socket) as client:
+            results = client.compile_files(args.paths, args.output_dir, args.opt_level, args.allocate, args.source_map)
+        for result in results:
+            result["path"] = os.path.relpath(result["path"])
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"No server on {args.socket}, compiling here", file=sys.stderr)
+        from batch import compile_files, find_sources
+        paths = find_sources(args.paths)
+        results = [vars(result) for result in compile_files(paths, args.output_dir, args.opt_level, args.allocate, args.jobs,
+                                                            args.chunksize, args.cache_dir, args.source_map, pause_gc=True)]
+    except ServerError as error:
+        print("Error:", error, file=sys.stderr)
+        sys.exit(2)
+    elapsed = time.perf_counter() - start
+    if not results:
+        print("No sources found", file=sys.stderr)
+        sys.exit(2)
+
+    failed = [result for result in results if result["error"]]
+    for result in failed:
+        print(f"{result['path']}: {result['error']}", file=sys.stderr)
+    megabytes = sum(result["source_bytes"] for result in results) / 1e6
+    print(f"{len(results) - len(failed)} compiled, {len(failed)} failed in {elapsed:.2f}s: "
+          f"{len(results) / elapsed:.1f} files/s, {megabytes / elapsed:.2f} MB/s")
+    if args.slowest > 0:
+        print("Slowest:")
+        for result in sorted(results, key=lambda result: -result["seconds"])[:args.slowest]:
+            print(f"  {result['seconds'] * 1000:9.2f}ms  {result['path']}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Second execution backend: turns target code into a Python function, with '[A,B]' as if/else,
+'(A)' as while and the runtime stacks as plain lists in locals, compiled once per program.
+"""
+import hashlib
+from dataclasses import dataclass
+from typing import Callable, Iterable
+from target import SELECT, TEXT, DEFINE, DEFINE_AND_CALL, CALL, decode
+import vm
+
+# CPython refuses more than 20 nested loops in one function and 100 levels of indentation
+MAX_LOOP_DEPTH = 19
+MAX_INDENT = 90
+CACHE_SIZE = 256
+
+
+class _TooDeep(Exception):
+    pass
+
+
+@dataclass
+class CompiledProgram:
+    code: str  # target code
+    source: str | None  # generated Python, None when the program runs on the VM instead
+    function: Callable | None
+    stack_count: int
+    fallback: vm.Program | None = None
+
+
+class _Frame:
+    __slots__ = ('kind', 'lines', 'depth', 'body_start', 'loops', 'entry', 'then_end', 'name')
+
+    def __init__(self, kind: str, lines: list[str], depth: int, loops: int, entry: int | None, name: str = ""):
+        self.kind = kind
+        self.lines = lines  # lines of the enclosing code
+        self.depth = depth  # indentation level of the opening line
+        self.body_start = len(lines)  # first line of the body, after the opening line
+        self.loops = loops
+        self.entry = entry  # stack selected when the construct was entered
+        self.then_end: int | None = None
+        self.name = name
+
+
+class _Emitter:
+    """
+    Writes the Python source of a decoded program. The selected stack is tracked statically as long
+    as control flow allows it, and the 'stack' variable is only updated where that knowledge ends.
+    """
+    def __init__(self):
+        self.main: list[str] = []
+        self.functions: list[list[str]] = []
+        self.stacks: set[int] = {0}
+        self.selected: int | None = 0
+        self.synced = True  # 'stack' holds the selected stack
+
+    def target(self) -> str:
+        return "stack" if self.selected is None else f"s{self.selected}"
+
+    def sync(self, lines: list[str], indent: str) -> None:
+        if not self.synced:
+            lines.append(f"{indent}stack = s{self.selected}")
+            self.synced = True
+
+    def forget(self) -> None:
+        self.selected = None
+        self.synced = True
+
+    def emit(self, instructions: list) -> None:
+        lines = self.main
+        depth = 1
+        loops = 0
+        frames: list[_Frame] = []
+        index = 0
+        count = len(instructions)
+        while index < count:
+            kind, argument = instructions[index]
+            index += 1
+            indent = "    " * depth
+            if kind == SELECT:
+                self.stacks.add(argument)
+                if argument != self.selected:
+                    self.selected = argument
+                    self.synced = False
+            elif kind == '-':
+                stack = self.target()
+                if index < count and instructions[index][0] == '+':
+                    index += 1
+                    lines.append(f"{indent}if {stack}: current = {stack}[-1]")
+                    lines.append(f"{indent}else: current = False; {stack}.append(False)")
+                else:
+                    lines.append(f"{indent}current = {stack}.pop() if {stack} else False")
+            elif kind == '+':
+                lines.append(f"{indent}{self.target()}.append(current)")
+            elif kind == '*':
+                lines.append(f"{indent}current = not current")
+            elif kind == '>':
+                lines.append(f"{indent}current = read()")
+            elif kind == '<':
+                lines.append(f"{indent}put(current)")
+            elif kind == TEXT:
+                lines.append(f"{indent}show({vm.unescape_text(argument)!r})")
+            elif kind == '[':
+                if instructions[index:index + 2] == [('*', None), (']', None)]:
+                    lines.append(f"{indent}current = False")
+                    index += 2
+                    continue
+                if instructions[index:index + 3] == [(',', None), ('*', None), (']', None)]:
+                    lines.append(f"{indent}current = True")
+                    index += 3
+                    continue
+                self.sync(lines, indent)
+                lines.append(f"{indent}if current:")
+                frames.append(_Frame('[', lines, depth, loops, self.selected))
+                depth += 1
+            elif kind == ',':
+                frame = frames[-1]
+                self.sync(lines, indent)
+                if len(lines) == frame.body_start:
+                    lines.append(f"{indent}pass")
+                lines.append(f"{'    ' * frame.depth}else:")
+                frame.kind = ','
+                frame.body_start = len(lines)
+                frame.then_end = self.selected
+                # The else branch starts from the selection the if started with
+                self.selected = frame.entry
+            elif kind in (']', ')'):
+                frame = frames.pop()
+                self.sync(lines, indent)
+                if frame.kind in (DEFINE, DEFINE_AND_CALL):
+                    if len(lines) == 2:
+                        lines.append(f"{indent}pass")
+                    lines, depth, loops = frame.lines, frame.depth, frame.loops
+                    self.selected = frame.entry
+                    if frame.kind == DEFINE_AND_CALL:
+                        lines.append(f"{'    ' * depth}fn_{frame.name}()")
+                        self.forget()
+                    continue
+                depth -= 1
+                if len(lines) == frame.body_start:
+                    if frame.kind == ',':
+                        lines.pop()  # 'else:' with nothing in it
+                    else:
+                        lines.append(f"{indent}pass")
+                if frame.kind == '(':
+                    loops -= 1
+                    self.forget()
+                elif frame.kind == ',':
+                    if frame.then_end != self.selected:
+                        self.forget()
+                elif frame.entry != self.selected:
+                    self.forget()
+            elif kind == '(':
+                self.sync(lines, indent)
+                lines.append(f"{indent}while current:")
+                frames.append(_Frame('(', lines, depth, loops, self.selected))
+                depth += 1
+                loops += 1
+                self.forget()
+            elif kind == '.':
+                self.sync(lines, indent)
+                in_loop = False
+                for frame in reversed(frames):
+                    if frame.kind == '(':
+                        in_loop = True
+                        break
+                    if frame.kind in (DEFINE, DEFINE_AND_CALL):
+                        break
+                lines.append(f"{indent}{'break' if in_loop else 'return'}")
+            elif kind in (DEFINE, DEFINE_AND_CALL):
+                # Functions are defined statically, so every one becomes a closure of the whole program
+                self.sync(lines, indent)
+                frames.append(_Frame(kind, lines, depth, loops, self.selected, argument))
+                lines = [f"    def fn_{argument}():", "        nonlocal current, stack"]
+                self.functions.append(lines)
+                depth = 2
+                loops = 0
+                self.forget()
+            elif kind == CALL:
+                self.sync(lines, indent)
+                lines.append(f"{indent}fn_{argument}()")
+                self.forget()
+            if depth > MAX_INDENT or loops > MAX_LOOP_DEPTH:
+                raise _TooDeep()
+        if frames:
+            raise SyntaxError(f"Unclosed '{frames[-1].kind}' in target code")
+
+    def source(self) -> str:
+        lines = ["def _program(read, put, show, stacks):"]
+        lines.extend(f"    s{number} = stacks[{number}]" for number in sorted(self.stacks))
+        lines.append("    current = False")
+        lines.append("    stack = s0")
+        for body in self.functions:
+            lines.extend(body)
+        lines.extend(self.main)
+        return "\n".join(lines) + "\n"
+
+
+_cache: dict[str, CompiledProgram] = {}
+
+
+def compile_program(code: str) -> CompiledProgram:
+    """
+    Compiles target code to a Python function, or to a VM program when it nests too deeply for
+    CPython. Results are cached by the hash of the code.
+    """
+    key = hashlib.sha256(code.encode()).hexdigest()
+    compiled = _cache.get(key)
+    if compiled is not None:
+        return compiled
+    instructions = decode(code)
+    emitter = _Emitter()
+    try:
+        emitter.emit(instructions)
+        source = emitter.source()
+        namespace: dict = {}
+        exec(compile(source, f"<brainknot {key[:12]}>", "exec"), namespace)
+        compiled = CompiledProgram(code, source, namespace['_program'], max(emitter.stacks) + 1)
+    except (_TooDeep, RecursionError, MemoryError):
+        program = vm.load(code)
+        compiled = CompiledProgram(code, None, None, program.stack_count, program)
+    except SyntaxError as error:
+        if "too many statically nested blocks" not in str(error) and "indentation" not in str(error):
+            raise
+        program = vm.load(code)
+        compiled = CompiledProgram(code, None, None, program.stack_count, program)
+    if len(_cache) >= CACHE_SIZE:
+        del _cache[next(iter(_cache))]
+    _cache[key] = compiled
+    return compiled
+
+
+def run(program: CompiledProgram | str, input: Callable[[], bool] | Iterable = (), output: Callable[[bool], None] | None = None,
+        write: Callable[[str], None] | None = None, max_steps: int | None = None) -> vm.ExecutionResult:
+    """
+    Same interface as vm.run. Compiled code doesn't count steps, so a step limit runs the program
+    on the VM instead, and steps are reported as 0 otherwise.
+    """
+    if isinstance(program, str):
+        program = compile_program(program)
+    if program.function is None or max_steps is not None:
+        return vm.run(program.fallback or vm.load(program.code), input, output, write, max_steps)
+    result = vm.ExecutionResult()
+    read = input if callable(input) else vm.input_bits(input)
+    result.stacks = [[] for _ in range(program.stack_count)]
+    program.function(read, output if output is not None else result.outputs.append,
+                     write if write is not None else result.text.append, result.stacks)
+    return result
@@ -0,0 +1,94 @@
+"""
+The whole pipeline behind one call: lex, parse, resolve symbols, optimize, translate, each exactly once.
+"""
+import time
+from dataclasses import dataclass, field
+from lexer import TokenStream, tokenize_stream
+from parser import Parser
+from symbols import SymbolTable, resolve_symbols
+from optimizer import optimize
+from allocator import allocate_stacks
+from translator import translate
+from peephole import peephole
+from inliner import FunctionReport, inline_functions
+from sourcemap import SourceMap
+
+# Bumped whenever the same source and options may compile to different output, invalidates cache entries
+COMPILER_VERSION = "3"
+
+# What compile() can stop after, in pipeline order
+EMIT_TOKENS = "tokens"
+EMIT_AST = "ast"
+EMIT_TARGET = "target"
+EMIT_KINDS = (EMIT_TOKENS, EMIT_AST, EMIT_TARGET)
+
+
+@dataclass
+class CompileResult:
+    source: str
+    tokens: TokenStream | None  # None when the result came from the on-disk cache
+    ast: list | None = None  # after resolution and optimization
+    symbols: SymbolTable | None = None
+    output: str | None = None  # target code
+    source_map: SourceMap | None = None  # when asked for
+    functions: FunctionReport | None = None  # what -O2 merged and inlined
+    timings: dict[str, float] = field(default_factory=dict)  # stage -> seconds, in pipeline order
+
+
+def compile(source: str, *, opt_level: int = 0, emit: str = EMIT_TARGET, allocate: bool = False, jobs: int = 1,
+            source_map: bool = False) -> CompileResult:
+    """
+    Compiles Brainknot source up to the `emit` stage. -O2 also merges and inlines functions and
+    peephole-optimizes the target code, allocate packs runtime stacks by liveness, and jobs > 1
+    translates top-level functions in parallel (for programs of translator.PARALLEL_MIN_LINES lines on).
+    source_map maps the target code back to source lines, which -O2 doesn't support: the peephole
+    optimizer rewrites code across statements. It needs jobs == 1.
+    """
+    if emit not in EMIT_KINDS:
+        raise ValueError(f"emit must be one of {', '.join(EMIT_KINDS)}, not {emit!r}")
+    if source_map and opt_level >= 2:
+        raise ValueError("source maps can't be made at -O2")
+    if source_map and jobs > 1:
+        raise ValueError("source maps are made translating sequentially, jobs must be 1")
+    timings = {}
+    start = time.perf_counter()
+
+    def lap(stage: str) -> None:
+        nonlocal start
+        now = time.perf_counter()
+        timings[stage] = now - start
+        start = now
+
+    tokens = tokenize_stream(source)
+    lap("lex")
+    result = CompileResult(source, tokens, timings=timings)
+    if emit == EMIT_TOKENS:
+        return result
+
+    parser = Parser(tokens)
+    statements = parser.parse_program()
+    lap("parse")
+    symbols = resolve_symbols(statements, parser.defined_identifiers)
+    lap("resolve")
+    statements = optimize(statements, opt_level)
+    lap("optimize")
+    if opt_level >= 2:
+        statements, result.functions = inline_functions(statements, symbols)
+        lap("inline")
+    result.ast = statements
+    result.symbols = symbols
+    if emit == EMIT_AST:
+        return result
+
+    if allocate:
+        allocate_stacks(statements, symbols)
+        lap("allocate")
+    if source_map:
+        result.source_map = SourceMap()
+    output = translate(statements, symbols=symbols, jobs=jobs, source_map=result.source_map)
+    lap("translate")
+    if opt_level >= 2:
+        output = peephole(output)
+        lap("peephole")
+    result.output = output
+    return result
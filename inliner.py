@@ -0,0 +1,202 @@
+"""
+Whole-program function pass, run at -O2 after optimize(): functions whose bodies translate to the
+same target code are merged under the first one's name, functions are inlined where that saves a
+call dispatch without growing the output much, and definitions no call is left to are removed.
+A function is inlined at every call site when it's called from a single place or its body is no
+longer than a call, and at the call sites inside loops when its body is at most INLINE_SIZE long.
+
+Functions are static in the target code, a call jumps to its definition wherever that is, so
+merging only renames calls. Bodies that break at function level (a '.' outside any loop of the
+body returns from the function) or define functions themselves are never inlined or merged away.
+"""
+from dataclasses import dataclass, field
+from typing import Callable
+from nodes import FUNCTION_KINDS, BREAK_LOOP, FUNCTION_CALL, FUNCTION_DEFINITION, WHILE_LOOP, Node
+from symbols import SymbolTable
+from translator import translate
+
+# Bodies of at most this many characters of target code are inlined at call sites inside loops
+INLINE_SIZE = 16
+
+
+@dataclass
+class FunctionReport:
+    merged: dict[str, str] = field(default_factory=dict)  # removed duplicate -> function its calls now go to
+    inlined: dict[str, int] = field(default_factory=dict)  # function -> call sites it was inlined at
+    removed: list[str] = field(default_factory=list)  # definitions dropped, duplicates included
+    calls_before: int = 0  # call sites in the program
+    calls_after: int = 0
+
+    def format(self) -> str:
+        lines = [f"Call sites: {self.calls_before} -> {self.calls_after}"]
+        lines.extend(f"  merged {duplicate} into {kept}" for duplicate, kept in self.merged.items())
+        lines.extend(f"  inlined {name} at {sites} call site{'s' if sites != 1 else ''}"
+                     for name, sites in self.inlined.items())
+        if self.removed:
+            lines.append(f"  removed {', '.join(self.removed)}")
+        return "\n".join(lines)
+
+
+def _copy(node: Node) -> Node:
+    # Deep copy through the node classes' metadata, an inlined body must not share nodes with its function
+    copy = object.__new__(type(node))
+    for name in node.field_names:
+        if hasattr(node, name):
+            setattr(copy, name, getattr(node, name))
+    copy.line = node.line
+    for name in node.expressions:
+        setattr(copy, name, _copy(getattr(node, name)))
+    for name in node.blocks:
+        setattr(copy, name, [_copy(child) for child in getattr(node, name)])
+    return copy
+
+
+def _blocks(statements: list) -> list[tuple[Node | None, str | None, bool]]:
+    # Every statement list of the program as (owner node, field, inside a loop of the same function
+    # body), the program itself first
+    blocks = [(None, None, False)]
+    work = [(statement, False) for statement in statements]
+    while work:
+        statement, in_loop = work.pop()
+        if statement.kind in FUNCTION_KINDS:
+            in_loop = False
+        elif statement.kind == WHILE_LOOP:
+            in_loop = True
+        for name in statement.blocks:
+            blocks.append((statement, name, in_loop))
+            work.extend((child, in_loop) for child in getattr(statement, name))
+    return blocks
+
+
+def _definitions(statements: list) -> list[Node]:
+    # Function definitions in the order their bodies end, so a function comes after every function it
+    # calls: resolve_symbols only lets a function be called once its whole body has been seen
+    definitions = []
+    work: list = [(statement, False) for statement in reversed(statements)]
+    while work:
+        statement, done = work.pop()
+        if done:
+            definitions.append(statement)
+            continue
+        if statement.kind in FUNCTION_KINDS:
+            work.append((statement, True))
+        for name in reversed(statement.blocks):
+            work.extend((child, False) for child in reversed(getattr(statement, name)))
+    return definitions
+
+
+def _inlinable(body: list) -> bool:
+    # No function definitions and no break that would return from the function
+    work = [(statement, 0) for statement in body]
+    while work:
+        statement, loops = work.pop()
+        if statement.kind in FUNCTION_KINDS or (statement.kind == BREAK_LOOP and not loops):
+            return False
+        inner = loops + (statement.kind == WHILE_LOOP)
+        for name in statement.blocks:
+            work.extend((child, inner) for child in getattr(statement, name))
+    return True
+
+
+def _call_sites(statements: list) -> dict[int, int]:
+    counts: dict[int, int] = {}
+    work = list(statements)
+    while work:
+        statement = work.pop()
+        if statement.kind == FUNCTION_CALL:
+            counts[statement.slot] = counts.get(statement.slot, 0) + 1
+        for name in statement.blocks:
+            work.extend(getattr(statement, name))
+    return counts
+
+
+class _Inliner:
+    def __init__(self):
+        self.bodies: dict[int, tuple[list, bool]] = {}  # slot -> (body, inlined outside of loops too)
+        self.sites: dict[int, int] = {}  # slot -> call sites inlined at
+
+    def expand(self, block: list, in_loop: bool) -> list:
+        # The block with the calls to inlined functions replaced by copies of their bodies
+        bodies = self.bodies
+        if not any(statement.kind == FUNCTION_CALL and statement.slot in bodies for statement in block):
+            return block
+        expanded = []
+        for statement in block:
+            inlined = bodies.get(statement.slot) if statement.kind == FUNCTION_CALL else None
+            if inlined is not None and (in_loop or inlined[1]):
+                expanded.extend(_copy(child) for child in inlined[0])
+                self.sites[statement.slot] = self.sites.get(statement.slot, 0) + 1
+            else:
+                expanded.append(statement)
+        return expanded
+
+    def run(self, statements: list) -> list:
+        return _rewrite_blocks(statements, self.expand)
+
+
+def _rewrite_blocks(statements: list, rewrite: Callable[[list, bool], list]) -> list:
+    for owner, name, in_loop in _blocks(statements):
+        if owner is None:
+            statements = rewrite(statements, in_loop)
+        else:
+            setattr(owner, name, rewrite(getattr(owner, name), in_loop))
+    return statements
+
+
+def inline_functions(statements: list, symbols: SymbolTable, inline_size: int = INLINE_SIZE) -> tuple[list, FunctionReport]:
+    """
+    Merges, inlines and removes functions of a resolved program, see the module docstring. Returns
+    the new statements and a report of what was done.
+    """
+    report = FunctionReport()
+    names = symbols.function_names
+    before = _call_sites(statements)
+    report.calls_before = sum(before.values())
+    definitions = _definitions(statements)
+
+    # Merge definitions with identical bodies into the first one; only plain definitions go away,
+    # one that is also called where it stands has to stay
+    first: dict[str, int] = {}
+    redirect: dict[int, int] = {}
+    for definition in sorted(definitions, key=lambda definition: definition.line):
+        if not _inlinable(definition.body):
+            continue
+        code = translate(definition.body, symbols=symbols)
+        kept = first.setdefault(code, definition.slot)
+        if kept != definition.slot and definition.kind == FUNCTION_DEFINITION:
+            redirect[definition.slot] = kept
+            report.merged[names[definition.slot]] = names[kept]
+    if redirect:
+        for owner, name, _ in _blocks(statements):
+            for statement in (statements if owner is None else getattr(owner, name)):
+                if statement.kind == FUNCTION_CALL and statement.slot in redirect:
+                    statement.slot = redirect[statement.slot]
+                    statement.name = names[statement.slot]
+
+    # Callees come first, so a body is expanded before it gets inlined anywhere
+    calls = _call_sites(statements)
+    inliner = _Inliner()
+    for definition in definitions:
+        slot = definition.slot
+        if slot in redirect or not calls.get(slot) or not _inlinable(definition.body):
+            continue
+        definition.body = inliner.run(definition.body)
+        size = len(translate(definition.body, symbols=symbols))
+        if (calls[slot] == 1 and definition.kind == FUNCTION_DEFINITION) or size <= len(names[slot]) + 1:
+            inliner.bodies[slot] = (definition.body, True)
+        elif size <= inline_size:
+            inliner.bodies[slot] = (definition.body, False)
+    statements = inliner.run(statements)
+    report.inlined = {names[slot]: sites for slot, sites in inliner.sites.items()}
+
+    # Drop the plain definitions the pass took every call away from
+    after = _call_sites(statements)
+    unused = {definition.slot for definition in definitions
+              if definition.kind == FUNCTION_DEFINITION and before.get(definition.slot) and not after.get(definition.slot)}
+    unused.update(redirect)
+    if unused:
+        report.removed = [names[slot] for slot in sorted(unused)]
+        statements = _rewrite_blocks(statements, lambda block, in_loop: [
+            statement for statement in block if statement.kind != FUNCTION_DEFINITION or statement.slot not in unused])
+    report.calls_after = sum(_call_sites(statements).values())
+    return statements, report
@@ -0,0 +1,110 @@
+"""
+Opt-in instrumentation of the compiler: timing spans and counters, handed to the sinks registered
+with add_sink(). With no sink registered nothing is measured: the lexer, parser and translator check
+`sinks` once per call and otherwise run their usual code.
+
+    with instrumentation.collecting() as stats:
+        compile(source)
+    print(stats.report())
+
+Spans: tokenize, parse_program, translate (one per block, with the block's nesting level as a
+`depth` attribute, the whole program being depth 0) and translate_expression. Counters: tokens
+(per `kind`), nodes (per `type`), identifiers, references and emitted_bytes. Gauges: max_depth.
+"""
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+
+class Sink:
+    """Receives measurements, subclass it and override what you need."""
+    def span(self, name: str, seconds: float, attributes: dict[str, Any]) -> None:
+        pass
+
+    def count(self, name: str, value: int, attributes: dict[str, Any]) -> None:
+        pass
+
+    def gauge(self, name: str, value: float, attributes: dict[str, Any]) -> None:
+        pass
+
+
+sinks: list[Sink] = []
+
+
+def add_sink(sink: Sink) -> Sink:
+    sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink: Sink) -> None:
+    sinks.remove(sink)
+
+
+def record_span(name: str, seconds: float, **attributes: Any) -> None:
+    for sink in sinks:
+        sink.span(name, seconds, attributes)
+
+
+def count(name: str, value: int = 1, **attributes: Any) -> None:
+    for sink in sinks:
+        sink.count(name, value, attributes)
+
+
+def gauge(name: str, value: float, **attributes: Any) -> None:
+    for sink in sinks:
+        sink.gauge(name, value, attributes)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start, **attributes)
+
+
+def _key(name: str, attributes: dict[str, Any]) -> tuple:
+    return (name,) + tuple(sorted(attributes.items()))
+
+
+class Collector(Sink):
+    """Sink that adds everything up, keyed by name and attributes."""
+    def __init__(self):
+        self.spans: dict[tuple, list[float]] = {}  # key -> [total seconds, calls]
+        self.counters: dict[tuple, int] = {}
+        self.gauges: dict[tuple, float] = {}  # highest value seen
+
+    def span(self, name: str, seconds: float, attributes: dict[str, Any]) -> None:
+        total = self.spans.setdefault(_key(name, attributes), [0.0, 0])
+        total[0] += seconds
+        total[1] += 1
+
+    def count(self, name: str, value: int, attributes: dict[str, Any]) -> None:
+        key = _key(name, attributes)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name: str, value: float, attributes: dict[str, Any]) -> None:
+        key = _key(name, attributes)
+        self.gauges[key] = max(self.gauges.get(key, value), value)
+
+    def report(self) -> str:
+        def label(key: tuple) -> str:
+            return key[0] + "".join(f" {name}={value}" for name, value in key[1:])
+
+        lines = ["Spans:"]
+        lines.extend(f"  {label(key):<36} {seconds * 1000:10.3f}ms  {calls:>8} calls"
+                     for key, (seconds, calls) in sorted(self.spans.items()))
+        lines.append("Counters:")
+        lines.extend(f"  {label(key):<36} {value:>12}" for key, value in sorted(self.counters.items()))
+        lines.extend(f"  {label(key):<36} {value:>12}" for key, value in sorted(self.gauges.items()))
+        return "\n".join(lines)
+
+
+@contextmanager
+def collecting() -> Iterator[Collector]:
+    collector = add_sink(Collector())
+    try:
+        yield collector
+    finally:
+        remove_sink(collector)
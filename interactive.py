@@ -1,9 +1,33 @@
+import argparse
 import sys
-from lexer import tokenize
-from parser import Parser
-from translator import translate
+import instrumentation
+from cache import CompileCache
+from compiler import compile
+from session import CompilationSession
+from vm import run
+
+
+def read_bit() -> bool:
+    return input("input bit: ").strip() not in ("", "0")
+
 
 def main():
+    arg_parser = argparse.ArgumentParser(description="Brainknot Interactive Compiler")
+    arg_parser.add_argument('-O', dest='opt_level', type=int, choices=(0, 1, 2), default=0,
+                            help="optimization level, -O2 also runs the peephole optimizer (default 0)")
+    arg_parser.add_argument('--max-steps', type=int, default=1_000_000,
+                            help="stop running a program after this many VM steps (default 1000000)")
+    arg_parser.add_argument('--cache-dir', default=None,
+                            help="also keep compiled programs in this directory across sessions")
+    arg_parser.add_argument('--session', action='store_true',
+                            help="keep the code of every entry and run each new entry as part of one program")
+    arg_parser.add_argument('--stats', action='store_true',
+                            help="print where each compile spent its time and what it produced instead of the tokens and AST")
+    args = arg_parser.parse_args()
+    # Re-entering an identical buffer only costs a hash
+    cache = CompileCache(args.cache_dir, store_ast=True)
+    # Only compiles what each entry adds, the program so far stays lexed, parsed and translated
+    session = CompilationSession(opt_level=min(args.opt_level, 1)) if args.session else None
     print("Brainknot Interactive Compiler")
     print("How to use:")
     print(" - Enter Brainknot code line by line.")
@@ -22,18 +46,44 @@ def main():
                     source = "\n".join(buffer)
                     buffer.clear()
 
-                    # Lexical analysis
-                    tokens = tokenize(source)
-                    print("Tokens:", tokens)
-
-                    # Parsing
-                    parser = Parser(tokens)
-                    ast = parser.parse_program()
-                    print("AST:", ast)
+                    collector = instrumentation.add_sink(instrumentation.Collector()) if args.stats else None
+                    try:
+                        if session is not None:
+                            lines = len(session.lines)
+                            try:
+                                stats = session.append(source)
+                            except Exception:
+                                # Drop the entry again so the program so far stays runnable
+                                session.update((lines, len(session.lines)), "")
+                                raise
+                            if collector is None:
+                                print("AST:", session.statements_from(lines))
+                            output = session.output
+                            print(f"Output: {output} ({stats.lines_lexed} lines compiled)")
+                        elif collector is not None:
+                            # Past the cache, a cached result would have nothing to measure
+                            result = compile(source, opt_level=args.opt_level)
+                            output = result.output
+                            print("Output:", output)
+                            if result.functions is not None:
+                                print(result.functions.format())
+                        else:
+                            # Lexing, parsing, optimization and translation, each done once
+                            result = cache.compile(source, opt_level=args.opt_level)
+                            print("Tokens:", list(result.tokens) if result.tokens is not None else "(cached)")
+                            print("AST:", result.ast)
+                            output = result.output
+                            print("Output:", output)
+                    finally:
+                        if collector is not None:
+                            instrumentation.remove_sink(collector)
+                    if collector is not None:
+                        print(collector.report())
 
-                    # Translation
-                    output = translate(parser=parser)
-                    print("Output:", output)
+                    # Execution
+                    result = run(output, read_bit, lambda bit: print("output bit:", int(bit)),
+                                 lambda text: print(text, end=""), args.max_steps)
+                    print(f"\nRan {result.steps} steps")
                     print("Brainknot Interactive Compiler")
                     print("How to use:")
                     print(" - Enter Brainknot code line by line.")
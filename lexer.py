@@ -1,5 +1,10 @@
+from array import array
+from bisect import bisect_right
+from collections import Counter
 from dataclasses import dataclass
+from typing import Iterable, Iterator, Sequence, TextIO
 import re
+import instrumentation
 
 @dataclass
 class Token:
@@ -8,81 +13,217 @@ class Token:
     expression: bool  # Whether this token is part of an expression
     line: int # for logging
 
-def tokenize(code: str) -> list:
+# Define token specifications in order of priority
+TOKEN_SPECS = [
+    # Format: (type_name, regex_pattern, is_expression)
+    ('WHITESPACE', r'[ \t]+', False),
+    ('NEWLINE', r'(?:\r\n|\r|\n)', False),
+    ('PRINTLN', r'println', False),
+    ('PRINT', r'print', False),
+    ('STRING_LITERAL', r'\"(?:[^\\\"]|\\.)*\"', True),
+    ('STACK_DECLARE', r'stack\s+', False),
+    ('BINARY_DECLARE', r'binary\s+', False),
+    ('FUNC_DECLARE', r'func', False),
+    ('IF', r'if', False),
+    ('ELSE', r'else', False),
+    ('WHILE', r'while', False),
+    ('POP', r'\.pop\(\)', True),
+    ('PUSH', r'\.push', False),
+    ('BREAK', r'break', False),
+    ('ASSIGN', r'=', False),
+    ('SEMICOLON', r';', False),
+    ('LPAREN', r'\(', True),   # Fixed: Matches '('
+    ('RPAREN', r'\)', True),   # Fixed: Matches ')'
+    ('LBRACE', r'\{', False),
+    ('RBRACE', r'\}', False),
+    ('BOOLEAN_LITERAL', r'true|false|True|False|TRUE|FALSE|1|0', True),
+    ('OPERATOR_NOT', r'not', True),
+    ('INPUT_CALL', r'input\(\)', True),
+    ('OUTPUT_CALL', r'output', False),
+    ('IDENTIFIER', r'[a-zA-Z_][a-zA-Z0-9_]*', True),
+]
+
+# Build the master regex once; match.lastgroup tells which alternative fired
+TOKEN_RE = re.compile('|'.join(f'(?P<{name}>{regex})' for name, regex, _ in TOKEN_SPECS))
+TOKEN_EXPRESSION = {name: expr for name, _, expr in TOKEN_SPECS}
+# Token kinds are indexes into TOKEN_SPECS, which is also match.lastindex - 1
+TOKEN_NAMES = tuple(name for name, _, _ in TOKEN_SPECS)
+TOKEN_KIND = {name: kind for kind, name in enumerate(TOKEN_NAMES)}
+_EXPRESSION_KINDS = tuple(expr for _, _, expr in TOKEN_SPECS)
+_WHITESPACE_KIND = TOKEN_KIND['WHITESPACE']
+_NEWLINE_KIND = TOKEN_KIND['NEWLINE']
+
+# A match ending closer than this to the end of a partial buffer may still change
+# once more input arrives (e.g. 'input(' followed by ')'), longest fixed token is 7
+_LOOKAHEAD = 8
+_CHUNK_SIZE = 1 << 16
+
+
+def _chunks(source: str | TextIO | Iterable[str]) -> Iterator[str]:
+    if isinstance(source, str):
+        yield source
+    elif hasattr(source, 'read'):
+        while chunk := source.read(_CHUNK_SIZE):
+            yield chunk
+    else:
+        yield from source
+
+
+def tokenize_iter(source: str | TextIO | Iterable[str]) -> Iterator[Token]:
     """
-    Converts input code into a list of Token objects based on predefined syntax rules.
+    Lazily yields Token objects from a string, a text file object or an iterable of string chunks.
     """
-    # Define token specifications in order of priority
-    token_specs = [
-        # Format: (type_name, regex_pattern, is_expression)
-        ('WHITESPACE', r'[ \t]+', False),
-        ('NEWLINE', r'(\r\n|\r|\n)', False),
-        ('PRINTLN', r'println', False),
-        ('PRINT', r'print', False),
-        ('STRING_LITERAL', r'\"([^\\\"]|\\.)*\"', True),
-        ('STACK_DECLARE', r'stack\s+', False),
-        ('BINARY_DECLARE', r'binary\s+', False),
-        ('FUNC_DECLARE', r'func', False),
-        ('IF', r'if', False),
-        ('ELSE', r'else', False),
-        ('WHILE', r'while', False),
-        ('POP', r'\.pop\(\)', True),
-        ('PUSH', r'\.push', False),
-        ('BREAK', r'break', False),
-        ('ASSIGN', r'=', False),
-        ('SEMICOLON', r';', False),
-        ('LPAREN', r'\(', True),   # Fixed: Matches '('
-        ('RPAREN', r'\)', True),   # Fixed: Matches ')'
-        ('LBRACE', r'\{', False),
-        ('RBRACE', r'\}', False),
-        ('BOOLEAN_LITERAL', r'true|false|True|False|TRUE|FALSE|1|0', True),
-        ('OPERATOR_NOT', r'not', True),
-        ('INPUT_CALL', r'input\(\)', True),
-        ('OUTPUT_CALL', r'output', False),
-        ('IDENTIFIER', r'[a-zA-Z_][a-zA-Z0-9_]*', True),
-    ]
-
-    # Build a master regex pattern that matches all tokens
-    master_regex = '|'.join(
-        f'(?P<{name}>{regex})' for name, regex, _ in token_specs
-    )
-    token_re = re.compile(master_regex)
-
-    tokens = []
+    match_token = TOKEN_RE.match
+    expression = TOKEN_EXPRESSION
+    chunks = _chunks(source)
+    buffer = ""
+    base = 0  # absolute position of buffer[0]
     pos = 0
     line = 1
+    at_eof = False
 
-    while pos < len(code):
-        match = token_re.match(code, pos)
-        if not match:
+    while True:
+        if pos >= len(buffer):
+            if at_eof:
+                return
+            match = None
+        else:
+            match = match_token(buffer, pos)
+        if not at_eof and (match is None or len(buffer) - match.end() < _LOOKAHEAD):
+            # The token may continue in the next chunk, refill and retry
+            chunk = next(chunks, None)
+            if chunk is None:
+                at_eof = True
+            else:
+                buffer = buffer[pos:] + chunk
+                base += pos
+                pos = 0
+            continue
+        if match is None:
             # No valid token found
-            raise SyntaxError(f"Invalid token at position {pos}: {code[pos:pos+10]}")
+            raise SyntaxError(f"Invalid token at position {base + pos}: {buffer[pos:pos+10]}")
 
-        # Find the token type that matched
-        matched_type = ""
-        matched_expr = False
-        matched_val = []
-
-        # Iterate through token specs to determine which pattern matched
-        for name, _, expr in token_specs:
-            val = match.group(name)
-            if val:
-                matched_type = name
-                matched_expr = expr
-                matched_val = [val]
-                break
-        if matched_type == 'NEWLINE':
+        name = match.lastgroup
+        if name == 'NEWLINE':
             line += 1
-            pos = match.end()
-            continue
-        elif matched_type != 'WHITESPACE':
-            # Add new token
-            tokens.append(
-                Token(name=matched_type, value=matched_val, expression=matched_expr, line=line)
-            )
+        elif name != 'WHITESPACE':
+            yield Token(name=name, value=[match.group()], expression=expression[name], line=line)
         pos = match.end()
 
-    return tokens
+
+class TokenStream:
+    """
+    Struct-of-arrays token storage: one byte of kind and two offsets into the source per token.
+    Line numbers are found from the offsets of the NEWLINE tokens seen while lexing, counted
+    from first_line, so a piece of a larger file keeps the line numbers of that file.
+    """
+    __slots__ = ('source', 'kinds', 'starts', 'ends', 'newlines', 'first_line')
+
+    def __init__(self, source: str, first_line: int = 1):
+        self.source = source
+        self.first_line = first_line
+        self.kinds = array('B')
+        self.starts = array('I')
+        self.ends = array('I')
+        self.newlines = array('I')  # start offset of every NEWLINE token
+
+    @classmethod
+    def from_tokens(cls, tokens: Sequence[Token]) -> 'TokenStream':
+        # Lay the lexemes out again so offsets and lines point into a synthetic source
+        parts = []
+        offset = 0
+        line = 1
+        stream = cls("")
+        for token in tokens:
+            while line < token.line:
+                stream.newlines.append(offset)
+                parts.append("\n")
+                offset += 1
+                line += 1
+            text = token.value[0]
+            stream.kinds.append(TOKEN_KIND[token.name])
+            stream.starts.append(offset)
+            stream.ends.append(offset + len(text))
+            parts.append(text)
+            parts.append(" ")
+            offset += len(text) + 1
+        stream.source = "".join(parts)
+        return stream
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def __getitem__(self, index: int) -> Token:
+        kind = self.kinds[index]
+        return Token(name=TOKEN_NAMES[kind], value=[self.text(index)], expression=_EXPRESSION_KINDS[kind],
+                     line=self.line(index))
+
+    def __iter__(self) -> Iterator[Token]:
+        for index in range(len(self.kinds)):
+            yield self[index]
+
+    def name(self, index: int) -> str:
+        return TOKEN_NAMES[self.kinds[index]]
+
+    def text(self, index: int) -> str:
+        return self.source[self.starts[index]:self.ends[index]]
+
+    def expression(self, index: int) -> bool:
+        return _EXPRESSION_KINDS[self.kinds[index]]
+
+    def line(self, index: int) -> int:
+        return bisect_right(self.newlines, self.starts[index]) + self.first_line
+
+
+def tokenize_stream(code: str, first_line: int = 1) -> TokenStream:
+    """
+    Converts input code into a TokenStream without creating a Token object per token.
+    """
+    if instrumentation.sinks:
+        with instrumentation.span("tokenize"):
+            stream = _tokenize_stream(code, first_line)
+        for kind, count in Counter(stream.kinds).items():
+            instrumentation.count("tokens", count, kind=TOKEN_NAMES[kind])
+        return stream
+    return _tokenize_stream(code, first_line)
+
+
+def _tokenize_stream(code: str, first_line: int) -> TokenStream:
+    stream = TokenStream(code, first_line)
+    kinds = stream.kinds.append
+    starts = stream.starts.append
+    ends = stream.ends.append
+    newlines = stream.newlines.append
+    match_token = TOKEN_RE.match
+    pos = 0
+    length = len(code)
+    while pos < length:
+        match = match_token(code, pos)
+        if not match:
+            raise SyntaxError(f"Invalid token at position {pos}: {code[pos:pos+10]}")
+        kind = match.lastindex - 1
+        end = match.end()
+        if kind == _NEWLINE_KIND:
+            newlines(pos)
+        elif kind != _WHITESPACE_KIND:
+            kinds(kind)
+            starts(pos)
+            ends(end)
+        pos = end
+    return stream
+
+
+def tokenize(code: str) -> list:
+    """
+    Converts input code into a list of Token objects based on predefined syntax rules.
+    """
+    if instrumentation.sinks:
+        with instrumentation.span("tokenize"):
+            tokens = list(tokenize_iter(code))
+        for name, count in Counter(token.name for token in tokens).items():
+            instrumentation.count("tokens", count, kind=name)
+        return tokens
+    return list(tokenize_iter(code))
 
 if __name__ == "__main__":
     print("Interactive lexer. Enter code to tokenize (end input with an empty line). Type Ctrl+C to exit.")
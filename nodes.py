@@ -0,0 +1,296 @@
+"""
+AST node classes. Every node kind is a slotted class with an integer `kind` tag, its index in
+NODE_CLASSES, so passes dispatch through tables indexed by kind instead of comparing type names,
+and fields are plain attributes instead of dict entries.
+
+`type` and the `fields` mapping keep code written for the old ASTNode(type, fields, line)
+dataclass working, see parser.ASTNode.
+"""
+from collections.abc import MutableMapping
+from typing import Any, Iterator
+
+(BREAK_LOOP, PRINT_STATEMENT, STACK_DECLARATION, BINARY_DECLARATION, FUNCTION_DEFINITION,
+ FUNCTION_DEFINITION_AND_CALL, IF_STATEMENT, WHILE_LOOP, OUTPUT, PUSH_OPERATION, ASSIGNMENT,
+ FUNCTION_CALL, NOT_OP, INPUT, BOOLEAN_LITERAL, POP_OPERATION, IDENTIFIER) = range(17)
+
+
+class Node:
+    __slots__ = ('line',)
+    kind: int = -1
+    type: str = ""
+    field_names: tuple[str, ...] = ()  # in the order the old fields dicts had them, 'slot' is set by resolve_symbols
+    expressions: tuple[str, ...] = ()  # fields holding one expression node
+    blocks: tuple[str, ...] = ()  # fields holding a list of statement nodes
+
+    @property
+    def fields(self) -> 'NodeFields':
+        return NodeFields(self)
+
+    def children(self) -> Iterator['Node']:
+        for name in self.expressions:
+            yield getattr(self, name)
+        for name in self.blocks:
+            yield from getattr(self, name)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Node):
+            return NotImplemented
+        return self.kind == other.kind and self.line == other.line and dict(self.fields) == dict(other.fields)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"ASTNode(type={self.type!r}, fields={dict(self.fields)!r}, line={self.line!r})"
+
+
+class NodeFields(MutableMapping):
+    """The fields of a node as a dict-like view, for code that still expects ASTNode.fields."""
+    __slots__ = ('node',)
+
+    def __init__(self, node: Node):
+        self.node = node
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self.node.field_names:
+            try:
+                return getattr(self.node, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in self.node.field_names:
+            raise KeyError(f"{self.node.type} has no field {key!r}")
+        setattr(self.node, key, value)
+
+    def __delitem__(self, key: str) -> None:
+        try:
+            delattr(self.node, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __iter__(self) -> Iterator[str]:
+        node = self.node
+        return (name for name in node.field_names if hasattr(node, name))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class BreakLoop(Node):
+    __slots__ = ()
+    kind = BREAK_LOOP
+    type = "BreakLoop"
+
+    def __init__(self, line: int):
+        self.line = line
+
+
+class PrintStatement(Node):
+    __slots__ = ('text',)
+    kind = PRINT_STATEMENT
+    type = "PrintStatement"
+    field_names = ('text',)
+
+    def __init__(self, text: str, line: int):
+        self.text = text  # already escaped for the target code
+        self.line = line
+
+
+class StackDeclaration(Node):
+    __slots__ = ('name', 'slot')
+    kind = STACK_DECLARATION
+    type = "StackDeclaration"
+    field_names = ('name', 'slot')
+
+    def __init__(self, name: str, line: int):
+        self.name = name
+        self.line = line
+
+
+class BinaryDeclaration(Node):
+    __slots__ = ('name', 'value', 'slot')
+    kind = BINARY_DECLARATION
+    type = "BinaryDeclaration"
+    field_names = ('name', 'value', 'slot')
+    expressions = ('value',)
+
+    def __init__(self, name: str, value: Node, line: int):
+        self.name = name
+        self.value = value
+        self.line = line
+
+
+class FunctionDefinition(Node):
+    __slots__ = ('name', 'body', 'slot')
+    kind = FUNCTION_DEFINITION
+    type = "FunctionDefinition"
+    field_names = ('name', 'body', 'slot')
+    blocks = ('body',)
+
+    def __init__(self, name: str, body: list, line: int):
+        self.name = name
+        self.body = body
+        self.line = line
+
+
+class FunctionDefinitionAndCall(FunctionDefinition):
+    __slots__ = ()
+    kind = FUNCTION_DEFINITION_AND_CALL
+    type = "FunctionDefinitionAndCall"
+
+
+class IfStatement(Node):
+    __slots__ = ('condition', 'then_block', 'else_block')
+    kind = IF_STATEMENT
+    type = "IfStatement"
+    field_names = ('condition', 'then_block', 'else_block')
+    expressions = ('condition',)
+    blocks = ('then_block', 'else_block')
+
+    def __init__(self, condition: Node, then_block: list, else_block: list, line: int):
+        self.condition = condition
+        self.then_block = then_block
+        self.else_block = else_block
+        self.line = line
+
+
+class WhileLoop(Node):
+    __slots__ = ('condition', 'body')
+    kind = WHILE_LOOP
+    type = "WhileLoop"
+    field_names = ('condition', 'body')
+    expressions = ('condition',)
+    blocks = ('body',)
+
+    def __init__(self, condition: Node, body: list, line: int):
+        self.condition = condition
+        self.body = body
+        self.line = line
+
+
+class Output(Node):
+    __slots__ = ('arguments',)
+    kind = OUTPUT
+    type = "Output"
+    field_names = ('arguments',)
+    expressions = ('arguments',)
+
+    def __init__(self, arguments: Node, line: int):
+        self.arguments = arguments
+        self.line = line
+
+
+class PushOperation(Node):
+    __slots__ = ('stack_name', 'value', 'slot')
+    kind = PUSH_OPERATION
+    type = "PushOperation"
+    field_names = ('stack_name', 'value', 'slot')
+    expressions = ('value',)
+
+    def __init__(self, stack_name: str, value: Node, line: int):
+        self.stack_name = stack_name
+        self.value = value
+        self.line = line
+
+
+class Assignment(Node):
+    __slots__ = ('target', 'expression', 'slot')
+    kind = ASSIGNMENT
+    type = "Assignment"
+    field_names = ('target', 'expression', 'slot')
+    expressions = ('expression',)
+
+    def __init__(self, target: str, expression: Node, line: int):
+        self.target = target
+        self.expression = expression
+        self.line = line
+
+
+class FunctionCall(Node):
+    __slots__ = ('name', 'slot')
+    kind = FUNCTION_CALL
+    type = "FunctionCall"
+    field_names = ('name', 'slot')
+
+    def __init__(self, name: str, line: int):
+        self.name = name
+        self.line = line
+
+
+class NotOp(Node):
+    __slots__ = ('operand',)
+    kind = NOT_OP
+    type = "NotOp"
+    field_names = ('operand',)
+    expressions = ('operand',)
+
+    def __init__(self, operand: Node, line: int):
+        self.operand = operand
+        self.line = line
+
+
+class Input(Node):
+    __slots__ = ()
+    kind = INPUT
+    type = "Input"
+
+    def __init__(self, line: int):
+        self.line = line
+
+
+class BooleanLiteral(Node):
+    __slots__ = ('value',)
+    kind = BOOLEAN_LITERAL
+    type = "BooleanLiteral"
+    field_names = ('value',)
+
+    def __init__(self, value: bool, line: int):
+        self.value = value
+        self.line = line
+
+
+class PopOperation(Node):
+    __slots__ = ('stack_name', 'slot')
+    kind = POP_OPERATION
+    type = "PopOperation"
+    field_names = ('stack_name', 'slot')
+
+    def __init__(self, stack_name: str, line: int):
+        self.stack_name = stack_name
+        self.line = line
+
+
+class Identifier(Node):
+    __slots__ = ('name', 'slot')
+    kind = IDENTIFIER
+    type = "Identifier"
+    field_names = ('name', 'slot')
+
+    def __init__(self, name: str, line: int):
+        self.name = name
+        self.line = line
+
+
+NODE_CLASSES: tuple[type[Node], ...] = (
+    BreakLoop, PrintStatement, StackDeclaration, BinaryDeclaration, FunctionDefinition,
+    FunctionDefinitionAndCall, IfStatement, WhileLoop, Output, PushOperation, Assignment,
+    FunctionCall, NotOp, Input, BooleanLiteral, PopOperation, Identifier,
+)
+NODE_KIND = {node_class.type: node_class.kind for node_class in NODE_CLASSES}
+FUNCTION_KINDS = (FUNCTION_DEFINITION, FUNCTION_DEFINITION_AND_CALL)
+
+
+def node_from_fields(type: str, fields: dict[str, Any], line: int) -> Node:
+    """Builds the node of the given type name from an old-style fields dict."""
+    node_class = NODE_CLASSES[NODE_KIND[type]]
+    node = object.__new__(node_class)
+    for name, value in fields.items():
+        if name not in node_class.field_names:
+            raise TypeError(f"{type} has no field {name!r}")
+        setattr(node, name, value)
+    node.line = line
+    return node
@@ -0,0 +1,231 @@
+from typing import Sequence
+from parser import ASTNode
+from nodes import (NODE_CLASSES, FUNCTION_KINDS, ASSIGNMENT, BINARY_DECLARATION, BOOLEAN_LITERAL, BREAK_LOOP,
+                   FUNCTION_CALL, FUNCTION_DEFINITION, IDENTIFIER, IF_STATEMENT, NOT_OP, OUTPUT, PUSH_OPERATION,
+                   WHILE_LOOP, Assignment, BooleanLiteral, NotOp)
+
+
+def fold_expression(expression: ASTNode) -> ASTNode:
+    """
+    Folds 'not' over literals and cancels double negation.
+    """
+    negations = 0
+    base = expression
+    while base.kind == NOT_OP:
+        negations += 1
+        base = base.operand
+    if base.kind == BOOLEAN_LITERAL:
+        if negations % 2 == 0:
+            return base
+        return BooleanLiteral(not base.value, expression.line)
+    if negations % 2 == 0:
+        return base
+    return NotOp(base, expression.line)
+
+
+def _reads_current(expression: ASTNode) -> bool:
+    while expression.kind == NOT_OP:
+        expression = expression.operand
+    return expression.kind == IDENTIFIER and expression.slot is None
+
+
+# The expression a statement evaluates before anything else, by node kind
+_FIRST_EXPRESSION: list[str | None] = [None] * len(NODE_CLASSES)
+_FIRST_EXPRESSION[BINARY_DECLARATION] = 'value'
+_FIRST_EXPRESSION[OUTPUT] = 'arguments'
+_FIRST_EXPRESSION[PUSH_OPERATION] = 'value'
+_FIRST_EXPRESSION[IF_STATEMENT] = 'condition'
+_FIRST_EXPRESSION[WHILE_LOOP] = 'condition'
+
+
+def _overwrites_current(statement: ASTNode) -> bool:
+    # Whether the statement sets the current binary before it could read it
+    if statement.kind == ASSIGNMENT:
+        return statement.slot is not None or not _reads_current(statement.expression)
+    field = _FIRST_EXPRESSION[statement.kind]
+    return field is not None and not _reads_current(getattr(statement, field))
+
+
+def _set_current(value: ASTNode, line: int) -> ASTNode:
+    # 'current = value;' keeps the effect a removed condition had on the current binary
+    assignment = Assignment('current', value, line)
+    assignment.slot = None
+    return assignment
+
+
+def _blocks(statements: list) -> list[tuple[ASTNode | None, str | None]]:
+    # Every statement list of the program in pre-order, as (owner node, field), the program itself first
+    blocks = [(None, None)]
+    work = list(reversed(statements))
+    while work:
+        statement = work.pop()
+        for field in statement.blocks:
+            blocks.append((statement, field))
+            work.extend(reversed(getattr(statement, field)))
+    return blocks
+
+
+class _Optimizer:
+    def __init__(self, level: int):
+        self.level = level
+        self.defines_function: dict[int, bool] = {}  # id of an optimized block -> contains a function definition
+        # Per-kind statement rewrites, each returns whether the statement stays as it is
+        self.table: list = [None] * len(NODE_CLASSES)
+        self.table[BINARY_DECLARATION] = self.fold_value
+        self.table[PUSH_OPERATION] = self.fold_value
+        self.table[ASSIGNMENT] = self.fold_assignment
+        self.table[OUTPUT] = self.fold_output
+        self.table[IF_STATEMENT] = self.if_statement
+        self.table[WHILE_LOOP] = self.while_loop
+
+    def contains_function(self, block: list) -> bool:
+        return self.defines_function.get(id(block), False)
+
+    def statement_defines_function(self, statement: ASTNode) -> bool:
+        return statement.kind in FUNCTION_KINDS or any(
+            self.contains_function(getattr(statement, field)) for field in statement.blocks)
+
+    def fold_value(self, statement: ASTNode, output: list) -> bool:
+        statement.value = fold_expression(statement.value)
+        return True
+
+    def fold_assignment(self, statement: ASTNode, output: list) -> bool:
+        statement.expression = fold_expression(statement.expression)
+        return True
+
+    def fold_output(self, statement: ASTNode, output: list) -> bool:
+        statement.arguments = fold_expression(statement.arguments)
+        return True
+
+    def if_statement(self, statement: ASTNode, output: list) -> bool:
+        condition = statement.condition = fold_expression(statement.condition)
+        then_block, else_block = statement.then_block, statement.else_block
+        if condition.kind == BOOLEAN_LITERAL:
+            taken, dropped = (then_block, else_block) if condition.value else (else_block, then_block)
+            # Function definitions are static, a dead branch holding one has to stay
+            if not self.contains_function(dropped):
+                output.append(_set_current(condition, statement.line))
+                output.extend(taken)
+                return False
+        elif not then_block and not else_block:
+            output.append(_set_current(condition, statement.line))
+            return False
+        return True
+
+    def while_loop(self, statement: ASTNode, output: list) -> bool:
+        condition = statement.condition = fold_expression(statement.condition)
+        if condition.kind == BOOLEAN_LITERAL and not condition.value and not self.contains_function(statement.body):
+            output.append(_set_current(condition, statement.line))
+            return False
+        return True
+
+    def block(self, statements: list) -> list:
+        output = []
+        reachable = True
+        table = self.table
+        for statement in statements:
+            if not reachable:
+                # Anything after a break is unreachable, only function definitions must survive
+                if self.statement_defines_function(statement):
+                    output.append(statement)
+                continue
+            rewrite = table[statement.kind]
+            if rewrite is not None and not rewrite(statement, output):
+                # Replaced by what it appended, which ends in a break if the taken branch did
+                reachable = not output or output[-1].kind != BREAK_LOOP
+                continue
+            if statement.kind == BREAK_LOOP:
+                reachable = False
+            output.append(statement)
+
+        # Drop 'current = literal;' when the next statement sets current without reading it
+        cleaned = []
+        for index, statement in enumerate(output):
+            if (statement.kind == ASSIGNMENT and statement.slot is None
+                    and statement.expression.kind == BOOLEAN_LITERAL
+                    and index + 1 < len(output) and _overwrites_current(output[index + 1])):
+                continue
+            cleaned.append(statement)
+        self.defines_function[id(cleaned)] = any(self.statement_defines_function(statement) for statement in cleaned)
+        return cleaned
+
+    def run(self, statements: list) -> list:
+        # Children come after their parents in pre-order, so walking it backwards optimizes inner blocks first
+        for owner, field in reversed(_blocks(statements)):
+            if owner is None:
+                statements = self.block(statements)
+            else:
+                setattr(owner, field, self.block(getattr(owner, field)))
+        if self.level >= 2:
+            statements = remove_unused_functions(statements)
+        return statements
+
+
+def _calls(statements: list) -> tuple[set[int], dict[int, set[int]]]:
+    # Function slots called from code that runs unconditionally of any call, and the calls made by each function body
+    roots: set[int] = set()
+    calls: dict[int, set[int]] = {}
+    work = [(statement, None) for statement in reversed(statements)]
+    while work:
+        statement, function = work.pop()
+        kind = statement.kind
+        if kind == FUNCTION_CALL:
+            (roots if function is None else calls.setdefault(function, set())).add(statement.slot)
+        elif kind == FUNCTION_DEFINITION:
+            calls.setdefault(statement.slot, set())
+            work.extend((child, statement.slot) for child in reversed(statement.body))
+        else:
+            for field in statement.blocks:
+                work.extend((child, function) for child in reversed(getattr(statement, field)))
+    return roots, calls
+
+
+def remove_unused_functions(statements: list) -> list:
+    """
+    Removes FunctionDefinitions that can never be called. Definitions nesting other function
+    definitions are kept, since those may be called from elsewhere.
+    """
+    def nests_function(statement: ASTNode) -> bool:
+        nested = list(statement.body)
+        while nested:
+            child = nested.pop()
+            if child.kind in FUNCTION_KINDS:
+                return True
+            for field in child.blocks:
+                nested.extend(getattr(child, field))
+        return False
+
+    roots, calls = _calls(statements)
+    kept = {owner.slot for owner, _ in _blocks(statements)
+            if owner is not None and owner.kind == FUNCTION_DEFINITION and nests_function(owner)}
+    reachable = set()
+    # Definitions that stay for what they nest keep what they call as well
+    work = list(roots) + [slot for function in kept for slot in calls.get(function, ())]
+    while work:
+        slot = work.pop()
+        if slot not in reachable:
+            reachable.add(slot)
+            work.extend(calls.get(slot, ()))
+
+    def removable(statement: ASTNode) -> bool:
+        return statement.kind == FUNCTION_DEFINITION and statement.slot not in reachable and statement.slot not in kept
+
+    for owner, field in _blocks(statements):
+        if owner is None:
+            statements = [statement for statement in statements if not removable(statement)]
+        else:
+            setattr(owner, field, [statement for statement in getattr(owner, field) if not removable(statement)])
+    return statements
+
+
+def optimize(statements: Sequence[ASTNode], level: int = 1) -> list:
+    """
+    Optimizes a program after symbols.resolve_symbols, so removed declarations keep their slots.
+    -O0 returns the statements unchanged.
+    -O1 folds 'not' over literals, cancels double negation, removes statically decided if/while
+        statements and empty ifs, and drops statements after a break.
+    -O2 also removes functions that are never called.
+    """
+    if level <= 0:
+        return list(statements)
+    return _Optimizer(level).run(list(statements))
@@ -1,11 +1,30 @@
-from dataclasses import dataclass
-from typing import Any, Sequence, MutableSequence
-from lexer import Token
+from typing import Any, Callable, Sequence, MutableSequence
+from lexer import Token, TokenStream, TOKEN_EXPRESSION, TOKEN_KIND, TOKEN_NAMES
+from nodes import (Node, node_from_fields, Assignment, BinaryDeclaration, BooleanLiteral, BreakLoop, FunctionCall,
+                   FunctionDefinition, FunctionDefinitionAndCall, Identifier, IfStatement, Input, NotOp, Output,
+                   PopOperation, PrintStatement, PushOperation, StackDeclaration, WhileLoop)
 from ast import literal_eval
+from collections import Counter
+import instrumentation
 
 
-@dataclass
-class ASTNode:
+class _ASTNodeType(type):
+    def __call__(cls, type: str, fields: dict[str, Any], line: int) -> Node:
+        return node_from_fields(type, fields, line)
+
+    def __instancecheck__(cls, instance: Any) -> bool:
+        return isinstance(instance, Node)
+
+    def __subclasscheck__(cls, subclass: type) -> bool:
+        return issubclass(subclass, Node)
+
+
+class ASTNode(metaclass=_ASTNodeType):
+    """
+    Compatibility view of the node classes in nodes.py: ASTNode(type=..., fields=..., line=...)
+    builds the node class for that type, and every node is an instance of ASTNode, with its type
+    name in node.type and a dict-like node.fields.
+    """
     type: str
     fields: dict[str, Any]
     line: int
@@ -24,209 +43,354 @@ class ASTNodeError(SyntaxError):
         super().__init__(args)
 
 
+BREAK = TOKEN_KIND['BREAK']
+PRINT = TOKEN_KIND['PRINT']
+PRINTLN = TOKEN_KIND['PRINTLN']
+STRING_LITERAL = TOKEN_KIND['STRING_LITERAL']
+STACK_DECLARE = TOKEN_KIND['STACK_DECLARE']
+BINARY_DECLARE = TOKEN_KIND['BINARY_DECLARE']
+FUNC_DECLARE = TOKEN_KIND['FUNC_DECLARE']
+IF = TOKEN_KIND['IF']
+ELSE = TOKEN_KIND['ELSE']
+WHILE = TOKEN_KIND['WHILE']
+POP = TOKEN_KIND['POP']
+PUSH = TOKEN_KIND['PUSH']
+ASSIGN = TOKEN_KIND['ASSIGN']
+SEMICOLON = TOKEN_KIND['SEMICOLON']
+LPAREN = TOKEN_KIND['LPAREN']
+RPAREN = TOKEN_KIND['RPAREN']
+LBRACE = TOKEN_KIND['LBRACE']
+RBRACE = TOKEN_KIND['RBRACE']
+BOOLEAN_LITERAL = TOKEN_KIND['BOOLEAN_LITERAL']
+OPERATOR_NOT = TOKEN_KIND['OPERATOR_NOT']
+INPUT_CALL = TOKEN_KIND['INPUT_CALL']
+OUTPUT_CALL = TOKEN_KIND['OUTPUT_CALL']
+IDENTIFIER = TOKEN_KIND['IDENTIFIER']
+
+
+def _count_nodes(statements: list, defined_identifiers: dict[str, list[bool]]) -> None:
+    # Nodes per type, deepest block nesting, declared names and references to binaries
+    types = Counter()
+    max_depth = 0
+    work = [(statement, 0) for statement in statements]
+    while work:
+        node, depth = work.pop()
+        types[node.type] += 1
+        max_depth = max(max_depth, depth)
+        work.extend((getattr(node, name), depth) for name in node.expressions)
+        work.extend((child, depth + 1) for name in node.blocks for child in getattr(node, name))
+    for name, count in types.items():
+        instrumentation.count("nodes", count, type=name)
+    instrumentation.count("identifiers", len(defined_identifiers) - 1)  # not "current"
+    instrumentation.count("references", types["Identifier"])
+    instrumentation.gauge("max_depth", max_depth)
+
+
 class Parser:
-    def __init__(self, tokens: Sequence[Token]):
+    def __init__(self, tokens: TokenStream | Sequence[Token]):
+        if not isinstance(tokens, TokenStream):
+            tokens = TokenStream.from_tokens(tokens)
         self.tokens = tokens
+        self.kinds = tokens.kinds
         self.pos = 0
         self.defined_identifiers: dict[str,list[bool]] = dict({"current":[True, True, False]}) # {key = name, value = index [0] for binary, [1] for stack, [2] for function}
+        # Statement handlers indexed by token kind, see _parse_statements
+        handlers = {
+            BREAK: self._parse_break,
+            PRINT: self._parse_print,
+            PRINTLN: self._parse_print,
+            STACK_DECLARE: self._parse_stack_declaration,
+            BINARY_DECLARE: self._parse_binary_declaration,
+            FUNC_DECLARE: self._parse_function_definition,
+            IF: self._parse_if,
+            WHILE: self._parse_while,
+            OUTPUT_CALL: self._parse_output,
+            IDENTIFIER: self._parse_identifier_statement,
+        }
+        self.statement_table = [
+            handlers.get(kind, self._not_implemented if expression else self._uncaught_statement)
+            for kind, expression in enumerate(TOKEN_EXPRESSION.values())
+        ]
+        # Blocks that are still open while parsing, as (statements, node, on_close) frames
+        self.open_blocks: list[tuple[list, ASTNode, Callable[[ASTNode], ASTNode | None]]] = []
 
-    def add_identifier(self, token: Token, name: str, index: int) -> None:
+    def add_identifier(self, token: int, name: str, index: int) -> None:
         if self.defined_identifiers.get(name):
             if self.defined_identifiers[name][index]:
-                raise TokenSyntaxError(token, "Cannot use name {name}, it is already taken")
+                raise TokenSyntaxError(self.tokens[token], "Cannot use name {name}, it is already taken")
             self.defined_identifiers[name][index] = True
         else:
             self.defined_identifiers[name] = [i == index for i in range(3)]
 
-    def check_identifier(self, token: Token, name: str, index: int) -> None:
+    def check_identifier(self, token: int, name: str, index: int) -> None:
         if not self.defined_identifiers.get(name):
-            raise TokenSyntaxError(token, f"Name {name} is not declared/defined")
+            raise TokenSyntaxError(self.tokens[token], f"Name {name} is not declared/defined")
         if not self.defined_identifiers[name][index]:
-            raise TokenSyntaxError(token, f"Name {name} is not declared/defined")
+            raise TokenSyntaxError(self.tokens[token], f"Name {name} is not declared/defined")
 
-    def peek(self, amount: int=0) -> Token:
-        if self.pos + amount < len(self.tokens):
-            return self.tokens[self.pos + amount]
+    # Tokens are referred to by their index in the stream, kinds are small ints from lexer.TOKEN_KIND
+    def peek(self, amount: int=0) -> int:
+        if self.pos + amount < len(self.kinds):
+            return self.kinds[self.pos + amount]
         raise EOFError(f"Unexpected End of file in position: {self.pos}")
 
-    def consume(self) -> Token:
-        if self.pos < len(self.tokens):
-            token = self.tokens[self.pos]
+    def consume(self) -> int:
+        if self.pos < len(self.kinds):
             self.pos += 1
-            return token
+            return self.pos - 1
         raise EOFError(f"Unexpected End of file in position: {self.pos}")
 
-    def expect(self, token_name: str) -> Token:
-        token = self.peek()
-        if token:
-            if token.name == token_name:
-                return self.consume()
-            raise TokenSyntaxError(token, f"Expected token '{token_name}', got '{token.name}'")
-        raise TokenSyntaxError(token, f"Expected token '{token_name}', got 'EOF' in line UNKNOWN")
+    def expect(self, kind: int) -> int:
+        token_kind = self.peek()
+        if token_kind == kind:
+            self.pos += 1
+            return self.pos - 1
+        raise TokenSyntaxError(self.tokens[self.pos], f"Expected token '{TOKEN_NAMES[kind]}', got '{TOKEN_NAMES[token_kind]}'")
+
+    def text(self, token: int) -> str:
+        return self.tokens.text(token)
+
+    def line(self, token: int) -> int:
+        return self.tokens.line(token)
 
     def parse_program(self) -> list:
+        if instrumentation.sinks:
+            with instrumentation.span("parse_program"):
+                statements = self._parse_program()
+            _count_nodes(statements, self.defined_identifiers)
+            return statements
+        return self._parse_program()
+
+    def _parse_program(self) -> list:
         # __init__
         statements = []
         self.pos = 0
         self.defined_identifiers: dict[str,list[bool]] = dict({"current":[True, True, False]}) # {key = name, value = index [0] for binary, [1] for stack, [2] for function}
-        while self.pos < len(self.tokens):
-            statements.append(self.parse_statement())
+        self.open_blocks.clear()
+        self._parse_statements(statements, until_rbrace=False)
         return statements
 
     def parse_statement(self) -> ASTNode:
-        token = self.peek()
-        if token.expression and token.name != "IDENTIFIER":
-            raise TokenSyntaxError(token, f"Expression {token.name} with value {token.value} is not implemented")
-        if token.name == 'BREAK':
-            self.consume()
-            self.expect('SEMICOLON')
-            return ASTNode(type='BreakLoop', fields={}, line=token.line)
-        if token.name in ('PRINT', 'PRINTLN'):
-            self.consume()
-            self.expect('LPAREN')
-            text = repr(literal_eval(self.expect('STRING_LITERAL').value[0]))[1:-1].replace("{","\\{").replace("}", "\\}")
-            self.expect('RPAREN')
-            self.expect('SEMICOLON')
-            if token.name == 'PRINTLN':
-                text += "\\n"
-            return ASTNode(type='PrintStatement',fields={'text': text}, line=token.line)
-        if token.name == 'STACK_DECLARE':
-            self.consume()
-            name = self.expect('IDENTIFIER').value[0]
-            self.add_identifier(token, name, 1)
-            self.expect('SEMICOLON')
-            return ASTNode(type='StackDeclaration', fields={'name': name}, line=token.line)
+        statements = []
+        self._parse_statements(statements, until_rbrace=False, single=True)
+        return statements[0]
 
-        if token.name == 'BINARY_DECLARE':
-            self.consume()
-            name = self.expect('IDENTIFIER').value[0]
-            self.add_identifier(token, name, 0)
-            if self.peek() and self.peek().name == 'ASSIGN':
-                self.consume() # ASSIGN
-                expr = self.parse_expression()
-                self.expect('SEMICOLON')
-                return ASTNode(type='BinaryDeclaration', fields={'name': name, 'value': expr}, line=token.line)
-            self.expect('SEMICOLON')
-            return ASTNode(type='BinaryDeclaration',
-                           fields={'name': name, 'value': ASTNode(type='Identifier', fields={'name': 'current'}, line=token.line)}, line=token.line)
-
-        if token.name == 'FUNC_DECLARE':
-            self.consume()
-            name = self.expect('IDENTIFIER').value[0]
-            self.add_identifier(token, name, 2)
-            if self.peek() and self.peek().name == 'LPAREN':
-                self.consume()
-                self.expect('RPAREN')
-                body = self.parse_block()
-                return ASTNode(type='FunctionDefinitionAndCall', fields={'name': name, 'body': body}, line=token.line)
-            body = self.parse_block()
-            self.expect('SEMICOLON')
-            return ASTNode(type='FunctionDefinition', fields={'name': name, 'body': body}, line=token.line)
-
-        if token.name == 'IF':
-            self.consume()
-            self.expect('LPAREN')
-            condition = self.parse_expression()
-            self.expect('RPAREN')
-            then_block = self.parse_block()
-            else_block = []
-            if self.peek() and self.peek().name == 'ELSE':
-                self.consume()
-                else_block = self.parse_block()
-            self.expect('SEMICOLON')
-            return ASTNode(type='IfStatement',
-                           fields={'condition': condition, 'then_block': then_block, 'else_block': else_block}, line=token.line)
+    def parse_block(self) -> list:
+        self.expect(LBRACE)
+        statements = []
+        self._parse_statements(statements, until_rbrace=True)
+        return statements
+
+    def _parse_statements(self, statements: list, until_rbrace: bool, single: bool = False) -> None:
+        """
+        Parses statements into the given list. Nested blocks are kept on self.open_blocks instead of
+        the Python call stack, so nesting depth is only bounded by memory.
+        """
+        kinds = self.kinds
+        table = self.statement_table
+        blocks = self.open_blocks
+        base = len(blocks)
+        current = statements
+        while True:
+            if len(blocks) == base:
+                if single and statements:
+                    return
+                if not until_rbrace and not single and self.pos >= len(kinds):
+                    return
+            kind = self.peek()
+            if kind == RBRACE and (len(blocks) > base or until_rbrace):
+                self.pos += 1
+                if len(blocks) == base:
+                    return
+                _, node, on_close = blocks.pop()
+                current = blocks[-1][0] if len(blocks) > base else statements
+                node = on_close(node)
+            else:
+                node = table[kind](self.pos)
+            if node is None:
+                # A block was opened, the node is added to its parent once its last block closes
+                current = blocks[-1][0]
+            else:
+                current.append(node)
 
-        if token.name == 'WHILE':
+    def _open_block(self, block: list, node: ASTNode, on_close: Callable[[ASTNode], ASTNode | None]) -> None:
+        self.expect(LBRACE)
+        self.open_blocks.append((block, node, on_close))
+
+    def _not_implemented(self, token: int) -> ASTNode:
+        raise TokenSyntaxError(self.tokens[token], f"Expression {self.tokens.name(token)} with value {[self.text(token)]} is not implemented")
+
+    def _uncaught_statement(self, token: int) -> ASTNode:
+        raise TokenSyntaxError(self.tokens[token], f"Uncaught statement {self.tokens.name(token)}")
+
+    def _parse_break(self, token: int) -> ASTNode:
+        self.consume()
+        self.expect(SEMICOLON)
+        return BreakLoop(self.line(token))
+
+    def _parse_print(self, token: int) -> ASTNode:
+        self.consume()
+        self.expect(LPAREN)
+        text = repr(literal_eval(self.text(self.expect(STRING_LITERAL))))[1:-1].replace("{","\\{").replace("}", "\\}")
+        self.expect(RPAREN)
+        self.expect(SEMICOLON)
+        if self.kinds[token] == PRINTLN:
+            text += "\\n"
+        return PrintStatement(text, self.line(token))
+
+    def _parse_stack_declaration(self, token: int) -> ASTNode:
+        self.consume()
+        name = self.text(self.expect(IDENTIFIER))
+        self.add_identifier(token, name, 1)
+        self.expect(SEMICOLON)
+        return StackDeclaration(name, self.line(token))
+
+    def _parse_binary_declaration(self, token: int) -> ASTNode:
+        self.consume()
+        name = self.text(self.expect(IDENTIFIER))
+        self.add_identifier(token, name, 0)
+        line = self.line(token)
+        if self.peek() == ASSIGN:
+            self.consume() # ASSIGN
+            expr = self.parse_expression()
+            self.expect(SEMICOLON)
+            return BinaryDeclaration(name, expr, line)
+        self.expect(SEMICOLON)
+        return BinaryDeclaration(name, Identifier('current', line), line)
+
+    def _parse_function_definition(self, token: int) -> None:
+        self.consume()
+        name = self.text(self.expect(IDENTIFIER))
+        self.add_identifier(token, name, 2)
+        if self.peek() == LPAREN:
             self.consume()
-            self.expect('LPAREN')
-            condition = self.parse_expression()
-            self.expect('RPAREN')
-            body = self.parse_block()
-            return ASTNode(type='WhileLoop', fields={'condition': condition, 'body': body}, line=token.line)
+            self.expect(RPAREN)
+            node = FunctionDefinitionAndCall(name, [], self.line(token))
+            self._open_block(node.body, node, self._close_block)
+            return None
+        node = FunctionDefinition(name, [], self.line(token))
+        self._open_block(node.body, node, self._close_block_with_semicolon)
+        return None
+
+    def _parse_if(self, token: int) -> None:
+        self.consume()
+        self.expect(LPAREN)
+        condition = self.parse_expression()
+        self.expect(RPAREN)
+        node = IfStatement(condition, [], [], self.line(token))
+        self._open_block(node.then_block, node, self._close_then_block)
+        return None
 
-        if token.name == 'OUTPUT_CALL':
+    def _close_then_block(self, node: ASTNode) -> ASTNode | None:
+        if self.peek() == ELSE:
             self.consume()
-            self.expect('LPAREN')
-            expr = self.parse_expression()
-            self.expect('RPAREN')
-            self.expect('SEMICOLON')
-            return ASTNode(type='Output', fields={'arguments': expr}, line=token.line)
-
-        if token.name == 'IDENTIFIER':
-            if self.pos + 1 < len(self.tokens):
-                next_token = self.tokens[self.pos + 1]
-                if next_token.name == 'PUSH':
-                    name = self.expect('IDENTIFIER').value[0]
-                    self.check_identifier(token, name, 1)
-                    self.expect('PUSH')
-                    self.expect('LPAREN')
-                    value = self.parse_expression()
-                    self.expect('RPAREN')
-                    self.expect('SEMICOLON')
-                    return ASTNode(type='PushOperation', fields={'stack_name': name, 'value': value}, line=token.line)
-                if next_token.name == 'ASSIGN':
-                    return self.parse_assignment()
-                if next_token.name == 'LPAREN':
-                    return self.parse_function_call()
-                raise TokenSyntaxError(token, f"Unexpected identifier {next_token.name}")
-            raise TokenSyntaxError(token, f"no token found after position {self.pos}")
-
-        raise TokenSyntaxError(token, f"Uncaught statement {token.name}")
+            self._open_block(node.else_block, node, self._close_block_with_semicolon)
+            return None
+        self.expect(SEMICOLON)
+        return node
 
-    def parse_block(self) -> list:
-        self.expect('LBRACE')
-        statements = []
-        while self.peek() and self.peek().name != 'RBRACE':
-            statements.append(self.parse_statement())
-        self.expect('RBRACE')
-        return statements
+    def _parse_while(self, token: int) -> None:
+        self.consume()
+        self.expect(LPAREN)
+        condition = self.parse_expression()
+        self.expect(RPAREN)
+        node = WhileLoop(condition, [], self.line(token))
+        self._open_block(node.body, node, self._close_block)
+        return None
+
+    def _close_block(self, node: ASTNode) -> ASTNode:
+        return node
+
+    def _close_block_with_semicolon(self, node: ASTNode) -> ASTNode:
+        self.expect(SEMICOLON)
+        return node
+
+    def _parse_output(self, token: int) -> ASTNode:
+        self.consume()
+        self.expect(LPAREN)
+        expr = self.parse_expression()
+        self.expect(RPAREN)
+        self.expect(SEMICOLON)
+        return Output(expr, self.line(token))
+
+    def _parse_identifier_statement(self, token: int) -> ASTNode:
+        if self.pos + 1 < len(self.kinds):
+            next_kind = self.kinds[self.pos + 1]
+            if next_kind == PUSH:
+                name = self.text(self.expect(IDENTIFIER))
+                self.check_identifier(token, name, 1)
+                self.expect(PUSH)
+                self.expect(LPAREN)
+                value = self.parse_expression()
+                self.expect(RPAREN)
+                self.expect(SEMICOLON)
+                return PushOperation(name, value, self.line(token))
+            if next_kind == ASSIGN:
+                return self.parse_assignment()
+            if next_kind == LPAREN:
+                return self.parse_function_call()
+            raise TokenSyntaxError(self.tokens[token], f"Unexpected identifier {TOKEN_NAMES[next_kind]}")
+        raise TokenSyntaxError(self.tokens[token], f"no token found after position {self.pos}")
 
     def parse_assignment(self) -> ASTNode:
-        token = self.expect('IDENTIFIER')
-        name = token.value[0]
-        self.check_identifier(self.peek(), name, 0)
-        self.expect('ASSIGN')
+        token = self.expect(IDENTIFIER)
+        name = self.text(token)
+        self.check_identifier(self.pos, name, 0)
+        self.expect(ASSIGN)
         expr = self.parse_expression()
-        self.expect('SEMICOLON')
-        return ASTNode(type='Assignment', fields={'target': name, 'expression': expr}, line=token.line)
+        self.expect(SEMICOLON)
+        return Assignment(name, expr, self.line(token))
 
     def parse_function_call(self) -> ASTNode:
-        token = self.expect('IDENTIFIER')
-        name = token.value[0]
-        self.check_identifier(self.peek(), name, 2)
-        self.expect('LPAREN')
-        self.expect('RPAREN')
-        self.expect('SEMICOLON')
-        return ASTNode(type='FunctionCall', fields={'name': name}, line=token.line)
-
-    def parse_expression(self) -> ASTNode:
-        if (token := self.peek()) and self.peek().name == 'OPERATOR_NOT':
-            self.consume()
-            operand = self.parse_primary()
-            return ASTNode(type='NotOp', fields={'operand': operand}, line=token.line)
-        return self.parse_primary()
+        token = self.expect(IDENTIFIER)
+        name = self.text(token)
+        self.check_identifier(self.pos, name, 2)
+        self.expect(LPAREN)
+        self.expect(RPAREN)
+        self.expect(SEMICOLON)
+        return FunctionCall(name, self.line(token))
+
+    def parse_expression(self, allow_not: bool = True) -> ASTNode:
+        # 'not' and '(' prefixes are collected in a list rather than by recursion, None marks a '('
+        prefixes = []
+        while True:
+            kind = self.peek()
+            if kind == OPERATOR_NOT and allow_not:
+                prefixes.append(self.line(self.consume()))
+                allow_not = False
+            elif kind == LPAREN:
+                self.consume()
+                prefixes.append(None)
+                allow_not = True
+            else:
+                break
+        expr = self._parse_operand()
+        for line in reversed(prefixes):
+            if line is None:
+                self.expect(RPAREN)
+            else:
+                expr = NotOp(expr, line)
+        return expr
 
     def parse_primary(self) -> ASTNode:
-        token = self.peek()
-        if token.name == 'INPUT_CALL':
+        return self.parse_expression(allow_not=False)
+
+    def _parse_operand(self) -> ASTNode:
+        kind = self.peek()
+        token = self.pos
+        if kind == INPUT_CALL:
             self.consume()
-            return ASTNode(type='Input', fields={}, line=token.line)
-        if token.name == 'BOOLEAN_LITERAL':
-            value = token.value[0] in ('True', 'true', '1')
+            return Input(self.line(token))
+        if kind == BOOLEAN_LITERAL:
+            value = self.text(token) in ('True', 'true', '1')
             self.consume()
-            return ASTNode(type='BooleanLiteral', fields={'value': value}, line=token.line)
-        if token.name == 'IDENTIFIER':
-            name = self.consume().value[0]
-            if self.peek() and self.peek().name == 'POP':
+            return BooleanLiteral(value, self.line(token))
+        if kind == IDENTIFIER:
+            name = self.text(self.consume())
+            if self.peek() == POP:
                 self.consume()
                 self.check_identifier(token, name, 1)
-                return ASTNode(type='PopOperation', fields={'stack_name': name}, line=token.line)
+                return PopOperation(name, self.line(token))
             self.check_identifier(token, name, 0)
-            return ASTNode(type='Identifier', fields={'name': name}, line=token.line)
-        if token.name == 'LPAREN':
-            self.consume()
-            expr = self.parse_expression()
-            self.expect('RPAREN')
-            return expr
-        raise TokenSyntaxError(token, f"Unexpected token in expression: {token.name}")
\ No newline at end of file
+            return Identifier(name, self.line(token))
+        raise TokenSyntaxError(self.tokens[token], f"Unexpected token in expression: {TOKEN_NAMES[kind]}")
@@ -0,0 +1,152 @@
+from dataclasses import dataclass
+from typing import Callable, Sequence
+from target import Instruction, SELECT, TEXT, decode, encode
+
+# A rule looks at the instructions starting at an index and returns how many of them it
+# replaces and with what, or None when it doesn't apply there
+Match = tuple[int, list[Instruction]] | None
+
+
+@dataclass(frozen=True)
+class Rule:
+    name: str
+    first: tuple[str, ...]  # instruction kinds the rule can start at
+    apply: Callable[[list[Instruction], int], Match]
+    # (before, after) target code: the rule fires while peephole(before) turns it into after,
+    # and both must behave the same when run, tests/test_peephole.py checks both
+    examples: tuple[tuple[str, str], ...]
+
+
+# Instructions that neither change the selected stack nor jump
+_STRAIGHT = frozenset(('-', '+', '*', '<', '>', TEXT))
+_FALSE = [('[', None), ('*', None), (']', None)]
+_TRUE = [('[', None), (',', None), ('*', None), (']', None)]
+
+
+def _kinds(code: list[Instruction], index: int, count: int) -> tuple[str, ...]:
+    return tuple(kind for kind, _ in code[index:index + count])
+
+
+def _literal(code: list[Instruction], index: int) -> list[Instruction] | None:
+    # '[*]' sets current to false and '[,*]' to true, whatever it was before
+    if code[index:index + 3] == _FALSE:
+        return _FALSE
+    if code[index:index + 4] == _TRUE:
+        return _TRUE
+    return None
+
+
+def _double_not(code: list[Instruction], index: int) -> Match:
+    if _kinds(code, index, 2) == ('*', '*'):
+        return 2, []
+    return None
+
+
+def _push_pop(code: list[Instruction], index: int) -> Match:
+    # Popping what was just pushed leaves both the stack and current as they were
+    if _kinds(code, index, 2) == ('+', '-'):
+        return 2, []
+    return None
+
+
+def _select_overwritten(code: list[Instruction], index: int) -> Match:
+    if _kinds(code, index, 2) == (SELECT, SELECT):
+        return 2, [code[index + 1]]
+    return None
+
+
+def _redundant_select(code: list[Instruction], index: int) -> Match:
+    # 'N' again after straight-line code that started with 'N' selects nothing new
+    end = index + 1
+    while end < len(code) and code[end][0] in _STRAIGHT:
+        end += 1
+    if end > index + 1 and end < len(code) and code[end] == code[index]:
+        return end - index + 1, code[index:end]
+    return None
+
+
+def _merge_text(code: list[Instruction], index: int) -> Match:
+    if _kinds(code, index, 2) == (TEXT, TEXT):
+        return 2, [(TEXT, code[index][1] + code[index + 1][1])]
+    return None
+
+
+def _empty_branch(code: list[Instruction], index: int) -> Match:
+    if _kinds(code, index, 2) == ('[', ']'):
+        return 2, []
+    if _kinds(code, index, 3) == ('[', ',', ']'):
+        return 3, []
+    return None
+
+
+def _dead_literal(code: list[Instruction], index: int) -> Match:
+    # A literal whose value is replaced before anything reads it
+    literal = _literal(code, index)
+    if literal is None:
+        return None
+    after = index + len(literal)
+    following = _kinds(code, after, 2)
+    if (following[:1] in (('-',), ('>',)) or following == (SELECT, '-')
+            or (after < len(code) and _literal(code, after) is not None)):
+        return len(literal), []
+    return None
+
+
+def _negated_literal(code: list[Instruction], index: int) -> Match:
+    literal = _literal(code, index)
+    if literal is not None and _kinds(code, index + len(literal), 1) == ('*',):
+        return len(literal) + 1, list(_TRUE if literal is _FALSE else _FALSE)
+    return None
+
+
+RULES: list[Rule] = [
+    Rule("double_not", ('*',), _double_not, (("1-**<", "1-<"), ("**", ""))),
+    Rule("push_pop", ('+',), _push_pop, (("1-+-<", "1-<"), (">1+-2+", ">2+"))),
+    Rule("select_overwritten", (SELECT,), _select_overwritten, (("1**2-<", "2-<"),)),
+    Rule("redundant_select", (SELECT,), _redundant_select,
+         (("1-+<1-+<", "1-+<-+<"), (">1+1-+*<", ">1+*<"), ("1-{a}1+", "1-{a}+"))),
+    Rule("merge_text", (TEXT,), _merge_text, (("{a}{b\\n}", "{ab\\n}"),)),
+    Rule("empty_branch", ('[',), _empty_branch, ((">[,]<", "><"), (">[]<", "><"))),
+    Rule("dead_literal", ('[',), _dead_literal,
+         (("[*]1-<", "1-<"), ("[,*]><", "><"), ("[*][,*]<", "[,*]<"), (">1+[,*]-<", ">1<"))),
+    Rule("negated_literal", ('[',), _negated_literal, (("[*]*<", "[,*]<"), ("[,*]*<", "[*]<"))),
+]
+
+
+def optimize_instructions(code: list[Instruction], rules: Sequence[Rule] = RULES) -> tuple[list[Instruction], dict[str, int]]:
+    """
+    Applies the rules left to right, pass after pass, until none of them fires any more.
+    Returns the new instructions and how many times each rule fired.
+    """
+    by_kind: dict[str, list[Rule]] = {}
+    for rule in rules:
+        for kind in rule.first:
+            by_kind.setdefault(kind, []).append(rule)
+    counts = {rule.name: 0 for rule in rules}
+    changed = True
+    while changed:
+        changed = False
+        output = []
+        index = 0
+        while index < len(code):
+            for rule in by_kind.get(code[index][0], ()):
+                match = rule.apply(code, index)
+                if match is not None:
+                    length, replacement = match
+                    output.extend(replacement)
+                    index += length
+                    counts[rule.name] += 1
+                    changed = True
+                    break
+            else:
+                output.append(code[index])
+                index += 1
+        code = output
+    return code, counts
+
+
+def peephole(code: str, rules: Sequence[Rule] = RULES) -> str:
+    """
+    Peephole-optimizes translated target code.
+    """
+    return encode(optimize_instructions(decode(code), rules)[0])
@@ -0,0 +1,112 @@
+"""
+Hot-spot profiler: runs target code on the VM counting the instructions executed at every offset
+of the code, and folds the counts back onto Brainknot source lines through a source map.
+
+    python profiler.py prog.bk --input 1101 --top 10
+    python profiler.py prog.bko --source prog.bk  # with the map in prog.bko.map
+"""
+import argparse
+import os
+import sys
+from array import array
+from dataclasses import dataclass
+from compiler import compile
+from sourcemap import MAP_SUFFIX, SourceMap
+from vm import ExecutionLimitExceeded, ExecutionResult, Program, load, run
+
+
+@dataclass
+class Profile:
+    steps: int
+    offsets: dict[int, int]  # target code offset -> instructions executed there
+    lines: dict[int, int]  # source line -> instructions executed for it
+    unmapped: int = 0  # executed instructions no source line produced, like the final halt
+    result: ExecutionResult | None = None  # None when the run hit the step limit
+    stopped: bool = False  # the run hit the step limit, the counts cover the steps until then
+
+    def hot_lines(self) -> list[tuple[int, int]]:
+        """(line, steps) by steps, most first."""
+        return sorted(self.lines.items(), key=lambda item: (-item[1], item[0]))
+
+    def report(self, source: str | None = None, top: int | None = 20) -> str:
+        source_lines = source.split("\n") if source is not None else []
+        lines = [f"{self.steps} steps" + (" (stopped at the step limit)" if self.stopped else ""),
+                 f"{'line':>6} {'steps':>12} {'share':>7}  source"]
+        for line, steps in self.hot_lines()[:top]:
+            text = source_lines[line - 1].strip() if 0 < line <= len(source_lines) else ""
+            lines.append(f"{line:>6} {steps:>12} {steps / self.steps:7.1%}  {text}")
+        if self.unmapped:
+            lines.append(f"{'-':>6} {self.unmapped:>12} {self.unmapped / self.steps:7.1%}  (no source line)")
+        return "\n".join(lines)
+
+
+def profile(program: Program | str, source_map: SourceMap, input=(), output=None, write=None,
+            max_steps: int | None = None) -> Profile:
+    """
+    Runs a program like vm.run() and counts its steps per target code offset and source line. A
+    run stopped by max_steps still gives the profile of the steps until then.
+    """
+    if isinstance(program, str):
+        program = load(program)
+    counts = array('q', bytes(8 * len(program.ops)))
+    result = None
+    try:
+        result = run(program, input, output, write, max_steps, counts)
+    except ExecutionLimitExceeded:
+        pass
+
+    offsets: dict[int, int] = {}
+    lines: dict[int, int] = {}
+    unmapped = 0
+    for op, count in enumerate(counts):
+        if not count:
+            continue
+        offset = program.offsets[op]
+        offsets[offset] = offsets.get(offset, 0) + count
+        line = source_map.line_at(offset)
+        if line is None:
+            unmapped += count
+        else:
+            lines[line] = lines.get(line, 0) + count
+    return Profile(sum(offsets.values()), offsets, lines, unmapped, result, result is None)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('path', help="Brainknot source, or target code with a source map next to it")
+    arg_parser.add_argument('--map', default=None, help="source map of target code (default: the path plus .map)")
+    arg_parser.add_argument('--source', default=None, help="source of target code, to show its lines in the report")
+    arg_parser.add_argument('-O', dest='opt_level', type=int, choices=(0, 1), default=0, help="when compiling source")
+    arg_parser.add_argument('--input', default="", help="input bits, e.g. 1101")
+    arg_parser.add_argument('--max-steps', type=int, default=100_000_000)
+    arg_parser.add_argument('--top', type=int, default=20, help="how many of the hottest lines to list")
+    args = arg_parser.parse_args()
+
+    with open(args.path, encoding='utf-8') as file:
+        text = file.read()
+    if args.path.endswith(".bk"):
+        source = text
+        result = compile(source, opt_level=args.opt_level, source_map=True)
+        code, source_map = result.output, result.source_map
+    else:
+        code = text
+        map_path = args.map or args.path + MAP_SUFFIX
+        source_map = SourceMap.load(map_path)
+        source = None
+        # The source named on the command line, or the one the map names, relative to the map
+        source_path = args.source or (source_map.source and os.path.join(os.path.dirname(map_path), source_map.source))
+        if source_path and os.path.exists(source_path):
+            with open(source_path, encoding='utf-8') as file:
+                source = file.read()
+    if any(bit not in "01" for bit in args.input):
+        arg_parser.error("--input takes bits: 0 and 1")
+    try:
+        result = profile(code, source_map, [bit == "1" for bit in args.input], max_steps=args.max_steps)
+    except EOFError as error:
+        print("Error:", error, file=sys.stderr)
+        sys.exit(1)
+    print(result.report(source, args.top))
+
+
+if __name__ == "__main__":
+    main()
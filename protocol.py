@@ -0,0 +1,67 @@
+"""
+Wire format of the compile server: every message is a 4-byte big-endian length followed by that
+many bytes of UTF-8 JSON object. Kept free of compiler imports so clients start fast.
+
+Requests carry an "op":
+    compile        {"source", "opt_level", "allocate", "source_map"} -> {"output", "mappings"?}
+    compile_files  {"paths", "output_dir", "opt_level", "allocate", "source_map"} -> {"results": [...]}
+    stats          {} -> counters of the server
+Failed requests get {"error": "Type: message"}.
+"""
+import json
+import os
+import socket
+import struct
+import tempfile
+
+_HEADER = struct.Struct(">I")
+HEADER_BYTES = _HEADER.size
+MAX_MESSAGE_BYTES = 64 << 20
+
+
+class ProtocolError(ConnectionError):
+    pass
+
+
+def default_socket_path() -> str:
+    return os.environ.get("BRAINKNOT_SOCKET") or os.path.join(tempfile.gettempdir(), f"brainknot-{os.getuid()}.sock")
+
+
+def encode(message: dict) -> bytes:
+    payload = json.dumps(message, separators=(",", ":")).encode()
+    if len(payload) > MAX_MESSAGE_BYTES:
+        raise ProtocolError(f"message of {len(payload)} bytes is over the {MAX_MESSAGE_BYTES} byte limit")
+    return _HEADER.pack(len(payload)) + payload
+
+
+def decode(payload: bytes) -> dict:
+    try:
+        message = json.loads(payload)
+    except ValueError as error:
+        raise ProtocolError(f"malformed message: {error}") from None
+    if not isinstance(message, dict):
+        raise ProtocolError("a message must be a JSON object")
+    return message
+
+
+def message_length(header: bytes) -> int:
+    (length,) = _HEADER.unpack(header)
+    if length > MAX_MESSAGE_BYTES:
+        raise ProtocolError(f"message of {length} bytes is over the {MAX_MESSAGE_BYTES} byte limit")
+    return length
+
+
+def _receive(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ProtocolError("connection closed in the middle of a message")
+        data += chunk
+    return bytes(data)
+
+
+def request(sock: socket.socket, message: dict) -> dict:
+    """Sends one request over a connected socket and waits for its response."""
+    sock.sendall(encode(message))
+    return decode(_receive(sock, message_length(_receive(sock, HEADER_BYTES))))
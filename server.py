@@ -0,0 +1,219 @@
+"""
+Compile server: a long-running process listening on a Unix domain socket, so build tools pay for
+starting Python and importing the compiler once instead of per file. Requests use the
+length-prefixed JSON of protocol.py; compiling runs in a pool of worker processes that keep their
+caches warm, and identical compile requests are answered from memory without reaching the pool.
+
+    python server.py --socket /tmp/brainknot.sock -j 4 &
+    python client.py src/ -o build -O1 --socket /tmp/brainknot.sock
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from batch import compile_file, find_sources, output_paths
+from cache import CompileCache, cache_key
+from compiler import compile
+from protocol import HEADER_BYTES, ProtocolError, decode, default_socket_path, encode, message_length
+
+DEFAULT_MEMO_SIZE = 1024  # responses to compile requests kept in the server process
+DEFAULT_WORKER_MEMO_SIZE = 256
+
+_cache: CompileCache | None = None  # per worker process
+
+
+def _init_worker(cache_dir: str | None, memo_size: int) -> None:
+    global _cache
+    _cache = CompileCache(cache_dir, memo_size=memo_size)
+
+
+def _error(error: BaseException) -> dict:
+    return {"error": f"{type(error).__name__}: {error}"}
+
+
+def _ready() -> int:
+    return os.getpid()
+
+
+def _compile_source(source: str, opt_level: int, allocate: bool, source_map: bool) -> dict:
+    # Compile errors come back as responses, the parser's exceptions don't all survive pickling
+    try:
+        if source_map:
+            # The cache keeps no source maps
+            result = compile(source, opt_level=opt_level, allocate=allocate, source_map=True)
+            return {"output": result.output, "mappings": result.source_map.encode()}
+        return {"output": _cache.compile(source, opt_level=opt_level, allocate=allocate).output}
+    except (SyntaxError, EOFError) as error:
+        return _error(error)
+
+
+def _compile_path(path: str, output_path: str, opt_level: int, allocate: bool, source_map: bool) -> dict:
+    return asdict(compile_file(_cache, path, output_path, opt_level, allocate, source_map))
+
+
+@dataclass
+class ServerStats:
+    connections: int = 0
+    requests: int = 0
+    memo_hits: int = 0
+    errors: int = 0
+
+
+class CompileServer:
+    def __init__(self, path: str, jobs: int | None = None, cache_dir: str | None = None,
+                 memo_size: int = DEFAULT_MEMO_SIZE, worker_memo_size: int = DEFAULT_WORKER_MEMO_SIZE):
+        self.path = path
+        self.jobs = jobs or os.cpu_count() or 1
+        self.cache_dir = cache_dir
+        self.memo_size = memo_size
+        self.worker_memo_size = worker_memo_size
+        self.stats = ServerStats()
+        self.started = time.monotonic()
+        self._memo: OrderedDict[tuple, dict] = OrderedDict()
+        self._pool: ProcessPoolExecutor | None = None
+        self._server: asyncio.AbstractServer | None = None
+
+    async def start(self) -> None:
+        _remove_stale_socket(self.path)
+        self._pool = ProcessPoolExecutor(self.jobs, initializer=_init_worker,
+                                         initargs=(self.cache_dir, self.worker_memo_size))
+        # Start every worker now, the first requests shouldn't wait for forks and imports
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._pool, _ready) for _ in range(self.jobs)))
+        self._server = await asyncio.start_unix_server(self._serve, self.path)
+
+    async def serve_forever(self) -> None:
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # A connection carries any number of requests, answered in order
+        self.stats.connections += 1
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(HEADER_BYTES)
+                except asyncio.IncompleteReadError:
+                    break
+                try:
+                    message = decode(await reader.readexactly(message_length(header)))
+                    response = await self.handle(message)
+                except ProtocolError as error:
+                    writer.write(encode(_error(error)))
+                    break
+                writer.write(encode(response))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle(self, message: dict) -> dict:
+        self.stats.requests += 1
+        op = message.get("op", "compile")
+        try:
+            if op == "compile":
+                response = await self._compile(message)
+            elif op == "compile_files":
+                response = await self._compile_files(message)
+            elif op == "stats":
+                response = asdict(self.stats) | {"uptime": time.monotonic() - self.started, "jobs": self.jobs}
+            else:
+                response = {"error": f"ValueError: unknown op {op!r}"}
+        except Exception as error:
+            response = _error(error)
+        if "error" in response:
+            self.stats.errors += 1
+        return response
+
+    async def _compile(self, message: dict) -> dict:
+        source = message["source"]
+        opt_level = int(message.get("opt_level", 0))
+        allocate = bool(message.get("allocate", False))
+        source_map = bool(message.get("source_map", False))
+        if source_map and opt_level >= 2:
+            raise ValueError("source maps can't be made at -O2")
+        key = (cache_key(source, opt_level, allocate), source_map)
+        response = self._memo.get(key)
+        if response is not None:
+            self._memo.move_to_end(key)
+            self.stats.memo_hits += 1
+            return response
+        response = await asyncio.get_running_loop().run_in_executor(
+            self._pool, _compile_source, source, opt_level, allocate, source_map)
+        if self.memo_size:
+            self._memo[key] = response
+            if len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+        return response
+
+    async def _compile_files(self, message: dict) -> dict:
+        # Paths are the client's, made absolute by it
+        opt_level = int(message.get("opt_level", 0))
+        allocate = bool(message.get("allocate", False))
+        source_map = bool(message.get("source_map", False))
+        paths = find_sources(message["paths"])
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(self._pool, _compile_path, path, output_path, opt_level, allocate, source_map)
+            for path, output_path in zip(paths, output_paths(paths, message.get("output_dir")))))
+        return {"results": results}
+
+
+def _remove_stale_socket(path: str) -> None:
+    # A socket file left by a server that died is removed, one a server still answers on is an error
+    if not os.path.exists(path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except OSError:
+            os.unlink(path)
+            return
+    raise OSError(f"a server is already listening on {path}")
+
+
+async def serve(server: CompileServer) -> None:
+    await server.start()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    print(f"Listening on {server.path} with {server.jobs} workers", flush=True)
+    serving = asyncio.create_task(server.serve_forever())
+    await stop.wait()
+    serving.cancel()
+    await server.close()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--socket', default=default_socket_path(), help="Unix socket path (default: %(default)s)")
+    arg_parser.add_argument('-j', '--jobs', type=int, default=None, help="worker processes (default: CPU count)")
+    arg_parser.add_argument('--cache-dir', default=None, help="also keep compiled programs in this directory")
+    arg_parser.add_argument('--memo-size', type=int, default=DEFAULT_MEMO_SIZE,
+                            help="compile responses kept in memory (default %(default)s)")
+    args = arg_parser.parse_args()
+    try:
+        asyncio.run(serve(CompileServer(args.socket, args.jobs, args.cache_dir, args.memo_size)))
+    except OSError as error:
+        print("Error:", error, file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""
+Incremental compilation for editors and the REPL. A CompilationSession keeps the source as lines,
+cut into segments of whole top-level statements, each with its tokens, AST, the names it declared
+and its target code. An edit re-lexes, re-parses and re-translates only the segments it touches;
+the segments after it are only redone when the edit changes which names are declared.
+
+    session = CompilationSession("binary a = input();\\noutput(a);")
+    session.update((1, 2), "output(not a);")
+    session.output
+"""
+from bisect import bisect_right
+from collections import ChainMap
+from dataclasses import dataclass
+from itertools import accumulate
+from lexer import TokenStream, tokenize_stream
+from parser import Parser
+from symbols import SymbolTable, resolve_symbols
+from optimizer import optimize
+from translator import translate
+
+_DECLARE = ('declare_binary', 'declare_stack', 'declare_function')  # by Parser.defined_identifiers flag index
+
+
+class _RecordingParser(Parser):
+    """
+    Parser starting from the names declared before its piece of the source, which it reads through
+    a ChainMap and never changes, recording the names it adds.
+    """
+    def __init__(self, tokens: TokenStream, defined_identifiers: dict[str, list[bool]]):
+        super().__init__(tokens)
+        self.defined_identifiers = ChainMap({}, defined_identifiers)
+        self.declared: list[tuple[str, int]] = []
+
+    def add_identifier(self, token: int, name: str, index: int) -> None:
+        flags = self.defined_identifiers.get(name)
+        if flags and not flags[index]:
+            self.defined_identifiers[name] = list(flags)  # copy before add_identifier sets the flag in place
+        super().add_identifier(token, name, index)
+        self.declared.append((name, index))
+
+
+class _Segment:
+    __slots__ = ('start', 'end', 'line', 'tokens', 'statements', 'declared', 'output')
+
+    def __init__(self, start: int, end: int, tokens: tuple[TokenStream, int, int] | None, statements: list,
+                 declared: list[tuple[str, int]], output: str = ""):
+        self.start = start  # source lines [start, end), 0-based
+        self.end = end
+        self.line = start  # start when the nodes got their line numbers
+        self.tokens = tokens  # (stream, first token, end token)
+        self.statements = statements
+        self.declared = declared  # (name, flag index) in the order the parser added them
+        self.output = output
+
+
+class _Names:
+    """
+    Parser.defined_identifiers after the first `count` segments, moved to another count by applying
+    or reverting the declarations in between, so edits close to each other replay little.
+    """
+    def __init__(self):
+        self.defined: dict[str, list[bool]] = {"current": [True, True, False]}
+        self.functions: dict[str, None] = {}  # defined functions, in order
+        self.count = 0
+
+    def seek(self, segments: list[_Segment], count: int) -> None:
+        while self.count < count:
+            for name, index in segments[self.count].declared:
+                self.defined.setdefault(name, [False, False, False])[index] = True
+                if index == 2:
+                    self.functions[name] = None
+            self.count += 1
+        while self.count > count:
+            self.count -= 1
+            for name, index in reversed(segments[self.count].declared):
+                flags = self.defined[name]
+                flags[index] = False
+                if not any(flags):
+                    # First declared in this segment, so it goes back to the end of the order if declared again
+                    del self.defined[name]
+                if index == 2:
+                    del self.functions[name]
+
+
+@dataclass
+class UpdateStats:
+    lines_lexed: int = 0
+    segments_parsed: int = 0
+    segments_translated: int = 0
+    declarations_changed: bool = False
+
+
+def _split_lines(text: str) -> list[str]:
+    if not text:
+        return []
+    lines = text.split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    return lines
+
+
+def _shift_lines(statements: list, shift: int) -> None:
+    work: list = list(statements)
+    while work:
+        node = work.pop()
+        node.line += shift
+        work.extend(node.children())
+
+
+class CompilationSession:
+    """
+    Source, AST, symbols and target code of one program, kept up to date edit by edit. At -O0 the
+    output is the same as compiler.compile(). -O1 optimizes each segment on its own, so it can keep
+    an instruction a whole-program -O1 drops, and the whole-program passes of -O2 aren't run at all.
+    """
+    def __init__(self, source: str = "", opt_level: int = 0):
+        if opt_level not in (0, 1):
+            raise ValueError("a session compiles at -O0 or -O1")
+        self.opt_level = opt_level
+        self.lines: list[str] = []
+        self.segments: list[_Segment] = []
+        self.symbols = SymbolTable()
+        self.error: Exception | None = None  # of the last update, the output is then the last good one
+        self._names = _Names()
+        # Segments from index `at` on are `by` lines further down than their start/end say, which
+        # lets repeated edits in one place skip renumbering everything after them
+        self._shift = (0, 0)
+        self._dirty: int | None = None  # index of the segment holding the region that failed to compile
+        if source:
+            self.update((0, 0), source)
+
+    @property
+    def source(self) -> str:
+        return "\n".join(self.lines)
+
+    @property
+    def output(self) -> str:
+        return "".join(segment.output for segment in self.segments)
+
+    @property
+    def ast(self) -> list:
+        return self.statements_from(0)
+
+    def statements_from(self, line: int) -> list:
+        """The statements of the segments starting at or after a (0-based) source line."""
+        self._settle(len(self.segments))
+        statements = []
+        for segment in self.segments:
+            if segment.start < line:
+                continue
+            if segment.line != segment.start:
+                _shift_lines(segment.statements, segment.start - segment.line)
+                segment.line = segment.start
+            statements.extend(segment.statements)
+        return statements
+
+    def append(self, text: str) -> UpdateStats:
+        """Adds lines at the end of the source, as a REPL entry does."""
+        return self.update((len(self.lines), len(self.lines)), text)
+
+    def update(self, line_range: tuple[int, int], new_text: str) -> UpdateStats:
+        """
+        Replaces source lines [start, end) (0-based) with the lines of new_text and recompiles what
+        the edit affects. Errors are raised with the lines kept; the region stays marked and is
+        compiled again by the next update.
+        """
+        start, end = line_range
+        if not 0 <= start <= end <= len(self.lines):
+            raise IndexError(f"line range {line_range} outside of {len(self.lines)} lines")
+        new_lines = _split_lines(new_text)
+        self.lines[start:end] = new_lines
+        delta = len(new_lines) - (end - start)
+
+        first, last = self._affected(start, end)
+        self._settle(last)
+        self._shift = (last, self._shift[1] + delta)
+        segments = self.segments
+        region_start = min(segments[first].start, start) if last > first else start
+        region_end = max(segments[last - 1].end + delta if last > first else 0, start + len(new_lines))
+
+        stats = UpdateStats()
+        try:
+            self._recompile(first, last, region_start, region_end, stats)
+        except (SyntaxError, EOFError) as error:
+            self.error = error
+            raise
+        self.error = None
+        return stats
+
+    def _settle(self, index: int) -> None:
+        # Moves the start of the pending shift to `index`, renumbering the segments it passes
+        at, by = self._shift
+        if by:
+            for segment in self.segments[at:index]:
+                segment.start += by
+                segment.end += by
+            for segment in self.segments[index:at]:
+                segment.start -= by
+                segment.end -= by
+        self._shift = (index, by)
+
+    def _start(self, index: int) -> int:
+        at, by = self._shift
+        return self.segments[index].start + (by if index >= at else 0)
+
+    def _affected(self, start: int, end: int) -> tuple[int, int]:
+        # Indexes [first, last) of the segments overlapping the edited lines, or holding the line an
+        # insertion goes to, together with the failed region if there is one
+        segments = self.segments
+        if not segments:
+            return 0, 0
+        first = max(bisect_right(range(len(segments)), start, key=self._start) - 1, 0)
+        last = first + 1
+        if end > start:
+            last = max(bisect_right(range(len(segments)), end - 1, key=self._start), last)
+        if self._dirty is not None:
+            first, last = min(first, self._dirty), max(last, self._dirty + 1)
+        return first, last
+
+    def _recompile(self, first: int, last: int, region_start: int, region_end: int, stats: UpdateStats) -> None:
+        segments = self.segments
+        names = self._names
+        names.seek(segments, first)
+        old_declared = [entry for segment in segments[first:last] for entry in segment.declared]
+        try:
+            extra = 1
+            while True:
+                new, declared = self._parse(region_start, region_end, names.defined, stats, final=last == len(segments))
+                if new is not None:
+                    break
+                # The edit left a statement open, it continues into the following segments: take in
+                # twice as many each time so a long open block costs linear time
+                grown = min(last + extra, len(segments))
+                self._settle(grown)
+                region_end = segments[grown - 1].end
+                old_declared.extend(entry for segment in segments[last:grown] for entry in segment.declared)
+                last = grown
+                extra *= 2
+
+            if declared != old_declared:
+                stats.declarations_changed = True
+                if last < len(segments):
+                    # Later segments may now fail or mean something else, so everything after the edit is redone
+                    defined = dict(names.defined)
+                    for name, index in declared:
+                        defined[name] = list(defined.get(name, (False, False, False)))
+                        defined[name][index] = True
+                    more, _ = self._parse(region_end, len(self.lines), defined, stats, final=True)
+                    new.extend(more)
+                    region_end = len(self.lines)
+                    last = len(segments)
+                order = dict.fromkeys(names.defined)
+                order.update((name, None) for segment in new for name, _ in segment.declared)
+                symbols = SymbolTable({name: index for index, name in enumerate(order)})
+                for segment in segments[:first]:
+                    for name, index in segment.declared:
+                        getattr(symbols, _DECLARE[index])(name)
+            else:
+                symbols = self.symbols
+            functions = list(names.functions)
+            for segment in new:
+                resolve_symbols(segment.statements, function_names=functions, symbols=symbols)
+                segment.statements = optimize(segment.statements, self.opt_level)
+                segment.output = translate(segment.statements, symbols=symbols)
+                stats.segments_translated += 1
+                functions.extend(name for name, index in segment.declared if index == 2)
+        except (SyntaxError, EOFError):
+            self._replace(first, last, [self._stale(first, last, region_start, region_end)])
+            self._dirty = first
+            raise
+        self._replace(first, last, new)
+        self._dirty = None
+        self.symbols = symbols
+
+    def _replace(self, first: int, last: int, new: list[_Segment]) -> None:
+        self._settle(last)
+        self.segments[first:last] = new
+        self._shift = (first + len(new), self._shift[1])
+
+    def _stale(self, first: int, last: int, region_start: int, region_end: int) -> _Segment:
+        # The last good statements, names and output of a region that failed, under its new lines
+        old = self.segments[first:last]
+        return _Segment(region_start, region_end, None,
+                        [statement for segment in old for statement in segment.statements],
+                        [entry for segment in old for entry in segment.declared],
+                        "".join(segment.output for segment in old))
+
+    def _parse(self, region_start: int, region_end: int, defined: dict[str, list[bool]], stats: UpdateStats,
+               final: bool = False) -> tuple[list[_Segment] | None, list[tuple[str, int]]]:
+        """
+        Lexes and parses lines [region_start, region_end) into segments. Returns None for them when the
+        region ends inside a statement, unless final, which raises the parser's error instead.
+        """
+        lines = self.lines[region_start:region_end]
+        text = "\n".join(lines)
+        stats.lines_lexed += len(lines)
+        stream = tokenize_stream(text, region_start + 1)
+        # Offsets of the newlines from the lines themselves: the lexer doesn't count newlines swallowed inside a token
+        newlines = [offset - 1 for offset in accumulate(len(line) + 1 for line in lines[:-1])]
+        parser = _RecordingParser(stream, defined)
+        count = len(stream.kinds)
+        groups: list[list] = []  # [first line, last line, statements, first token, first declaration]
+        while parser.pos < count:
+            token = parser.pos
+            declared = len(parser.declared)
+            try:
+                statement = parser.parse_statement()
+            except EOFError:
+                if final:
+                    raise
+                return None, parser.declared
+            first_line = bisect_right(newlines, stream.starts[token])
+            last_line = bisect_right(newlines, stream.ends[parser.pos - 1] - 1)
+            if groups and first_line <= groups[-1][1]:
+                groups[-1][1] = max(groups[-1][1], last_line)
+                groups[-1][2].append(statement)
+            else:
+                groups.append([first_line, last_line, [statement], token, declared])
+        stats.segments_parsed += len(groups)
+
+        if not groups:
+            empty = [_Segment(region_start, region_end, (stream, 0, count), [], [])] if region_end > region_start else []
+            return empty, []
+        segments = []
+        for index, (first_line, _, statements, token, declared) in enumerate(groups):
+            following = groups[index + 1] if index + 1 < len(groups) else None
+            start = region_start + first_line if index else region_start
+            end = region_start + following[0] if following else region_end
+            segments.append(_Segment(start, end, (stream, token, following[3] if following else count), statements,
+                                     parser.declared[declared:following[4] if following else None]))
+        return segments, parser.declared
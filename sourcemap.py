@@ -0,0 +1,133 @@
+"""
+Source maps from target code back to Brainknot source lines. A map is a run of (output offset,
+line) pairs: the target code from each offset up to the next one came from that source line.
+Saved next to the output as JSON holding the pairs as deltas in base64 VLQ, as JavaScript
+source maps do:
+
+    {"version": 1, "file": "prog.bko", "source": "prog.bk", "mappings": "AC2BCEG..."}
+"""
+import json
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import Iterator
+
+SOURCE_MAP_VERSION = 1
+MAP_SUFFIX = ".map"
+
+_BASE64 = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+_BASE64_VALUES = {char: value for value, char in enumerate(_BASE64)}
+
+
+def encode_vlq(values: Iterator[int] | list[int]) -> str:
+    """
+    Base64 VLQ: the sign in the lowest bit, then 5 bits per digit, least significant first, with
+    0x20 set on every digit but the last.
+    """
+    digits = []
+    for value in values:
+        value = -value << 1 | 1 if value < 0 else value << 1
+        while True:
+            digit = value & 0x1f
+            value >>= 5
+            if value:
+                digits.append(_BASE64[digit | 0x20])
+            else:
+                digits.append(_BASE64[digit])
+                break
+    return "".join(digits)
+
+
+def decode_vlq(text: str) -> list[int]:
+    values = []
+    value = 0
+    shift = 0
+    for char in text:
+        try:
+            digit = _BASE64_VALUES[char]
+        except KeyError:
+            raise ValueError(f"invalid VLQ digit {char!r}") from None
+        value |= (digit & 0x1f) << shift
+        if digit & 0x20:
+            shift += 5
+            continue
+        values.append(-(value >> 1) if value & 1 else value >> 1)
+        value = 0
+        shift = 0
+    if shift:
+        raise ValueError("VLQ data ends inside a value")
+    return values
+
+
+@dataclass
+class SourceMap:
+    offsets: array = field(default_factory=lambda: array('l'))  # where each range starts in the target code, ascending
+    lines: array = field(default_factory=lambda: array('l'))  # source line of each range
+    length: int = 0  # of the target code
+    file: str | None = None  # names of the target code and the source, as saved with the map
+    source: str | None = None
+
+    def add(self, offset: int, line: int) -> None:
+        # Starts a range, replacing an empty previous one and merged into one with the same line
+        if self.offsets and self.offsets[-1] == offset:
+            self.offsets.pop()
+            self.lines.pop()
+        if self.lines and self.lines[-1] == line:
+            return
+        self.offsets.append(offset)
+        self.lines.append(line)
+
+    def line_at(self, offset: int) -> int | None:
+        """Source line of the target code at offset, None for code no statement produced."""
+        index = bisect_right(self.offsets, offset) - 1
+        if index < 0 or offset >= self.length:
+            return None
+        return self.lines[index]
+
+    def ranges(self) -> Iterator[tuple[int, int, int]]:
+        """(start, end, line) of every range in target code order."""
+        for index, start in enumerate(self.offsets):
+            end = self.offsets[index + 1] if index + 1 < len(self.offsets) else self.length
+            yield start, end, self.lines[index]
+
+    def encode(self) -> str:
+        """The ranges as VLQ deltas: offset, then line, relative to the previous range, then the length."""
+        values = []
+        offset = line = 0
+        for start, start_line in zip(self.offsets, self.lines):
+            values.append(start - offset)
+            values.append(start_line - line)
+            offset, line = start, start_line
+        values.append(self.length - offset)
+        return encode_vlq(values)
+
+    @classmethod
+    def decode(cls, mappings: str) -> 'SourceMap':
+        values = decode_vlq(mappings)
+        if len(values) % 2 != 1:
+            raise ValueError("source map mappings hold an incomplete range")
+        source_map = cls()
+        offset = line = 0
+        for index in range(0, len(values) - 1, 2):
+            offset += values[index]
+            line += values[index + 1]
+            source_map.offsets.append(offset)
+            source_map.lines.append(line)
+        source_map.length = offset + values[-1]
+        return source_map
+
+    def save(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as handle:
+            json.dump({"version": SOURCE_MAP_VERSION, "file": self.file, "source": self.source, "mappings": self.encode()},
+                      handle)
+
+    @classmethod
+    def load(cls, path: str) -> 'SourceMap':
+        with open(path, encoding='utf-8') as handle:
+            data = json.load(handle)
+        if data.get("version") != SOURCE_MAP_VERSION:
+            raise ValueError(f"unsupported source map version {data.get('version')!r} in {path}")
+        source_map = cls.decode(data["mappings"])
+        source_map.file = data.get("file")
+        source_map.source = data.get("source")
+        return source_map
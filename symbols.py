@@ -0,0 +1,189 @@
+from typing import Callable, Sequence
+from parser import ASTNode, ASTNodeError
+from nodes import (Node, NODE_CLASSES, ASSIGNMENT, BINARY_DECLARATION, FUNCTION_CALL, FUNCTION_DEFINITION,
+                   FUNCTION_DEFINITION_AND_CALL, IDENTIFIER, IF_STATEMENT, NOT_OP, OUTPUT, POP_OPERATION,
+                   PUSH_OPERATION, STACK_DECLARATION, WHILE_LOOP, Assignment, BinaryDeclaration, FunctionCall,
+                   FunctionDefinition, Identifier, IfStatement, Output, PopOperation, PushOperation,
+                   StackDeclaration, WhileLoop)
+
+
+class SymbolTable:
+    """
+    Dense slot ids for every binary, stack and function of a program.
+    Resolved nodes carry their slot in fields['slot'] ('current' resolves to None), and the
+    translator turns slots into runtime stack numbers through binary_numbers/stack_numbers.
+    """
+    def __init__(self, order: dict[str, int] | None = None):
+        self.binaries: dict[str, int] = {}  # name -> slot
+        self.stacks: dict[str, int] = {}
+        self.functions: dict[str, int] = {}
+        self.binary_names: list[str] = []  # slot -> name
+        self.stack_names: list[str] = []
+        self.function_names: list[str] = []
+        self.binary_numbers: list[int] = []  # slot -> stack number used in the output
+        self.stack_numbers: list[int] = []
+        # Stack numbers follow the order names were first declared in, 'current' takes 0
+        self.order: dict[str, int] = dict(order) if order else {'current': 0}
+
+    def _number(self, name: str) -> int:
+        if name not in self.order:
+            self.order[name] = len(self.order)
+        return self.order[name]
+
+    def declare_binary(self, name: str) -> int:
+        if name not in self.binaries:
+            self.binaries[name] = len(self.binary_names)
+            self.binary_names.append(name)
+            self.binary_numbers.append(self._number(name))
+        return self.binaries[name]
+
+    def declare_stack(self, name: str) -> int:
+        if name not in self.stacks:
+            self.stacks[name] = len(self.stack_names)
+            self.stack_names.append(name)
+            self.stack_numbers.append(self._number(name))
+        return self.stacks[name]
+
+    def declare_function(self, name: str) -> int:
+        if name not in self.functions:
+            self.functions[name] = len(self.function_names)
+            self.function_names.append(name)
+            self._number(name)
+        return self.functions[name]
+
+    def __repr__(self) -> str:
+        return f"SymbolTable(binaries={self.binaries}, stacks={self.stacks}, functions={self.functions})"
+
+
+def _resolve_identifier(expression: Identifier, symbols: SymbolTable) -> None:
+    name = expression.name
+    if name == 'current':
+        expression.slot = None
+    elif name in symbols.binaries:
+        expression.slot = symbols.binaries[name]
+    else:
+        raise ASTNodeError(expression, f"name {name} is not declared")
+
+
+def _resolve_pop(expression: PopOperation, symbols: SymbolTable) -> None:
+    stack_name = expression.stack_name
+    if stack_name == 'current':
+        expression.slot = None
+    elif stack_name in symbols.stacks:
+        expression.slot = symbols.stacks[stack_name]
+    else:
+        raise ASTNodeError(expression, f"stack name {stack_name} is not declared")
+
+
+# Expression resolvers by node kind, None for expressions without names
+_EXPRESSION_RESOLVERS: list[Callable[[Node, SymbolTable], None] | None] = [None] * len(NODE_CLASSES)
+_EXPRESSION_RESOLVERS[IDENTIFIER] = _resolve_identifier
+_EXPRESSION_RESOLVERS[POP_OPERATION] = _resolve_pop
+
+
+def _resolve_expression(expression: Node, symbols: SymbolTable) -> None:
+    while expression.kind == NOT_OP:
+        expression = expression.operand
+    resolver = _EXPRESSION_RESOLVERS[expression.kind]
+    if resolver is not None:
+        resolver(expression, symbols)
+
+
+class _Resolver:
+    """Statement handlers by node kind, sharing the table, the work stack and the defined functions."""
+    def __init__(self, symbols: SymbolTable, defined_functions: set[str], work: list):
+        self.symbols = symbols
+        self.defined_functions = defined_functions
+        self.work = work
+        self.table: list[Callable[[Node], None] | None] = [None] * len(NODE_CLASSES)
+        self.table[BINARY_DECLARATION] = self.binary_declaration
+        self.table[STACK_DECLARATION] = self.stack_declaration
+        self.table[OUTPUT] = self.output
+        self.table[PUSH_OPERATION] = self.push
+        self.table[ASSIGNMENT] = self.assignment
+        self.table[FUNCTION_CALL] = self.function_call
+        self.table[FUNCTION_DEFINITION] = self.function_definition
+        self.table[FUNCTION_DEFINITION_AND_CALL] = self.function_definition
+        self.table[IF_STATEMENT] = self.if_statement
+        self.table[WHILE_LOOP] = self.while_loop
+
+    def binary_declaration(self, statement: BinaryDeclaration) -> None:
+        statement.slot = self.symbols.declare_binary(statement.name)
+        _resolve_expression(statement.value, self.symbols)
+
+    def stack_declaration(self, statement: StackDeclaration) -> None:
+        statement.slot = self.symbols.declare_stack(statement.name)
+
+    def output(self, statement: Output) -> None:
+        _resolve_expression(statement.arguments, self.symbols)
+
+    def push(self, statement: PushOperation) -> None:
+        target = statement.stack_name
+        if target == 'current':
+            statement.slot = None
+        elif target in self.symbols.stacks:
+            statement.slot = self.symbols.stacks[target]
+        else:
+            raise ASTNodeError(statement, f"stack {target} is not declared")
+        _resolve_expression(statement.value, self.symbols)
+
+    def assignment(self, statement: Assignment) -> None:
+        _resolve_expression(statement.expression, self.symbols)
+        target = statement.target
+        if target == 'current':
+            statement.slot = None
+        elif target in self.symbols.binaries:
+            statement.slot = self.symbols.binaries[target]
+        else:
+            raise ASTNodeError(statement, f"assignment target {target} is not declared")
+
+    def function_call(self, statement: FunctionCall) -> None:
+        name = statement.name
+        if name not in self.defined_functions:
+            raise ASTNodeError(statement, f"function {name} is not defined")
+        statement.slot = self.symbols.functions[name]
+
+    def function_definition(self, statement: FunctionDefinition) -> None:
+        name = statement.name
+        if name == 'current':
+            raise ASTNodeError(statement, f"name {name} is preserved and cannot be redefined")
+        statement.slot = self.symbols.declare_function(name)
+        # A function can only be called once its whole body has been seen
+        self.work.append(name)
+        self.work.extend(reversed(statement.body))
+
+    def if_statement(self, statement: IfStatement) -> None:
+        _resolve_expression(statement.condition, self.symbols)
+        self.work.extend(reversed(statement.else_block))
+        self.work.extend(reversed(statement.then_block))
+
+    def while_loop(self, statement: WhileLoop) -> None:
+        _resolve_expression(statement.condition, self.symbols)
+        self.work.extend(reversed(statement.body))
+
+
+def resolve_symbols(statements: Sequence[ASTNode], declared_variables: dict[str, list[bool]] | None = None,
+                    function_names: Sequence[str] = (), symbols: SymbolTable | None = None) -> SymbolTable:
+    """
+    Builds the symbol table of a parsed program and annotates its nodes with slots, in one walk.
+    declared_variables (Parser.defined_identifiers) only seeds the stack numbering order, and
+    function_names are functions that are already defined before these statements. Passing symbols
+    resolves into an existing table instead, e.g. one holding the names of earlier statements.
+    """
+    if symbols is None:
+        symbols = SymbolTable({name: index for index, name in enumerate(declared_variables)} if declared_variables else None)
+    defined_functions = set(function_names)
+    for name in function_names:
+        symbols.declare_function(name)
+    # Explicit work stack: statements to visit, or the name of a function whose body is done
+    work: list[Node | str] = list(reversed(statements))
+    table = _Resolver(symbols, defined_functions, work).table
+    while work:
+        statement = work.pop()
+        if type(statement) is str:
+            defined_functions.add(statement)
+            continue
+        handler = table[statement.kind]
+        if handler is not None:
+            handler(statement)
+    return symbols
@@ -0,0 +1,78 @@
+"""
+The Brainknot target language produced by translator.translate, as a flat instruction stream.
+
+    N         select runtime stack N             -   pop the selected stack into current
+    +         push current onto the selected     *   negate current
+    >         read an input bit into current     <   write current as an output bit
+    [A,B]     run A if current else B            (A) while current: run A
+    .         break out of the innermost loop    {text} print text
+    f:[A]     define function f                  f:(A) define f and call it
+    f         call f (the name is followed by a space)
+"""
+import re
+
+# Instruction kinds that carry an argument, the others are the instruction character itself
+SELECT = 'select'  # stack number
+TEXT = 'text'  # escaped text between the braces
+DEFINE = 'define'  # function name, closed by ']'
+DEFINE_AND_CALL = 'define_and_call'  # function name, closed by ')'
+CALL = 'call'  # function name
+
+Instruction = tuple[str, int | str | None]
+
+_INSTRUCTION_RE = re.compile(
+    r'(?P<select>[0-9]+)'
+    r'|(?P<op>[-+*<>.\[,\]()])'
+    r'|\{(?P<text>(?:[^\\}]|\\.)*)\}'
+    r'|(?P<name>[a-zA-Z_][a-zA-Z0-9_]*)(?:(?P<call> )|:(?P<bracket>[\[(]))'
+)
+
+
+def decode(code: str) -> list[Instruction]:
+    """
+    Splits target code into (kind, argument) instructions.
+    """
+    instructions = []
+    append = instructions.append
+    match_instruction = _INSTRUCTION_RE.match
+    pos = 0
+    while pos < len(code):
+        match = match_instruction(code, pos)
+        if not match:
+            raise SyntaxError(f"Invalid target code at position {pos}: {code[pos:pos+10]}")
+        group = match.lastgroup
+        if group == 'op':
+            append((match.group('op'), None))
+        elif group == 'select':
+            append((SELECT, int(match.group('select'))))
+        elif group == 'text':
+            append((TEXT, match.group('text')))
+        elif group == 'call':
+            append((CALL, match.group('name')))
+        else:
+            append((DEFINE if match.group('bracket') == '[' else DEFINE_AND_CALL, match.group('name')))
+        pos = match.end()
+    return instructions
+
+
+def encode(instructions: list[Instruction]) -> str:
+    parts = []
+    previous = None
+    for kind, argument in instructions:
+        if kind == SELECT:
+            if previous == SELECT:
+                # Two numbers in a row would read as one, and the first selection is dead anyway
+                parts.pop()
+            parts.append(str(argument))
+        elif kind == TEXT:
+            parts.append("{" + argument + "}")
+        elif kind == CALL:
+            parts.append(f"{argument} ")
+        elif kind == DEFINE:
+            parts.append(f"{argument}:[")
+        elif kind == DEFINE_AND_CALL:
+            parts.append(f"{argument}:(")
+        else:
+            parts.append(kind)
+        previous = kind
+    return "".join(parts)
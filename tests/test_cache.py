@@ -0,0 +1,23 @@
+import pickle
+
+import pytest
+
+from cache import CompileCache, cache_key
+
+SOURCE = "output(1);"
+
+
+@pytest.mark.parametrize("data", [pickle.dumps([1, 2]), pickle.dumps("x"), pickle.dumps({"x": 1})[:-3]],
+                         ids=["list", "str", "truncated"])
+def test_damaged_entry_is_a_miss(tmp_path, data):
+    expected = CompileCache(str(tmp_path)).compile(SOURCE).output
+    cache = CompileCache(str(tmp_path))
+    path = cache._path(cache_key(SOURCE))
+    with open(path, 'wb') as file:
+        file.write(data)
+    assert cache.compile(SOURCE).output == expected
+    assert cache.stats.misses == 1 and cache.stats.disk_hits == 0
+    # Replaced by a good entry
+    fresh = CompileCache(str(tmp_path))
+    assert fresh.compile(SOURCE).output == expected
+    assert fresh.stats.disk_hits == 1
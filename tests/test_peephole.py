@@ -0,0 +1,22 @@
+from itertools import product
+
+import pytest
+
+from peephole import RULES, peephole
+from vm import run
+
+EXAMPLES = [(rule.name, before, after) for rule in RULES for before, after in rule.examples]
+
+
+def behaviour(code: str, bits: tuple[bool, ...]) -> tuple:
+    # Output bits, printed text and the non-empty stacks; programs differ in how many stacks they have
+    result = run(code, bits)
+    return result.outputs, "".join(result.text), {number: stack for number, stack in enumerate(result.stacks) if stack}
+
+
+@pytest.mark.parametrize("name, before, after", EXAMPLES)
+def test_rule_example(name, before, after):
+    assert peephole(before) == after
+    # No example loops, so every input combination is one bit per '>'
+    for bits in product((False, True), repeat=before.count('>')):
+        assert behaviour(before, bits) == behaviour(after, bits), f"{name} on input {bits}"
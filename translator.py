@@ -1,5 +1,20 @@
-from parser import Parser, ASTNode, ASTNodeError
-from typing import Container, Iterable
+import copy
+import io
+import multiprocessing
+import time
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from parser import ASTNode
+from nodes import (Node, NODE_CLASSES, FUNCTION_KINDS, ASSIGNMENT, BINARY_DECLARATION, BOOLEAN_LITERAL, BREAK_LOOP,
+                   FUNCTION_CALL, FUNCTION_DEFINITION, FUNCTION_DEFINITION_AND_CALL, IDENTIFIER, IF_STATEMENT, INPUT,
+                   NOT_OP, OUTPUT, POP_OPERATION, PRINT_STATEMENT, PUSH_OPERATION, WHILE_LOOP, Assignment,
+                   BinaryDeclaration, BooleanLiteral, FunctionCall, FunctionDefinition, FunctionDefinitionAndCall,
+                   Identifier, IfStatement, Output, PopOperation, PushOperation, WhileLoop)
+from symbols import SymbolTable, resolve_symbols
+from allocator import allocate_stacks
+from sourcemap import SourceMap
+import instrumentation
+from typing import Callable, Container, Iterable, Iterator
 from types import NoneType
 
 
@@ -34,133 +49,367 @@ func main() {                             |     |      |     | main:(
     };                                    |     |      |     |   ]
 }                                         |     |      |     | )
 """
-def translate_expression(expression: ASTNode, stack_translate: dict[str, int], binary_translate: dict[str, int]):
-    type_ = expression.type
-    fields = expression.fields
-    if type_ == "NotOp":
-        argument = fields['operand']
-        return translate_expression(argument, stack_translate, binary_translate)+"*"
-    if type_ == "Identifier":
-        name = fields['name']
-        if name == 'current':
-            return ''
-        if name not in binary_translate:
-            raise ASTNodeError(expression,f"name {name} is not declared")
-        number = binary_translate[name]
-        return f'{number}-+'
-    if type_ == "PopOperation":
-        stack_name = fields['stack_name']
-        if stack_name == 'current':
-            return '-'
-        if stack_name not in stack_translate:
-            raise ASTNodeError(expression,f"stack name {stack_name} is not declared")
-        number = stack_translate[stack_name]
-        return f'{number}-'
-    if type_ == "BooleanLiteral":
-        value = fields['value']
-        if value:
-            return '[,*]'
-        return '[*]'
-    if type_ == "Input":
-        return ">"
-    return ""
-def translate(statements: list | NoneType = None, declared_variables: dict[str, int] |NoneType = None, function_names: list[str] | None = None, parser=None):
+def _translate_identifier(expression: Identifier, symbols: SymbolTable) -> str:
+    if expression.slot is None:
+        return ''
+    return f'{symbols.binary_numbers[expression.slot]}-+'
+
+
+def _translate_pop(expression: PopOperation, symbols: SymbolTable) -> str:
+    if expression.slot is None:
+        return '-'
+    return f'{symbols.stack_numbers[expression.slot]}-'
+
+
+def _translate_literal(expression: BooleanLiteral, symbols: SymbolTable) -> str:
+    return '[,*]' if expression.value else '[*]'
+
+
+# Expression translators by node kind, kinds that aren't expressions translate to nothing
+_EXPRESSIONS: list[Callable[[Node, SymbolTable], str]] = [lambda expression, symbols: ""] * len(NODE_CLASSES)
+_EXPRESSIONS[IDENTIFIER] = _translate_identifier
+_EXPRESSIONS[POP_OPERATION] = _translate_pop
+_EXPRESSIONS[BOOLEAN_LITERAL] = _translate_literal
+_EXPRESSIONS[INPUT] = lambda expression, symbols: ">"
+
+
+def translate_expression(expression: ASTNode, symbols: SymbolTable):
+    negations = 0
+    while expression.kind == NOT_OP:
+        negations += 1
+        expression = expression.operand
+    code = _EXPRESSIONS[expression.kind](expression, symbols)
+    return code + "*" * negations if negations else code
+
+
+# Output is handed to the sink in chunks of about this many characters
+CHUNK_SIZE = 1 << 16
+
+
+def _prepare(statements, declared_variables, function_names, parser, symbols, allocate) -> tuple[list, SymbolTable]:
+    if parser:
+        # A parser is only asked for its program when no statements are given, never twice
+        if statements is None:
+            statements = parser.parse_program()
+        declared_variables = parser.defined_identifiers
+    if symbols is None:
+        # Names are resolved to slots once, the translation below never looks a name up
+        symbols = resolve_symbols(statements, declared_variables, function_names or ())
+    elif allocate:
+        # The allocator replaces the stack numbers, a caller's table keeps its own
+        symbols = copy.copy(symbols)
+    if allocate:
+        # Share stack numbers between binaries that are never live at the same time
+        allocate_stacks(statements, symbols)
+    return statements, symbols
+
+
+def translate(statements: list | NoneType = None, declared_variables: dict[str, int] |NoneType = None, function_names: list[str] | None = None, parser=None, symbols: SymbolTable | None = None, allocate: bool = False, jobs: int = 1, source_map: SourceMap | None = None):
     # 1 stack per binary
     # 4 operand
     # optimization = hard
-    if parser:
-        statements = parser.parse_program()
-        declared_variables = parser.defined_identifiers
-    stack_translate = {key: index for index, (key, value) in enumerate(declared_variables.items()) if (value[1] and key != 'current')}
-    binary_translate = {key: index for index, (key, value) in enumerate(declared_variables.items()) if (value[0] and key != 'current')}
-    if function_names is None:
-        return_functions = False
-        function_names = []
+    # source_map, when given, gets the source line of every range of the output; mapping is sequential,
+    # so it can't be combined with jobs > 1
+    if source_map is not None and jobs > 1:
+        raise ValueError("source maps are made translating sequentially, jobs must be 1")
+    statements, symbols = _prepare(statements, declared_variables, function_names, parser, symbols, allocate)
+    chunks = []
+    if jobs > 1:
+        _emit_parallel(statements, symbols, chunks.append, jobs)
     else:
-        return_functions = True
-    output = []
-    for statement in statements:
-        fields = statement.fields
-        type_ = statement.type
-        instruction = ""
-        if type_ == "BinaryDeclaration":
-            target = binary_translate[fields['name']]
-            source = fields['value']
-            if source == 'current':
-                source = ''
-            elif type(source) == ASTNode:
-                source = translate_expression(source, stack_translate, binary_translate)
-            else:
-                raise ASTNodeError(statement,f"Unknown source {source}")
-            instruction = f"{source}{target}+"
-        if type_ == "Output":
-            source = fields['arguments']
-            source = translate_expression(source, stack_translate, binary_translate)
-            instruction = f"{source}<"
-        if type_ == "PushOperation":
-            source = fields['value']
-            target = fields['stack_name']
-            if target == 'current':
-                target = ''
-            elif target not in stack_translate:
-                raise ASTNodeError(statement, f"stack {target} is not declared")
-            else:
-                target = stack_translate[target]
-            source = translate_expression(source, stack_translate, binary_translate)
-            instruction = f"{source}{target}+"
-        if type_ == "Assignment":
-            source = fields['expression']
-            source = translate_expression(source, stack_translate, binary_translate)
-            target = fields['target']
-            if target == 'current':
-                instruction = f"{source}"
-            elif target not in binary_translate:
-                raise ASTNodeError(statement, f"assignment target {target} is not declared")
+        _emit(statements, symbols, chunks.append, source_map=source_map)
+    translated = ''.join(chunks)
+    if function_names is not None:
+        return translated, list(symbols.function_names)
+    return translated
+
+
+def _writer(sink) -> Callable[[str], object]:
+    if isinstance(sink, bytearray):
+        return lambda chunk: sink.extend(chunk.encode())
+    if isinstance(sink, (io.RawIOBase, io.BufferedIOBase)):
+        return lambda chunk: sink.write(chunk.encode())
+    if hasattr(sink, 'write'):
+        return sink.write
+    if callable(sink):
+        return sink
+    raise TypeError(f"can't write target code to {type(sink).__name__}")
+
+
+def translate_to(sink, statements: list | None = None, declared_variables: dict[str, int] | None = None, parser=None,
+                 symbols: SymbolTable | None = None, allocate: bool = False, chunk_size: int = CHUNK_SIZE,
+                 source_map: SourceMap | None = None) -> int:
+    """
+    Same output as translate(), streamed into a text file, a binary file, a bytearray or a callback
+    taking string chunks. Returns the number of characters written.
+    """
+    statements, symbols = _prepare(statements, declared_variables, None, parser, symbols, allocate)
+    return _emit(statements, symbols, _writer(sink), chunk_size, source_map)
+
+
+# Statement translators by node kind: each returns the statement's code, and for a statement with
+# blocks, the code up to its first block while queueing the blocks and the code between them on `work`.
+# Those with an expression translate it with `expression`, which instrumentation swaps for a timed one
+def _binary_declaration(statement: BinaryDeclaration, symbols: SymbolTable, work: list, expression=translate_expression) -> str:
+    return f"{expression(statement.value, symbols)}{symbols.binary_numbers[statement.slot]}+"
+
+
+def _output(statement: Output, symbols: SymbolTable, work: list, expression=translate_expression) -> str:
+    return f"{expression(statement.arguments, symbols)}<"
+
+
+def _push(statement: PushOperation, symbols: SymbolTable, work: list, expression=translate_expression) -> str:
+    target = '' if statement.slot is None else symbols.stack_numbers[statement.slot]
+    return f"{expression(statement.value, symbols)}{target}+"
+
+
+def _assignment(statement: Assignment, symbols: SymbolTable, work: list, expression=translate_expression) -> str:
+    source = expression(statement.expression, symbols)
+    if statement.slot is None:
+        return source
+    target = symbols.binary_numbers[statement.slot]
+    return f"{target}-{source}{target}+"
+
+
+def _function_call(statement: FunctionCall, symbols: SymbolTable, work: list) -> str:
+    return f"{symbols.function_names[statement.slot]} "
+
+
+def _function_definition(statement: FunctionDefinition, symbols: SymbolTable, work: list) -> str:
+    work.append("]")
+    work.append(iter(statement.body))
+    return f"{symbols.function_names[statement.slot]}:["
+
+
+def _function_definition_and_call(statement: FunctionDefinitionAndCall, symbols: SymbolTable, work: list) -> str:
+    work.append(")")
+    work.append(iter(statement.body))
+    return f"{symbols.function_names[statement.slot]}:("
+
+
+def _if_statement(statement: IfStatement, symbols: SymbolTable, work: list, expression=translate_expression) -> str:
+    work.append("]")
+    work.append(iter(statement.else_block))
+    work.append(",")
+    work.append(iter(statement.then_block))
+    return f"{expression(statement.condition, symbols)}["
+
+
+def _while_loop(statement: WhileLoop, symbols: SymbolTable, work: list, expression=translate_expression) -> str:
+    work.append(")")
+    work.append(iter(statement.body))
+    return f"{expression(statement.condition, symbols)}("
+
+
+_STATEMENTS: list[Callable[[Node, SymbolTable, list], str]] = [lambda statement, symbols, work: ""] * len(NODE_CLASSES)
+_STATEMENTS[BINARY_DECLARATION] = _binary_declaration
+_STATEMENTS[OUTPUT] = _output
+_STATEMENTS[PUSH_OPERATION] = _push
+_STATEMENTS[ASSIGNMENT] = _assignment
+_STATEMENTS[FUNCTION_CALL] = _function_call
+_STATEMENTS[FUNCTION_DEFINITION] = _function_definition
+_STATEMENTS[FUNCTION_DEFINITION_AND_CALL] = _function_definition_and_call
+_STATEMENTS[IF_STATEMENT] = _if_statement
+_STATEMENTS[WHILE_LOOP] = _while_loop
+_STATEMENTS[BREAK_LOOP] = lambda statement, symbols, work: "."
+_STATEMENTS[PRINT_STATEMENT] = lambda statement, symbols, work: "{" + statement.text + "}"
+
+
+def _timed_expression(expression: Node, symbols: SymbolTable) -> str:
+    start = time.perf_counter()
+    code = translate_expression(expression, symbols)
+    instrumentation.record_span("translate_expression", time.perf_counter() - start)
+    return code
+
+
+_TIMED_STATEMENTS = [partial(translator, expression=_timed_expression)
+                     if kind in (BINARY_DECLARATION, OUTPUT, PUSH_OPERATION, ASSIGNMENT, IF_STATEMENT, WHILE_LOOP)
+                     else translator for kind, translator in enumerate(_STATEMENTS)]
+
+
+class _Hooks:
+    """What a translation adds to the plain one, called by _walk; the base class adds nothing."""
+    table = _STATEMENTS
+
+    def next_statement(self, block: Iterator[ASTNode]) -> None:
+        # Before a statement is taken from a block
+        pass
+
+    def statement(self, statement: ASTNode, instruction: str, offset: int, queued: int) -> None:
+        # A statement was translated to an instruction at offset and queued that many work entries
+        pass
+
+    def closing(self, instruction: str, offset: int) -> None:
+        # Text queued by a statement was emitted at offset
+        pass
+
+    def block_end(self) -> None:
+        pass
+
+    def chunk(self, chunk: str) -> None:
+        # A chunk was written
+        pass
+
+    def done(self, written: int) -> None:
+        pass
+
+
+class _Instrumentation(_Hooks):
+    # A "translate" span per block, tagged with its nesting depth, translate_expression spans and the
+    # emitted bytes counted
+    table = _TIMED_STATEMENTS
+
+    def __init__(self):
+        self.entered: list[tuple[Iterator[ASTNode], float]] = []  # the blocks being translated and when each started
+        self.encoded = 0
+
+    def next_statement(self, block: Iterator[ASTNode]) -> None:
+        if not self.entered or self.entered[-1][0] is not block:
+            self.entered.append((block, time.perf_counter()))
+
+    def block_end(self) -> None:
+        _, start = self.entered.pop()
+        instrumentation.record_span("translate", time.perf_counter() - start, depth=len(self.entered))
+
+    def chunk(self, chunk: str) -> None:
+        self.encoded += len(chunk.encode())
+
+    def done(self, written: int) -> None:
+        instrumentation.count("emitted_bytes", self.encoded)
+
+
+class _SourceMapping(_Hooks):
+    # The line of every statement added to source_map, and for the text between and after blocks, the
+    # line of the statement the blocks belong to
+    def __init__(self, source_map: SourceMap):
+        self.source_map = source_map
+        self.owners = [0]  # line of the statement that queued each work entry
+
+    def statement(self, statement: ASTNode, instruction: str, offset: int, queued: int) -> None:
+        if instruction:
+            self.source_map.add(offset, statement.line)
+        self.owners.extend([statement.line] * queued)
+
+    def closing(self, instruction: str, offset: int) -> None:
+        line = self.owners.pop()
+        if instruction:
+            self.source_map.add(offset, line)
+
+    def block_end(self) -> None:
+        self.owners.pop()
+
+    def done(self, written: int) -> None:
+        self.source_map.length = written
+
+
+def _emit(statements: list, symbols: SymbolTable, write: Callable[[str], object], chunk_size: int = CHUNK_SIZE,
+          source_map: SourceMap | None = None) -> int:
+    if source_map is not None:
+        return _walk(statements, symbols, write, chunk_size, _SourceMapping(source_map))
+    if instrumentation.sinks:
+        return _walk(statements, symbols, write, chunk_size, _Instrumentation())
+    return _walk(statements, symbols, write, chunk_size)
+
+
+def _walk(statements: list, symbols: SymbolTable, write: Callable[[str], object], chunk_size: int,
+          hooks: _Hooks | None = None) -> int:
+    table = _STATEMENTS if hooks is None else hooks.table
+    buffer = []
+    buffered = 0
+    written = 0
+    # Explicit work stack of block iterators and the closing text of the blocks they are in,
+    # so memory grows with the nesting depth only
+    work: list[Iterator[ASTNode] | str] = [iter(statements)]
+    while work:
+        top = work[-1]
+        if type(top) is str:
+            instruction = work.pop()
+            if hooks is not None:
+                hooks.closing(instruction, written + buffered)
+        else:
+            if hooks is not None:
+                hooks.next_statement(top)
+            statement = next(top, None)
+            if statement is None:
+                work.pop()
+                if hooks is not None:
+                    hooks.block_end()
+                continue
+            if hooks is None:
+                instruction = table[statement.kind](statement, symbols, work)
             else:
-                target = binary_translate[target]
-                instruction = f"{target}-{source}{target}+"
-        if type_ == "FunctionCall":
-            name = fields['name']
-            if name not in function_names:
-                raise ASTNodeError(statement, f"function {name} is not defined")
-            instruction = f"{name} "
-        if type_ == "FunctionDefinition":
-            name = fields['name']
-            if name == 'current':
-                raise ASTNodeError(statement, f"name {name} is preserved and cannot be redefined")
-            body = fields['body']
-            body, function_names = translate(body, declared_variables, function_names)
-            instruction = f"{name}:[{body}]"
-            function_names.append(name)
-        if type_ == "FunctionDefinitionAndCall":
-            name = fields['name']
-            if name == 'current':
-                raise ASTNodeError(statement, f"name {name} is preserved and cannot be redefined")
-            body = fields['body']
-            body, function_names = translate(body, declared_variables, function_names)
-            instruction = f"{name}:({body})"
-            function_names.append(name)
-        if type_ == "IfStatement":
-            condition = fields['condition']
-            then_block = fields['then_block']
-            else_block = fields['else_block']
-            condition = translate_expression(condition, stack_translate, binary_translate)
-            then_block, function_names  = translate(then_block, declared_variables, function_names)
-            else_block, function_names  = translate(else_block, declared_variables, function_names)
-            instruction = f"{condition}[{then_block},{else_block}]"
-        if type_ == "WhileLoop":
-            condition = fields['condition']
-            body = fields['body']
-            condition = translate_expression(condition, stack_translate, binary_translate)
-            body, function_names = translate(body, declared_variables, function_names)
-            instruction = f"{condition}({body})"
-        if type_ == "BreakLoop":
-            instruction = "."
-        if type_ == "PrintStatement":
-            text = fields['text']
-            instruction = "{"+text+"}"
-        output.append(instruction)
-    translated = ''.join(output)
-    if return_functions:
-        return translated, function_names
-    return translated
\ No newline at end of file
+                queued = len(work)
+                instruction = table[statement.kind](statement, symbols, work)
+                hooks.statement(statement, instruction, written + buffered, len(work) - queued)
+        buffer.append(instruction)
+        buffered += len(instruction)
+        if buffered >= chunk_size:
+            chunk = ''.join(buffer)
+            write(chunk)
+            if hooks is not None:
+                hooks.chunk(chunk)
+            written += buffered
+            buffer.clear()
+            buffered = 0
+    if buffered:
+        chunk = ''.join(buffer)
+        write(chunk)
+        if hooks is not None:
+            hooks.chunk(chunk)
+        written += buffered
+    if hooks is not None:
+        hooks.done(written)
+    return written
+
+
+# Programs spanning fewer source lines translate faster here than a process pool starts (about 0.5us
+# a line against a few ms), so jobs > 1 only forks workers from this size on
+PARALLEL_MIN_LINES = 20_000
+
+# Functions and symbols of the program being translated in parallel, inherited by forked workers
+_forked: tuple[list, SymbolTable] | None = None
+
+
+def _translate_functions(indices: range) -> list[str]:
+    functions, symbols = _forked
+    translated = []
+    for index in indices:
+        chunks = []
+        _emit([functions[index]], symbols, chunks.append)
+        translated.append(''.join(chunks))
+    return translated
+
+
+def _emit_parallel(statements: list, symbols: SymbolTable, write: Callable[[str], object], jobs: int) -> int:
+    # Resolved slots make top-level function bodies independent: translate them in worker processes,
+    # everything else here, and write both in source order. Workers are forked so they share the AST;
+    # pickling it over costs more than translating it, so without fork this stays sequential.
+    global _forked
+    functions = [statement for statement in statements if statement.kind in FUNCTION_KINDS]
+    if (len(functions) < 2 or statements[-1].line - statements[0].line < PARALLEL_MIN_LINES
+            or "fork" not in multiprocessing.get_all_start_methods()):
+        return _emit(statements, symbols, write)
+    jobs = min(jobs, len(functions))
+    step = -(-len(functions) // (jobs * 4))
+    batches = [range(start, min(start + step, len(functions))) for start in range(0, len(functions), step)]
+    _forked = (functions, symbols)
+    try:
+        with ProcessPoolExecutor(jobs, mp_context=multiprocessing.get_context("fork")) as executor:
+            bodies = iter([body for batch in executor.map(_translate_functions, batches) for body in batch])
+    finally:
+        _forked = None
+    written = 0
+    run = []
+    for statement in statements:
+        if statement.kind in FUNCTION_KINDS:
+            if run:
+                written += _emit(run, symbols, write)
+                run = []
+            body = next(bodies)
+            write(body)
+            written += len(body)
+        else:
+            run.append(statement)
+    if run:
+        written += _emit(run, symbols, write)
+    return written
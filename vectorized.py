@@ -0,0 +1,390 @@
+"""
+Runs one program over many input streams at once with NumPy: every lane has its own current bit,
+stacks, selection and input/output position, and branches and loops narrow a mask of active lanes.
+Printed text is not collected, only output bits.
+"""
+import sys
+from dataclasses import dataclass
+from typing import Any
+from target import SELECT, TEXT, DEFINE, DEFINE_AND_CALL, CALL, decode
+from vm import ExecutionLimitExceeded
+
+# Item kinds of the block tree, the simple instructions keep their target character
+IF = '['
+LOOP = '('
+BREAK = 'break'
+RETURN = 'return'
+HALT = 'halt'
+
+# Frame kinds of the executor
+_SEQUENCE = 0
+_THEN = 1
+_ELSE = 2
+_LOOP = 3
+_CALL = 4
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError as error:
+        raise ImportError("vectorized execution needs NumPy, install it with 'pip install numpy'") from error
+    return numpy
+
+
+@dataclass
+class BatchResult:
+    outputs: Any  # (lanes x outputs) bool array, padded with False past each lane's output count
+    output_counts: Any  # outputs written by each lane
+    steps: int  # instructions executed in lockstep
+
+
+def build_tree(code: str) -> tuple[list, dict[str, list]]:
+    """
+    Decodes target code into nested blocks of (kind, argument) items, with ('[', (then, else)) and
+    ('(', body) for the control flow, breaks resolved to BREAK/RETURN/HALT, and the function bodies.
+    """
+    program: list = []
+    functions: dict[str, list] = {}
+    # Open constructs: (kind, enclosing block, else block or function name)
+    open_blocks: list[tuple[str, list, Any]] = []
+    block = program
+    for kind, argument in decode(code):
+        if kind in (SELECT, TEXT, '-', '+', '*', '>', '<'):
+            block.append((kind, argument))
+        elif kind == '[':
+            then_block, else_block = [], []
+            block.append((IF, (then_block, else_block)))
+            open_blocks.append(('[', block, else_block))
+            block = then_block
+        elif kind == ',':
+            block = open_blocks[-1][2]
+        elif kind == '(':
+            body = []
+            block.append((LOOP, body))
+            open_blocks.append(('(', block, None))
+            block = body
+        elif kind in (DEFINE, DEFINE_AND_CALL):
+            functions[argument] = []
+            if kind == DEFINE_AND_CALL:
+                block.append((CALL, argument))
+            open_blocks.append((kind, block, argument))
+            block = functions[argument]
+        elif kind in (']', ')'):
+            if not open_blocks:
+                raise SyntaxError(f"Unexpected '{kind}' in target code")
+            block = open_blocks.pop()[1]
+        elif kind == '.':
+            resolved = HALT
+            for bracket, _, _ in reversed(open_blocks):
+                if bracket == '(':
+                    resolved = BREAK
+                    break
+                if bracket in (DEFINE, DEFINE_AND_CALL):
+                    resolved = RETURN
+                    break
+            block.append((resolved, None))
+        elif kind == CALL:
+            block.append((CALL, argument))
+    if open_blocks:
+        raise SyntaxError(f"Unclosed '{open_blocks[-1][0]}' in target code")
+    return program, functions
+
+
+class _Counter:
+    """
+    Per-lane counter (stack depth, selected stack, read or write position), kept as a single
+    number while every lane agrees on it.
+    """
+    __slots__ = ('value', 'values')
+
+    def __init__(self):
+        self.value: int | None = 0
+        self.values = None  # per-lane values while the lanes disagree
+
+    def split(self, np, lanes: int):
+        if self.value is not None:
+            self.values = np.full(lanes, self.value, dtype=np.int64)
+            self.value = None
+        return self.values
+
+    def join(self) -> None:
+        if self.value is None:
+            low = int(self.values.min())
+            if low == self.values.max():
+                self.value = low
+                self.values = None
+
+
+class _Stack:
+    __slots__ = ('data', 'depth')
+
+    def __init__(self, np, lanes: int):
+        self.data = np.zeros((4, lanes), dtype=bool)  # depth x lanes
+        self.depth = _Counter()
+
+
+class _Frame:
+    __slots__ = ('kind', 'items', 'index', 'saved', 'other')
+
+    def __init__(self, kind: int, items: list, saved=None, other=None):
+        self.kind = kind
+        self.items = items
+        self.index = 0
+        self.saved = saved  # lanes parked by the construct: the else lanes, loop exits or returns
+        self.other = other  # else block, or the then lanes once the then block finished
+
+
+class _Batch:
+    """
+    Lockstep state of all lanes. Operations take the mask of lanes they apply to and whether that
+    is every lane, which allows whole-row copies instead of per-lane indexing.
+    """
+    def __init__(self, np, inputs):
+        self.np = np
+        self.lanes = inputs.shape[0]
+        self.inputs = np.ascontiguousarray(inputs.T)  # input bit x lanes
+        self.current = np.zeros(self.lanes, dtype=bool)
+        self.selected = _Counter()
+        self.read_position = _Counter()
+        self.written = _Counter()
+        self.outputs = np.zeros((8, self.lanes), dtype=bool)  # output x lanes
+        self.stacks: dict[int, _Stack] = {}
+
+    def stack(self, number: int) -> _Stack:
+        stack = self.stacks.get(number)
+        if stack is None:
+            stack = self.stacks[number] = _Stack(self.np, self.lanes)
+        return stack
+
+    def push(self, stack: _Stack, mask, full: bool) -> None:
+        np = self.np
+        depth = stack.depth
+        depth.join()
+        if depth.value is not None:
+            if depth.value >= stack.data.shape[0]:
+                stack.data = np.concatenate((stack.data, np.zeros_like(stack.data)))
+            if full:
+                stack.data[depth.value] = self.current
+                depth.value += 1
+            else:
+                np.copyto(stack.data[depth.value], self.current, where=mask)
+                depth.split(np, self.lanes)[mask] += 1
+            return
+        active = np.flatnonzero(mask)
+        levels = depth.values[active]
+        if levels.max() >= stack.data.shape[0]:
+            stack.data = np.concatenate((stack.data, np.zeros_like(stack.data)))
+        stack.data[levels, active] = self.current[active]
+        depth.values[active] = levels + 1
+
+    def pop(self, stack: _Stack, mask, full: bool, keep: bool = False) -> None:
+        # With keep, the value stays on the stack, which is what '-+' does
+        np = self.np
+        current = self.current
+        depth = stack.depth
+        depth.join()
+        if depth.value == 0:
+            if full:
+                current[:] = False
+            else:
+                current &= ~mask
+            if keep:
+                self.push(stack, mask, full)
+            return
+        if depth.value is not None:
+            top = stack.data[depth.value - 1]
+            if full:
+                current[:] = top
+                if not keep:
+                    depth.value -= 1
+            else:
+                np.copyto(current, top, where=mask)
+                if not keep:
+                    depth.split(np, self.lanes)[mask] -= 1
+            return
+        if keep:
+            self.pop(stack, mask, full)
+            self.push(stack, mask, full)
+            return
+        active = np.flatnonzero(mask)
+        levels = depth.values[active]
+        filled = levels > 0
+        current[active] = False
+        active = active[filled]
+        levels = levels[filled] - 1
+        current[active] = stack.data[levels, active]
+        depth.values[active] = levels
+
+    def select(self, number: int, mask, full: bool) -> None:
+        if full:
+            self.selected.value = number
+            self.selected.values = None
+        elif self.selected.value != number:
+            self.selected.split(self.np, self.lanes)[mask] = number
+
+    def on_selected(self, operation, mask, full: bool) -> None:
+        # Bare '-' and '+' act on whichever stack each lane selected last
+        selected = self.selected
+        selected.join()
+        if selected.value is not None:
+            operation(self.stack(selected.value), mask, full)
+            return
+        np = self.np
+        for number in np.unique(selected.values[mask]):
+            operation(self.stack(int(number)), mask & (selected.values == number), False)
+
+    def read(self, mask, full: bool) -> None:
+        np = self.np
+        position = self.read_position
+        position.join()
+        width = self.inputs.shape[0]
+        if position.value is not None:
+            if position.value >= width:
+                raise EOFError("Program read more input bits than were given")
+            if full:
+                self.current[:] = self.inputs[position.value]
+                position.value += 1
+            else:
+                np.copyto(self.current, self.inputs[position.value], where=mask)
+                position.split(np, self.lanes)[mask] += 1
+            return
+        active = np.flatnonzero(mask)
+        columns = position.values[active]
+        if columns.max() >= width:
+            raise EOFError("Program read more input bits than were given")
+        self.current[active] = self.inputs[columns, active]
+        position.values[active] = columns + 1
+
+    def write(self, mask, full: bool) -> None:
+        np = self.np
+        written = self.written
+        written.join()
+        if (written.value if written.value is not None else int(written.values.max())) >= self.outputs.shape[0]:
+            self.outputs = np.concatenate((self.outputs, np.zeros_like(self.outputs)))
+        if written.value is not None:
+            if full:
+                self.outputs[written.value] = self.current
+                written.value += 1
+            else:
+                np.copyto(self.outputs[written.value], self.current, where=mask)
+                written.split(np, self.lanes)[mask] += 1
+            return
+        active = np.flatnonzero(mask)
+        columns = written.values[active]
+        self.outputs[columns, active] = self.current[active]
+        written.values[active] = columns + 1
+
+    def result(self, steps: int) -> BatchResult:
+        np = self.np
+        written = self.written
+        counts = np.full(self.lanes, written.value, dtype=np.int64) if written.value is not None else written.values
+        return BatchResult(self.outputs[:int(counts.max(initial=0))].T.copy(), counts, steps)
+
+
+def truth_table(bits: int):
+    """
+    Every combination of `bits` input bits, one per row, in counting order with the first bit highest.
+    """
+    np = _numpy()
+    rows = np.arange(1 << bits, dtype=np.int64)
+    return ((rows[:, None] >> np.arange(bits - 1, -1, -1)) & 1).astype(bool)
+
+
+def run_batch(code: str, inputs, max_steps: int | None = None) -> BatchResult:
+    """
+    Runs target code once per row of `inputs` (lanes x input bits), all rows in lockstep. A lane
+    reading past the end of its row raises EOFError, like vm.run.
+    """
+    np = _numpy()
+    program, functions = build_tree(code)
+    inputs = np.asarray(inputs, dtype=bool)
+    if inputs.ndim == 1:
+        inputs = inputs[:, None]
+    batch = _Batch(np, inputs)
+    current = batch.current
+    lanes = batch.lanes
+    limit = max_steps if max_steps is not None else sys.maxsize
+
+    def narrowed(new_mask) -> tuple:
+        # The mask with whether it holds every lane, and whether it holds any
+        count = int(np.count_nonzero(new_mask))
+        return new_mask, count == lanes, count > 0
+
+    nothing = np.zeros(lanes, dtype=bool)
+    mask, full, alive = narrowed(np.ones(lanes, dtype=bool))
+    frames = [_Frame(_SEQUENCE, program)]
+    steps = 0
+    while frames:
+        frame = frames[-1]
+        if frame.index >= len(frame.items) or not alive:
+            # The block is done, or no lane runs the rest of it
+            frames.pop()
+            if frame.kind == _THEN:
+                frames.append(_Frame(_ELSE, frame.other, frame.saved, mask))
+                mask, full, alive = narrowed(frame.saved)
+            elif frame.kind == _ELSE:
+                mask, full, alive = narrowed(mask | frame.other)
+            elif frame.kind == _LOOP:
+                exits = frame.saved | (mask & ~current)
+                mask, full, alive = narrowed(mask & current)
+                if alive:
+                    frame.index = 0
+                    frame.saved = exits
+                    frames.append(frame)
+                else:
+                    mask, full, alive = narrowed(exits)
+            elif frame.kind == _CALL:
+                mask, full, alive = narrowed(mask | frame.saved)
+            continue
+        kind, argument = frame.items[frame.index]
+        frame.index += 1
+        steps += 1
+        if steps > limit:
+            raise ExecutionLimitExceeded(f"Program ran for more than {limit} steps")
+        if kind == SELECT:
+            batch.select(argument, mask, full)
+            following = frame.items[frame.index][0] if frame.index < len(frame.items) else None
+            if following == '-' or following == '+':
+                # The selection is the same on every active lane, use the stack directly
+                stack = batch.stack(argument)
+                frame.index += 1
+                steps += 1
+                if following == '+':
+                    batch.push(stack, mask, full)
+                elif frame.index < len(frame.items) and frame.items[frame.index][0] == '+':
+                    frame.index += 1
+                    steps += 1
+                    batch.pop(stack, mask, full, keep=True)
+                else:
+                    batch.pop(stack, mask, full)
+        elif kind == '-':
+            batch.on_selected(batch.pop, mask, full)
+        elif kind == '+':
+            batch.on_selected(batch.push, mask, full)
+        elif kind == '*':
+            np.logical_xor(current, mask, out=current)
+        elif kind == '>':
+            batch.read(mask, full)
+        elif kind == '<':
+            batch.write(mask, full)
+        elif kind == IF:
+            then_block, else_block = argument
+            frames.append(_Frame(_THEN, then_block, mask & ~current, else_block))
+            mask, full, alive = narrowed(mask & current)
+        elif kind == LOOP:
+            frames.append(_Frame(_LOOP, argument, mask & ~current))
+            mask, full, alive = narrowed(mask & current)
+        elif kind == CALL:
+            frames.append(_Frame(_CALL, functions[argument], nothing))
+        elif kind == BREAK or kind == RETURN:
+            # Park the lanes with the innermost loop or call until it finishes
+            wanted = _LOOP if kind == BREAK else _CALL
+            for outer in reversed(frames):
+                if outer.kind == wanted:
+                    outer.saved = outer.saved | mask
+                    break
+            mask, full, alive = nothing, False, False
+        elif kind == HALT:
+            mask, full, alive = nothing, False, False
+    return batch.result(steps)
@@ -0,0 +1,321 @@
+from array import array
+from dataclasses import dataclass, field
+import sys
+from typing import Callable, Iterable
+from target import Instruction, SELECT, TEXT, DEFINE, DEFINE_AND_CALL, CALL, decode
+
+# Opcodes of the decoded program. Stack selections are fused into the instruction that follows them.
+HALT = 0
+PEEK_N = 1  # 'N-+'
+POP_N = 2  # 'N-'
+PUSH_N = 3  # 'N+'
+SELECT_N = 4  # 'N' followed by anything else
+PEEK = 5  # '-+' on the selected stack
+POP = 6
+PUSH = 7
+NOT = 8
+INPUT = 9
+OUTPUT = 10
+FALSE = 11  # '[*]'
+TRUE = 12  # '[,*]'
+BRANCH = 13  # '[': jump to the else branch (or past ']') when current is false
+JUMP = 14  # ',' at the end of a then branch
+LOOP = 15  # '(': jump past ')' when current is false
+LOOP_END = 16  # ')': jump back to the loop body while current is true
+BREAK = 17  # '.' inside a loop: jump past its ')'
+RETURN = 18  # '.' in a function body outside any loop, and the end of a function body
+CALL_F = 19
+DEFINE_F = 20  # 'f:[': skip the body
+DEFINE_AND_CALL_F = 21  # 'f:(': call the body that follows
+TEXT_OUT = 22
+
+OPCODE_NAMES = {value: name for name, value in globals().items() if name.isupper() and type(value) is int}
+
+
+class ExecutionLimitExceeded(RuntimeError):
+    pass
+
+
+@dataclass
+class Program:
+    """
+    Decoded target code: opcodes and arguments in parallel arrays, with every jump target,
+    function address and text resolved up front.
+    """
+    ops: array
+    args: array
+    texts: list[str]
+    functions: dict[str, int]  # name -> address of the first body instruction
+    stack_count: int
+    offsets: array  # offset in the target code of the instruction each op came from
+
+
+@dataclass
+class ExecutionResult:
+    outputs: list[bool] = field(default_factory=list)
+    text: list[str] = field(default_factory=list)
+    steps: int = 0
+    stacks: list[list[bool]] = field(default_factory=list)
+
+
+def unescape_text(text: str) -> str:
+    # Print text is repr() escaped by the parser, with '{' and '}' escaped as well
+    text = text.replace("\\{", "{").replace("\\}", "}")
+    return text.encode('latin-1', 'backslashreplace').decode('unicode_escape')
+
+
+def _offsets(instructions: list[Instruction]) -> list[int]:
+    # Target code offset of each instruction, plus the end of the code
+    offsets = [0]
+    offset = 0
+    for kind, argument in instructions:
+        if kind == SELECT:
+            offset += len(str(argument))
+        elif kind in (TEXT, DEFINE, DEFINE_AND_CALL):
+            offset += len(argument) + 2
+        elif kind == CALL:
+            offset += len(argument) + 1
+        else:
+            offset += 1
+        offsets.append(offset)
+    return offsets
+
+
+def load(code: str) -> Program:
+    """
+    Decodes target code into a Program. Raises SyntaxError on unbalanced brackets, a break
+    outside of any loop or function, or a call to an undefined function.
+    """
+    instructions = decode(code)
+    source_offsets = _offsets(instructions)
+    ops = array('B')
+    args = array('l')
+    offsets = array('l')
+    texts: list[str] = []
+    functions: dict[str, int] = {}
+    calls: list[tuple[int, str]] = []
+    stack_count = 1
+    # Open brackets: (kind, index of the op that needs the jump target, pending break ops)
+    open_brackets: list[tuple[str, int, list[int]]] = []
+
+    def emit(op: int, argument: int = 0, at: int = 0) -> int:
+        ops.append(op)
+        args.append(argument)
+        offsets.append(source_offsets[at])
+        return len(ops) - 1
+
+    index = 0
+    count = len(instructions)
+    while index < count:
+        kind, argument = instructions[index]
+        at = index
+        following = [instruction[0] for instruction in instructions[index + 1:index + 3]]
+        index += 1
+        if kind == SELECT:
+            stack_count = max(stack_count, argument + 1)
+            if following[:2] == ['-', '+']:
+                emit(PEEK_N, argument, at)
+                index += 2
+            elif following[:1] == ['-']:
+                emit(POP_N, argument, at)
+                index += 1
+            elif following[:1] == ['+']:
+                emit(PUSH_N, argument, at)
+                index += 1
+            else:
+                emit(SELECT_N, argument, at)
+        elif kind == '-':
+            if following[:1] == ['+']:
+                emit(PEEK, 0, at)
+                index += 1
+            else:
+                emit(POP, 0, at)
+        elif kind == '+':
+            emit(PUSH, 0, at)
+        elif kind == '*':
+            emit(NOT, 0, at)
+        elif kind == '>':
+            emit(INPUT, 0, at)
+        elif kind == '<':
+            emit(OUTPUT, 0, at)
+        elif kind == TEXT:
+            texts.append(unescape_text(argument))
+            emit(TEXT_OUT, len(texts) - 1, at)
+        elif kind == '[':
+            if instructions[index:index + 2] == [('*', None), (']', None)]:
+                emit(FALSE, 0, at)
+                index += 2
+            elif instructions[index:index + 3] == [(',', None), ('*', None), (']', None)]:
+                emit(TRUE, 0, at)
+                index += 3
+            else:
+                open_brackets.append(('[', emit(BRANCH, 0, at), []))
+        elif kind == ',':
+            if not open_brackets or open_brackets[-1][0] != '[':
+                raise SyntaxError(f"Unexpected ',' at position {source_offsets[at]}")
+            _, branch, _ = open_brackets.pop()
+            jump = emit(JUMP, 0, at)
+            args[branch] = len(ops)
+            open_brackets.append((',', jump, []))
+        elif kind == ']':
+            if not open_brackets or open_brackets[-1][0] not in ('[', ',', DEFINE):
+                raise SyntaxError(f"Unexpected ']' at position {source_offsets[at]}")
+            bracket, start, _ = open_brackets.pop()
+            if bracket == DEFINE:
+                emit(RETURN, 0, at)
+            args[start] = len(ops)
+        elif kind == '(':
+            open_brackets.append(('(', emit(LOOP, 0, at), []))
+        elif kind == ')':
+            if not open_brackets or open_brackets[-1][0] not in ('(', DEFINE_AND_CALL):
+                raise SyntaxError(f"Unexpected ')' at position {source_offsets[at]}")
+            bracket, start, breaks = open_brackets.pop()
+            if bracket == DEFINE_AND_CALL:
+                emit(RETURN, 0, at)
+                args[start] = len(ops)
+            else:
+                emit(LOOP_END, start + 1, at)
+                args[start] = len(ops)
+                for op in breaks:
+                    args[op] = len(ops)
+        elif kind == '.':
+            # Break leaves the innermost loop of the same function body, or returns from the function
+            for bracket, _, breaks in reversed(open_brackets):
+                if bracket == '(':
+                    breaks.append(emit(BREAK, 0, at))
+                    break
+                if bracket in (DEFINE, DEFINE_AND_CALL):
+                    emit(RETURN, 0, at)
+                    break
+            else:
+                emit(HALT, 0, at)
+        elif kind in (DEFINE, DEFINE_AND_CALL):
+            if argument in functions:
+                raise SyntaxError(f"Function {argument} is defined twice")
+            start = emit(DEFINE_F if kind == DEFINE else DEFINE_AND_CALL_F, 0, at)
+            functions[argument] = len(ops)
+            open_brackets.append((kind, start, []))
+        elif kind == CALL:
+            calls.append((emit(CALL_F, 0, at), argument))
+    if open_brackets:
+        raise SyntaxError(f"Unclosed '{open_brackets[-1][0]}' in target code")
+    emit(HALT, 0, count)
+    for op, name in calls:
+        if name not in functions:
+            raise SyntaxError(f"Function {name} is not defined")
+        args[op] = functions[name]
+    return Program(ops, args, texts, functions, stack_count, offsets)
+
+
+def input_bits(bits: Iterable) -> Callable[[], bool]:
+    """
+    Input callable reading from an iterable of bits, raising EOFError once it runs out.
+    """
+    iterator = iter(bits)
+
+    def read() -> bool:
+        for bit in iterator:
+            return bool(bit)
+        raise EOFError("Program read more input bits than were given")
+    return read
+
+
+def run(program: Program | str, input: Callable[[], bool] | Iterable = (), output: Callable[[bool], None] | None = None,
+        write: Callable[[str], None] | None = None, max_steps: int | None = None, counts: array | None = None) -> ExecutionResult:
+    """
+    Runs a program. Input bits come from the input callable (or iterable), output bits and printed
+    text go to the output and write callables, and are collected in the result when those are None.
+    counts, an array as long as program.ops, gets how many times each op was executed added to it.
+    """
+    if isinstance(program, str):
+        program = load(program)
+    result = ExecutionResult()
+    read = input if callable(input) else input_bits(input)
+    put = output if output is not None else result.outputs.append
+    show = write if write is not None else result.text.append
+    limit = max_steps if max_steps is not None else sys.maxsize
+
+    ops = program.ops
+    args = program.args
+    texts = program.texts
+    stacks = [[] for _ in range(program.stack_count)]
+    stack = stacks[0]
+    returns = []
+    current = False
+    steps = 0
+    pc = 0
+    while True:
+        op = ops[pc]
+        argument = args[pc]
+        if counts is not None:
+            counts[pc] += 1
+        pc += 1
+        steps += 1
+        if op == PEEK_N:
+            stack = stacks[argument]
+            if stack:
+                current = stack[-1]
+            else:
+                current = False
+                stack.append(False)
+        elif op == POP_N:
+            stack = stacks[argument]
+            current = stack.pop() if stack else False
+        elif op == PUSH_N:
+            stack = stacks[argument]
+            stack.append(current)
+        elif op == NOT:
+            current = not current
+        elif op == BRANCH:
+            if not current:
+                pc = argument
+        elif op == JUMP:
+            pc = argument
+        elif op == FALSE:
+            current = False
+        elif op == TRUE:
+            current = True
+        elif op == LOOP:
+            if not current:
+                pc = argument
+        elif op == LOOP_END:
+            if current:
+                pc = argument
+                if steps > limit:
+                    raise ExecutionLimitExceeded(f"Program ran for more than {limit} steps")
+        elif op == INPUT:
+            current = read()
+        elif op == OUTPUT:
+            put(current)
+        elif op == CALL_F:
+            returns.append(pc)
+            pc = argument
+            if steps > limit:
+                raise ExecutionLimitExceeded(f"Program ran for more than {limit} steps")
+        elif op == RETURN:
+            pc = returns.pop()
+        elif op == BREAK:
+            pc = argument
+        elif op == DEFINE_F:
+            pc = argument
+        elif op == DEFINE_AND_CALL_F:
+            returns.append(argument)
+        elif op == SELECT_N:
+            stack = stacks[argument]
+        elif op == PEEK:
+            if stack:
+                current = stack[-1]
+            else:
+                current = False
+                stack.append(False)
+        elif op == POP:
+            current = stack.pop() if stack else False
+        elif op == PUSH:
+            stack.append(current)
+        elif op == TEXT_OUT:
+            show(texts[argument])
+        else:  # HALT
+            break
+    result.steps = steps
+    result.stacks = stacks
+    return result